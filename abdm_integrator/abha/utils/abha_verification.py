@@ -2,6 +2,7 @@ import base64
 
 import requests
 
+from abdm_integrator import http_sessions
 from abdm_integrator.abha.const import (
     ACCOUNT_INFORMATION_URL,
     AUTH_OTP_URL,
@@ -11,7 +12,10 @@ from abdm_integrator.abha.const import (
     HEALTH_CARD_PNG_FORMAT,
     SEARCH_BY_HEALTH_ID_URL,
 )
+from abdm_integrator.const import APIPathGroup
+from abdm_integrator.deadlines import request_timeout
 from abdm_integrator.exceptions import ABDMGatewayError, ABDMServiceUnavailable
+from abdm_integrator.instrumentation import send_instrumented
 from abdm_integrator.settings import app_settings
 from abdm_integrator.utils import ABDMRequestHelper, _get_json_from_resp
 
@@ -42,11 +46,11 @@ def search_by_health_id(health_id):
 
 
 def get_health_card_png(user_token):
-    headers = {"Content-Type": "application/json; charset=UTF-8"}
+    # Not retried with a refreshed access token on 401, as the request is sent with user token
+    # (see `is_gateway_token_rejection`)
     token = ABDMRequestHelper().get_access_token()
-    headers.update({"Authorization": "Bearer {}".format(token), "X-Token": f"Bearer {user_token}"})
     try:
-        resp = requests.get(url=app_settings.ABHA_URL + HEALTH_CARD_PNG_FORMAT, headers=headers, stream=True)
+        resp = _fetch_health_card_png(token, user_token)
         resp.raise_for_status()
         return {"health_card": base64.b64encode(resp.content)}
     except requests.Timeout:
@@ -57,6 +61,14 @@ def get_health_card_png(user_token):
         raise ABDMGatewayError(error.get('code'), detail_message)
 
 
+def _fetch_health_card_png(token, user_token):
+    headers = {"Content-Type": "application/json; charset=UTF-8"}
+    headers.update({"Authorization": "Bearer {}".format(token), "X-Token": f"Bearer {user_token}"})
+    return send_instrumented(http_sessions.get, APIPathGroup.ABHA,
+                             url=app_settings.ABHA_URL + HEALTH_CARD_PNG_FORMAT, headers=headers, stream=True,
+                             timeout=request_timeout(APIPathGroup.ABHA))
+
+
 def exists_by_health_id(health_id):
     payload = {"healthId": health_id}
     return ABDMRequestHelper().abha_post(EXISTS_BY_HEALTH_ID, payload)
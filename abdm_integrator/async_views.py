@@ -0,0 +1,81 @@
+"""
+Support for async variants of the APIs that wait for a gateway callback (long polling).
+Under ASGI, an async view awaits the callback without holding a worker thread for the whole wait.
+Async view to be used for an API is selected using `ASYNC_VIEWS` setting. Requires Django >= 4.1.
+"""
+import inspect
+
+import django
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.decorators import classonlymethod
+
+from abdm_integrator.deadlines import deadline
+from abdm_integrator.settings import app_settings
+
+try:
+    from asgiref.sync import iscoroutinefunction
+except ImportError:  # asgiref < 3.6
+    from asyncio import iscoroutinefunction
+
+
+class AsyncAPIViewMixin:
+    """
+    Mixin for DRF API views that have async handlers. Authentication, permission and throttling checks
+    run in a thread as they may access database. Must be placed before the APIView subclass in bases.
+    Handling of the request has `REQUEST_DEADLINE` budget, same as sync views.
+    """
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        if not iscoroutinefunction(view):
+            # Django < 5.0 `csrf_exempt` (applied by APIView) wraps the view in a sync function.
+            view = view.__wrapped__
+            view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        with deadline(app_settings.REQUEST_DEADLINE):
+            return await self._dispatch(request, *args, **kwargs)
+
+    async def _dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if inspect.isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+def run_in_thread(func, *args, **kwargs):
+    """
+    Runs blocking function that does not access database (e.g. a request to gateway) in a thread pool,
+    so that such calls from concurrent requests are not serialized in a single thread.
+    """
+    return sync_to_async(func, thread_sensitive=False)(*args, **kwargs)
+
+
+def sync_or_async_view(url_name, sync_view_class, async_view_class):
+    """
+    Returns async view for the url name if it is enabled in `ASYNC_VIEWS` setting else returns sync view.
+    """
+    if url_name not in (app_settings.ASYNC_VIEWS or []):
+        return sync_view_class.as_view()
+    if django.VERSION < (4, 1):
+        raise ImproperlyConfigured('ASYNC_VIEWS requires Django 4.1 or later.')
+    return async_view_class.as_view()
@@ -0,0 +1,269 @@
+"""
+Backends used to hand over gateway callback responses to the request that is waiting for them.
+The waiting request is identified by a key, usually the gateway `requestId` of the request sent to ABDM.
+Backend is selected using `CALLBACK_BACKEND` setting, with `CALLBACK_BACKEND_OPTIONS` passed to its constructor.
+Also includes deduplication of gateway callbacks that are processed in background tasks.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+
+from abdm_integrator.instrumentation import DuplicateCallbackEvent, emit_event
+from abdm_integrator.settings import app_settings
+from abdm_integrator.utils import ABDMCache
+
+logger = logging.getLogger('abdm_integrator')
+
+
+class CallbackBackend:
+    """Base interface for callback backends"""
+
+    def publish(self, key, data, timeout):
+        """
+        Makes callback data available to the waiter of `key` for `timeout` seconds.
+        """
+        raise NotImplementedError(f'{self.__class__.__name__}.publish() must be implemented.')
+
+    def wait(self, key, timeout, interval=None):
+        """
+        Blocks until data is published for `key` or `timeout` seconds have passed. Returns the data and removes it
+        from the backend, or None on timeout.
+        `interval` is a hint for backends that need to poll.
+        """
+        raise NotImplementedError(f'{self.__class__.__name__}.wait() must be implemented.')
+
+    async def async_wait(self, key, timeout, interval=None):
+        """
+        Async version of `wait` to be used by async views. Must not block the event loop.
+        """
+        raise NotImplementedError(f'{self.__class__.__name__}.async_wait() must be implemented.')
+
+
+class CacheCallbackBackend(CallbackBackend):
+    """
+    Shares callback data through the Django cache and polls it. Works with any cache, but adds up to one
+    poll interval of latency.
+    """
+
+    def __init__(self, poll_interval=2):
+        self.poll_interval = poll_interval
+
+    def publish(self, key, data, timeout):
+        ABDMCache.set(key, data, timeout)
+
+    def wait(self, key, timeout, interval=None):
+        interval = interval or self.poll_interval
+        deadline = time.monotonic() + timeout
+        while True:
+            data = self._pop(key)
+            if data:
+                return data
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(interval, remaining))
+
+    async def async_wait(self, key, timeout, interval=None):
+        interval = interval or self.poll_interval
+        deadline = time.monotonic() + timeout
+        while True:
+            data = await sync_to_async(self._pop, thread_sensitive=False)(key)
+            if data:
+                return data
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            await asyncio.sleep(min(interval, remaining))
+
+    @staticmethod
+    def _pop(key):
+        data = ABDMCache.get(key)
+        if data:
+            ABDMCache.delete(key)
+        return data
+
+
+class RedisCallbackBackend(CallbackBackend):
+    """
+    Uses a Redis list per key. Waiter is woken up by BLPOP as soon as the callback data is pushed.
+    Requires `redis` package to be installed.
+    """
+    key_prefix = 'abdm_callback_'
+
+    def __init__(self, url=None, client=None, async_client=None):
+        if client is None:
+            try:
+                import redis
+                import redis.asyncio
+            except ImportError:
+                raise ImproperlyConfigured('RedisCallbackBackend requires "redis" package to be installed.')
+            if not url:
+                raise ImproperlyConfigured('RedisCallbackBackend requires "url" in CALLBACK_BACKEND_OPTIONS.')
+            client = redis.Redis.from_url(url)
+            async_client = async_client or redis.asyncio.Redis.from_url(url)
+        self.client = client
+        self.async_client = async_client
+
+    def publish(self, key, data, timeout):
+        redis_key = self._redis_key(key)
+        pipeline = self.client.pipeline()
+        pipeline.rpush(redis_key, json.dumps(data, cls=DjangoJSONEncoder))
+        pipeline.expire(redis_key, int(timeout))
+        pipeline.execute()
+
+    def wait(self, key, timeout, interval=None):
+        result = self.client.blpop([self._redis_key(key)], timeout=self._blpop_timeout(timeout))
+        return json.loads(result[1]) if result else None
+
+    async def async_wait(self, key, timeout, interval=None):
+        if self.async_client is None:
+            return await sync_to_async(self.wait, thread_sensitive=False)(key, timeout, interval)
+        result = await self.async_client.blpop([self._redis_key(key)], timeout=self._blpop_timeout(timeout))
+        return json.loads(result[1]) if result else None
+
+    @staticmethod
+    def _blpop_timeout(timeout):
+        # BLPOP timeout is in whole seconds with 0 meaning wait forever
+        return max(int(round(timeout)), 1)
+
+    def _redis_key(self, key):
+        return f'{self.key_prefix}{key}'
+
+
+class InProcessCallbackBackend(CallbackBackend):
+    """
+    Hands over callback data between threads of the same process using a condition variable.
+    Meant for tests and single process deployments.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._data = {}
+        self._async_waiters = {}
+
+    def publish(self, key, data, timeout):
+        with self._condition:
+            self._data[key] = (data, time.monotonic() + timeout)
+            self._condition.notify_all()
+            if key in self._async_waiters:
+                loop, future = self._async_waiters[key]
+                loop.call_soon_threadsafe(self._wake_async_waiter, future)
+
+    def wait(self, key, timeout, interval=None):
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                data = self._pop(key)
+                if data is not None:
+                    return data
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+
+    async def async_wait(self, key, timeout, interval=None):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._condition:
+            data = self._pop(key)
+            if data is not None:
+                return data
+            self._async_waiters[key] = (loop, future)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        with self._condition:
+            self._async_waiters.pop(key, None)
+            return self._pop(key)
+
+    @staticmethod
+    def _wake_async_waiter(future):
+        if not future.done():
+            future.set_result(None)
+
+    def _pop(self, key):
+        data, expires_at = self._data.pop(key, (None, None))
+        if data is not None and expires_at > time.monotonic():
+            return data
+        return None
+
+
+_backend = None
+_backend_config = None
+_backend_lock = threading.Lock()
+
+
+def callback_backend():
+    global _backend, _backend_config
+    backend_config = (app_settings.CALLBACK_BACKEND, app_settings.CALLBACK_BACKEND_OPTIONS)
+    with _backend_lock:
+        if _backend is None or _backend_config != backend_config:
+            _backend = app_settings.CALLBACK_BACKEND(**(app_settings.CALLBACK_BACKEND_OPTIONS or {}))
+            _backend_config = backend_config
+        return _backend
+
+
+def publish_callback_response(key, data, timeout):
+    callback_backend().publish(key, data, timeout)
+
+
+def wait_for_callback_response(key, timeout, interval=None):
+    return callback_backend().wait(key, timeout, interval)
+
+
+async def async_wait_for_callback_response(key, timeout, interval=None):
+    return await callback_backend().async_wait(key, timeout, interval)
+
+
+def accept_callback_once(callback_name, callback_id):
+    """
+    Returns True if the callback is to be processed, or False if a callback with the same name and id was already
+    accepted in the last `CALLBACK_DEDUPE_TIMEOUT` seconds. Gateway may deliver the same callback more than once,
+    and processing it again could for e.g. transfer all health data again.
+    Uses atomic `add` of the cache, so only one of the concurrently delivered copies is accepted.
+    Dropped callbacks are emitted as `DuplicateCallbackEvent` to the instrumentation collectors.
+    """
+    if not app_settings.CALLBACK_DEDUPE_TIMEOUT:
+        return True
+    if ABDMCache.add(f'callback_{callback_name}_{callback_id}', True, app_settings.CALLBACK_DEDUPE_TIMEOUT):
+        return True
+    emit_event(DuplicateCallbackEvent(callback_name=callback_name, callback_id=callback_id))
+    logger.info('ABDM: Dropped duplicate callback %s with id %s', callback_name, callback_id)
+    return False
+
+
+def release_callback(callback_name, callback_id):
+    """Forgets a callback accepted by `accept_callback_once`, so that its next delivery is processed."""
+    if app_settings.CALLBACK_DEDUPE_TIMEOUT:
+        ABDMCache.delete(f'callback_{callback_name}_{callback_id}')
+
+
+def delay_callback_once(callback_name, callback_ids, task, *args):
+    """
+    Queues celery `task` with `args` to process a gateway callback, unless a callback with the same name and any
+    of `callback_ids` was already accepted (see `accept_callback_once`). Callbacks are released if queueing the
+    task fails, so that the callback delivered again by Gateway is not dropped as a duplicate.
+    Returns True if the task is queued.
+    """
+    accepted_ids = []
+    for callback_id in callback_ids:
+        if not accept_callback_once(callback_name, callback_id):
+            # Not processed, so delivery of the callback with other ids is not a duplicate
+            for accepted_id in accepted_ids:
+                release_callback(callback_name, accepted_id)
+            return False
+        accepted_ids.append(callback_id)
+    try:
+        task.delay(*args)
+    except Exception:
+        for accepted_id in accepted_ids:
+            release_callback(callback_name, accepted_id)
+        raise
+    return True
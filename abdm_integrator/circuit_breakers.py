@@ -0,0 +1,127 @@
+"""
+Circuit breakers for outbound requests to ABDM, so that requests fail fast while ABDM is failing instead of each
+waiting for the timeout. A circuit is kept per base URL and API group (see `APIPathGroup`) and its state is shared
+by all processes through the Django cache.
+A circuit opens when at least `CIRCUIT_BREAKER_FAILURE_RATE` of the requests in the last
+`CIRCUIT_BREAKER_WINDOW` seconds have failed (timeout, connection error or 429/5xx response), given that there were
+at least `CIRCUIT_BREAKER_MIN_REQUESTS` requests. Requests fail with `ABDMServiceUnavailable` while the circuit is
+open. After `CIRCUIT_BREAKER_OPEN_DURATION` seconds a single probe request is allowed (half-open), which closes the
+circuit on success or opens it again on failure.
+Events of circuits are emitted as `CircuitBreakerEvent` to the instrumentation collectors.
+"""
+import logging
+import time
+
+from abdm_integrator.exceptions import ABDMServiceUnavailable
+from abdm_integrator.http_sessions import HTTPSessionPool
+from abdm_integrator.instrumentation import CircuitBreakerEvent, emit_event
+from abdm_integrator.settings import app_settings
+from abdm_integrator.utils import ABDMCache
+
+logger = logging.getLogger('abdm_integrator')
+
+
+class CircuitState:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    # Number of buckets the sliding window is divided into
+    window_buckets = 10
+
+    def __init__(self, name):
+        self.name = name
+        self.failure_rate = app_settings.CIRCUIT_BREAKER_FAILURE_RATE
+        self.min_requests = app_settings.CIRCUIT_BREAKER_MIN_REQUESTS
+        self.window = app_settings.CIRCUIT_BREAKER_WINDOW
+        self.open_duration = app_settings.CIRCUIT_BREAKER_OPEN_DURATION
+
+    @property
+    def bucket_duration(self):
+        return self.window / self.window_buckets
+
+    def state(self):
+        opened_at = ABDMCache.get(self._key('opened_at'))
+        if opened_at is None:
+            return CircuitState.CLOSED
+        if time.time() < opened_at + self.open_duration:
+            return CircuitState.OPEN
+        return CircuitState.HALF_OPEN
+
+    def before_request(self):
+        """
+        Raises `ABDMServiceUnavailable` if request is not allowed. Returns True if the request is a probe.
+        """
+        state = self.state()
+        if state == CircuitState.CLOSED:
+            return False
+        if state == CircuitState.HALF_OPEN and ABDMCache.add(self._key('probe'), True, self.open_duration):
+            self._emit_event('probe')
+            return True
+        self._emit_event('rejected')
+        logger.error('ABDM Circuit open for %s', self.name)
+        raise ABDMServiceUnavailable()
+
+    def record(self, failed, probe=False):
+        """Records result of a request allowed by `before_request`"""
+        if probe:
+            if failed:
+                self._open()
+            else:
+                self._close()
+            self.release_probe()
+            return
+        bucket = int(time.time() // self.bucket_duration)
+        self._incr(self._key(f'requests_{bucket}'))
+        if failed:
+            self._incr(self._key(f'failures_{bucket}'))
+            requests_count, failures_count = self._window_counts(bucket)
+            if requests_count >= self.min_requests and failures_count >= requests_count * self.failure_rate:
+                self._open()
+
+    def release_probe(self):
+        """Allows another probe when the probe request allowed by `before_request` was not sent"""
+        ABDMCache.delete(self._key('probe'))
+
+    def _window_counts(self, current_bucket):
+        # Requests before the circuit was last closed are not counted
+        closed_at = ABDMCache.get(self._key('closed_at')) or 0
+        first_bucket = max(current_bucket - self.window_buckets + 1, int(closed_at // self.bucket_duration) + 1)
+        requests_count = failures_count = 0
+        for bucket in range(first_bucket, current_bucket + 1):
+            requests_count += ABDMCache.get(self._key(f'requests_{bucket}')) or 0
+            failures_count += ABDMCache.get(self._key(f'failures_{bucket}')) or 0
+        return requests_count, failures_count
+
+    def _open(self):
+        ABDMCache.set(self._key('opened_at'), time.time(), None)
+        self._emit_event('opened')
+        logger.error('ABDM Circuit opened for %s', self.name)
+
+    def _close(self):
+        ABDMCache.set(self._key('closed_at'), time.time(), self.window * 2)
+        ABDMCache.delete(self._key('opened_at'))
+        self._emit_event('closed')
+        logger.info('ABDM Circuit closed for %s', self.name)
+
+    def _incr(self, key):
+        if not ABDMCache.add(key, 1, self.window * 2):
+            try:
+                ABDMCache.incr(key)
+            except ValueError:
+                ABDMCache.add(key, 1, self.window * 2)
+
+    def _key(self, suffix):
+        return f'circuit_{self.name}_{suffix}'
+
+    def _emit_event(self, event):
+        emit_event(CircuitBreakerEvent(circuit=self.name, event=event))
+
+
+def circuit_breaker(url, path_group):
+    """Returns circuit breaker for the base URL of `url` and `path_group`, or None if not enabled"""
+    if not app_settings.CIRCUIT_BREAKER_ENABLED:
+        return None
+    return CircuitBreaker(f'{HTTPSessionPool.base_url(url)}_{path_group}')
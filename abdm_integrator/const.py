@@ -35,6 +35,28 @@ class GatewayAPIPath:
     CERTS_PATH = '/v0.5/certs'
 
 
+class APIPathGroup:
+    """
+    Groups of ABDM APIs used for rate limiting and timeouts of outbound requests. Gateway API paths are grouped
+    by prefix, all ABHA APIs are in a single group and paths not matching any prefix are in the default group.
+    Health data pushed by HIP to the data push URL of HIU is in a separate group.
+    """
+    SESSIONS = 'sessions'
+    CONSENTS = 'consents'
+    HEALTH_INFORMATION = 'health_information'
+    LINKS = 'links'
+    ABHA = 'abha'
+    HIU_DATA_PUSH = 'hiu_data_push'
+    DEFAULT = 'default'
+
+    GATEWAY_PATH_PREFIXES = (
+        (SESSIONS, ('/v0.5/sessions', '/v0.5/certs')),
+        (CONSENTS, ('/v0.5/consent-requests/', '/v0.5/consents/')),
+        (HEALTH_INFORMATION, ('/v0.5/health-information/',)),
+        (LINKS, ('/v0.5/links/', '/v0.5/care-contexts/')),
+    )
+
+
 class ConsentStatus:
     PENDING = 'PENDING'
     REQUESTED = 'REQUESTED'
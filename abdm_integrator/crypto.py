@@ -1,25 +1,66 @@
 import hashlib
-from base64 import b64encode
+import logging
+import secrets
+import threading
+from base64 import b64decode, b64encode
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from functools import cached_property
 
-from fidelius import CryptoController, DecryptionRequest, EncryptionRequest, KeyMaterial
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from django.core.exceptions import ImproperlyConfigured
 
+from abdm_integrator.settings import app_settings
 from abdm_integrator.utils import datetime_to_abdm_iso
 
+logger = logging.getLogger('abdm_integrator')
+
 CRYPTO_ALGORITHM = 'ECDH'
 CURVE = 'Curve25519'
 KEY_MATERIAL_EXPIRY = 60 * 60  # in seconds
 
+# Curve25519 as used by fidelius (Bouncy Castle), which is in short Weierstrass form with x = u + A / 3,
+# where u is the coordinate of the Montgomery form (RFC 7748).
+CURVE25519_P = 2 ** 255 - 19
+CURVE25519_A = 486662
+CURVE25519_A24 = (CURVE25519_A - 2) // 4
+CURVE25519_WEIERSTRASS_SHIFT = CURVE25519_A * pow(3, CURVE25519_P - 2, CURVE25519_P) % CURVE25519_P
+CURVE25519_FIELD_SIZE = 32
+# Bits of scalars accepted by the Montgomery ladder, which are private keys of at most 32 bytes
+CURVE25519_SCALAR_BITS = 256
+# X.509 SubjectPublicKeyInfo of Curve25519 public key as encoded by fidelius, without the EC point
+CURVE25519_X509_PREFIX = bytes.fromhex('305a301406072a8648ce3d020106092b06010401da470f01034200')
+AES_KEY_SIZE = 32
+SALT_SIZE = 20
+IV_SIZE = 12
+NONCE_SIZE = 32
+
+
+@dataclass
+class KeyMaterial:
+    private_key: str
+    public_key: str
+    x509_public_key: str
+    nonce: str
+
 
 class ABDMCrypto:
     """
     Wrapper class to perform cryptography operations as per ABDM policy.
     """
 
-    def __init__(self, key_material_dict=None, use_x509_for_transfer=False):
+    # Maximum number of sessions kept, for peers this instance exchanges data with
+    max_sessions = 8
+
+    def __init__(self, key_material_dict=None, use_x509_for_transfer=False, backend=None):
+        self.backend = backend or crypto_backend()
         self.key_material = (self._key_material_from_dict(key_material_dict) if key_material_dict
-                             else KeyMaterial.generate())
+                             else self.backend.generate_key_material())
         self.transfer_material = self._get_transfer_material(use_x509_for_transfer)
+        self._sessions = {}
 
     @staticmethod
     def _key_material_from_dict(data):
@@ -46,26 +87,321 @@ class ABDMCrypto:
             'nonce': self.key_material.nonce
         }
 
+    def session(self, peer_transfer_material):
+        """
+        Returns `CryptoSession` for exchanging data with the peer of `peer_transfer_material`. Sessions are
+        reused, so the shared key is derived once for all the data encrypted for or decrypted from a peer.
+        """
+        peer_public_key = peer_transfer_material['dhPublicKey']['keyValue']
+        peer_nonce = peer_transfer_material['nonce']
+        session = self._sessions.get((peer_public_key, peer_nonce))
+        if session is None:
+            if len(self._sessions) >= self.max_sessions:
+                del self._sessions[next(iter(self._sessions))]
+            session = self.backend.session(self.key_material.private_key, self.key_material.nonce,
+                                           peer_public_key, peer_nonce)
+            self._sessions[(peer_public_key, peer_nonce)] = session
+        return session
+
     def encrypt(self, data, peer_transfer_material):
+        return self.session(peer_transfer_material).encrypt(data)
+
+    def decrypt(self, data, peer_transfer_material):
+        return self.session(peer_transfer_material).decrypt(data)
+
+    @staticmethod
+    def generate_checksum(data):
+        return b64encode(hashlib.md5(data.encode('utf-8')).digest()).decode()
+
+
+class CryptoBackend:
+    """
+    Base class of crypto backends used by `ABDMCrypto`, selected using `CRYPTO_BACKEND` setting.
+    Key material is base64 encoded as by fidelius.
+    """
+
+    def generate_key_material(self):
+        """Returns new `KeyMaterial`"""
+        raise NotImplementedError
+
+    def session(self, private_key, nonce, peer_public_key, peer_nonce):
+        """Returns object with `encrypt(data)` and `decrypt(data)` methods for exchanging data with a peer"""
+        raise NotImplementedError
+
+
+class CryptographyBackend(CryptoBackend):
+    """
+    Backend built on `cryptography` package. Shared key of a session is derived once and reused.
+    Key agreement uses X25519 of `cryptography` for keys generated by this backend, and the equivalent
+    branch free Montgomery ladder for private keys generated by fidelius.
+    Not yet tested against vectors generated by fidelius, so it is not known to interoperate with fidelius.
+    """
+
+    def generate_key_material(self):
+        private_key = X25519PrivateKey.generate()
+        # X25519 private key is little endian with the bits of the scalar already clamped
+        scalar = curve25519_clamp(int.from_bytes(private_key.private_bytes_raw(), 'little'))
+        u = int.from_bytes(private_key.public_key().public_bytes_raw(), 'little')
+        x = (u + CURVE25519_WEIERSTRASS_SHIFT) % CURVE25519_P
+        point = (b'\x04' + x.to_bytes(CURVE25519_FIELD_SIZE, 'big')
+                 + curve25519_v(u).to_bytes(CURVE25519_FIELD_SIZE, 'big'))
+        return KeyMaterial(
+            private_key=b64encode(scalar.to_bytes(scalar.bit_length() // 8 + 1, 'big')).decode(),
+            public_key=b64encode(point).decode(),
+            x509_public_key=b64encode(CURVE25519_X509_PREFIX + point).decode(),
+            nonce=b64encode(secrets.token_bytes(NONCE_SIZE)).decode(),
+        )
+
+    def session(self, private_key, nonce, peer_public_key, peer_nonce):
+        return CryptoSession(private_key, nonce, peer_public_key, peer_nonce)
+
+
+class FideliusBackend(CryptoBackend):
+    """
+    Backend using fidelius. Shared key of a session is derived once if it is the same as derived by fidelius
+    (see `FideliusSession`), else fidelius `CryptoController` is used, which derives the shared key on every call.
+    Requires `fidelius` package to be installed.
+    """
+
+    def __init__(self):
+        try:
+            import fidelius
+        except ImportError:
+            raise ImproperlyConfigured('FideliusBackend requires "fidelius" package to be installed.')
+        self.fidelius = fidelius
+
+    def generate_key_material(self):
+        key_material = self.fidelius.KeyMaterial.generate()
+        return KeyMaterial(
+            private_key=key_material.private_key,
+            public_key=key_material.public_key,
+            x509_public_key=key_material.x509_public_key,
+            nonce=key_material.nonce,
+        )
+
+    def session(self, private_key, nonce, peer_public_key, peer_nonce):
+        return FideliusSession(private_key, nonce, peer_public_key, peer_nonce)
+
+
+class FideliusSession:
+    """
+    Derives the AES key once using `CryptoSession`, and uses it for all the data of the session only after
+    checking that it encrypts a probe exactly as fidelius `CryptoController` does with the same keys. Otherwise,
+    for e.g. for keys `CryptoSession` does not support, every call is made to `CryptoController`.
+    The check is made on first use, and a pickled session includes its result.
+    """
+
+    probe = 'ABDM key check'
+
+    def __init__(self, private_key, nonce, peer_public_key, peer_nonce):
+        self.private_key = private_key
+        self.nonce = nonce
+        self.peer_public_key = peer_public_key
+        self.peer_nonce = peer_nonce
+        self._session = CryptoSession(private_key, nonce, peer_public_key, peer_nonce)
+
+    @cached_property
+    def _uses_derived_key(self):
+        try:
+            matches = self._session.encrypt(self.probe) == self._fidelius_encrypt(self.probe)
+        except Exception:
+            logger.exception('ABDM: Error in deriving key for fidelius session')
+            matches = False
+        if not matches:
+            logger.warning('ABDM: Key derived for fidelius session differs from fidelius, using fidelius for '
+                           'every call')
+        return matches
+
+    def __getstate__(self):
+        state = {**self.__dict__, '_uses_derived_key': self._uses_derived_key}
+        if not self._uses_derived_key:
+            state.pop('_session')
+        return state
+
+    def encrypt(self, data):
+        if self._uses_derived_key:
+            return self._session.encrypt(data)
+        return self._fidelius_encrypt(data)
+
+    def decrypt(self, data):
+        if self._uses_derived_key:
+            return self._session.decrypt(data)
+        return self._fidelius_decrypt(data)
+
+    def _fidelius_encrypt(self, data):
+        from fidelius import CryptoController, EncryptionRequest
         encryption_request = EncryptionRequest(
             string_to_encrypt=data,
-            sender_nonce=self.key_material.nonce,
-            requester_nonce=peer_transfer_material['nonce'],
-            sender_private_key=self.key_material.private_key,
-            requester_public_key=peer_transfer_material['dhPublicKey']['keyValue']
+            sender_nonce=self.nonce,
+            requester_nonce=self.peer_nonce,
+            sender_private_key=self.private_key,
+            requester_public_key=self.peer_public_key
         )
         return CryptoController.encrypt(encryption_request)
 
-    def decrypt(self, data, peer_transfer_material):
+    def _fidelius_decrypt(self, data):
+        from fidelius import CryptoController, DecryptionRequest
         decryption_request = DecryptionRequest(
             encrypted_data=data,
-            requester_nonce=self.key_material.nonce,
-            sender_nonce=peer_transfer_material['nonce'],
-            requester_private_key=self.key_material.private_key,
-            sender_public_key=peer_transfer_material['dhPublicKey']['keyValue']
+            requester_nonce=self.nonce,
+            sender_nonce=self.peer_nonce,
+            requester_private_key=self.private_key,
+            sender_public_key=self.peer_public_key
         )
         return CryptoController.decrypt(decryption_request)
 
-    @staticmethod
-    def generate_checksum(data):
-        return b64encode(hashlib.md5(data.encode('utf-8')).digest()).decode()
+
+_crypto_backend = None
+_crypto_backend_class = None
+_crypto_backend_lock = threading.Lock()
+
+
+def crypto_backend():
+    global _crypto_backend, _crypto_backend_class
+    with _crypto_backend_lock:
+        if _crypto_backend is None or _crypto_backend_class != app_settings.CRYPTO_BACKEND:
+            _crypto_backend = app_settings.CRYPTO_BACKEND()
+            _crypto_backend_class = app_settings.CRYPTO_BACKEND
+        return _crypto_backend
+
+
+class CryptoSession:
+    """
+    Encrypts and decrypts data exchanged between a key pair and a peer, as per ABDM policy and following the
+    scheme of fidelius `CryptoController`:
+        - Shared secret is the x coordinate of ECDH on Curve25519 (in the form used by fidelius)
+        - AES key is derived from the shared secret using HKDF-SHA256, with the first 20 bytes of XOR of
+          the nonces as salt
+        - Data is encrypted using AES-GCM, with the last 12 bytes of XOR of the nonces as IV
+    The AES key is derived on first use and then reused for all the data of the session. A pickled session
+    includes the derived key, so that processes it is sent to do not derive it again.
+    """
+
+    def __init__(self, private_key, nonce, peer_public_key, peer_nonce):
+        self.private_key = private_key
+        self.nonce = nonce
+        self.peer_public_key = peer_public_key
+        self.peer_nonce = peer_nonce
+
+    @cached_property
+    def _key_and_iv(self):
+        nonces_xor = bytes(a ^ b for a, b in zip(b64decode(self.nonce), b64decode(self.peer_nonce)))
+        shared_secret = curve25519_shared_secret(self.private_key, self.peer_public_key)
+        hkdf = HKDF(algorithm=hashes.SHA256(), length=AES_KEY_SIZE, salt=nonces_xor[:SALT_SIZE], info=None)
+        return hkdf.derive(shared_secret), nonces_xor[-IV_SIZE:]
+
+    @cached_property
+    def _aes_gcm(self):
+        return AESGCM(self._key_and_iv[0])
+
+    def __getstate__(self):
+        state = {**self.__dict__, '_key_and_iv': self._key_and_iv}
+        state.pop('_aes_gcm', None)
+        return state
+
+    def encrypt(self, data):
+        return b64encode(self._aes_gcm.encrypt(self._key_and_iv[1], data.encode('utf-8'), None)).decode()
+
+    def decrypt(self, data):
+        return self._aes_gcm.decrypt(self._key_and_iv[1], b64decode(data), None).decode('utf-8')
+
+
+def curve25519_shared_secret(private_key, peer_public_key):
+    """
+    Returns ECDH shared secret of base64 encoded `private_key` (as big endian two's complement integer)
+    and `peer_public_key` (as EC point or X.509 SubjectPublicKeyInfo).
+    """
+    scalar = int.from_bytes(b64decode(private_key), 'big', signed=True)
+    peer_x = int.from_bytes(_public_key_point(b64decode(peer_public_key))[1:CURVE25519_FIELD_SIZE + 1], 'big')
+    peer_u = (peer_x - CURVE25519_WEIERSTRASS_SHIFT) % CURVE25519_P
+    if scalar == curve25519_clamp(scalar):
+        # X25519 gives the same result as the ladder for scalars that are already clamped
+        x25519_private_key = X25519PrivateKey.from_private_bytes(scalar.to_bytes(CURVE25519_FIELD_SIZE, 'little'))
+        x25519_public_key = X25519PublicKey.from_public_bytes(peer_u.to_bytes(CURVE25519_FIELD_SIZE, 'little'))
+        u = int.from_bytes(x25519_private_key.exchange(x25519_public_key), 'little')
+    else:
+        u = curve25519_scalar_mult(scalar, peer_u)
+        if u is None:
+            raise ValueError('Invalid public key')
+    return ((u + CURVE25519_WEIERSTRASS_SHIFT) % CURVE25519_P).to_bytes(CURVE25519_FIELD_SIZE, 'big')
+
+
+def curve25519_clamp(scalar):
+    """Returns `scalar` clamped as per X25519 of RFC 7748"""
+    return (scalar & ~7 & (2 ** 254 - 1)) | 2 ** 254
+
+
+def curve25519_v(u):
+    """Returns v coordinate of the point with u coordinate `u`, which is its y coordinate in Weierstrass form"""
+    p = CURVE25519_P
+    v_squared = (u ** 3 + CURVE25519_A * u * u + u) % p
+    # Square root for p = 5 (mod 8)
+    v = pow(v_squared, (p + 3) // 8, p)
+    if v * v % p != v_squared:
+        v = v * pow(2, (p - 1) // 4, p) % p
+    if v * v % p != v_squared:
+        raise ValueError('Point is not on Curve25519')
+    return v
+
+
+def curve25519_scalar_mult(scalar, u):
+    """
+    Returns u coordinate of `scalar` times the point with u coordinate `u` using the Montgomery ladder of
+    RFC 7748, without clamping the scalar. Returns None for the point at infinity.
+    The ladder takes the same steps for every scalar below 2 ** 256 and swaps points arithmetically instead of
+    branching on the bits of the scalar. Integer arithmetic of Python is not guaranteed to be constant time,
+    so X25519 of `cryptography` is used instead where the scalar allows (see `curve25519_shared_secret`).
+    """
+    if not 0 <= scalar < 2 ** CURVE25519_SCALAR_BITS:
+        raise ValueError('Invalid private key')
+    p = CURVE25519_P
+    x_2, z_2, x_3, z_3 = 1, 0, u, 1
+    swap = 0
+    for t in reversed(range(CURVE25519_SCALAR_BITS)):
+        k_t = (scalar >> t) & 1
+        swap ^= k_t
+        x_2, x_3 = _cswap(swap, x_2, x_3)
+        z_2, z_3 = _cswap(swap, z_2, z_3)
+        swap = k_t
+        a, b = (x_2 + z_2) % p, (x_2 - z_2) % p
+        c, d = (x_3 + z_3) % p, (x_3 - z_3) % p
+        aa, bb = a * a % p, b * b % p
+        e = (aa - bb) % p
+        da, cb = d * a % p, c * b % p
+        x_3, z_3 = (da + cb) ** 2 % p, u * (da - cb) ** 2 % p
+        x_2, z_2 = aa * bb % p, e * (aa + CURVE25519_A24 * e) % p
+    x_2, x_3 = _cswap(swap, x_2, x_3)
+    z_2, z_3 = _cswap(swap, z_2, z_3)
+    if z_2 == 0:
+        return None
+    return x_2 * pow(z_2, p - 2, p) % p
+
+
+def _cswap(swap, a, b):
+    """Returns (b, a) if `swap` is 1 or (a, b) if it is 0, without branching on `swap`"""
+    dummy = -swap & (a ^ b)
+    return a ^ dummy, b ^ dummy
+
+
+def _public_key_point(public_key):
+    """Returns encoded EC point of a public key that is either the point itself or X.509 SubjectPublicKeyInfo"""
+    if public_key[:1] == b'\x30':
+        # SEQUENCE of AlgorithmIdentifier and BIT STRING of the point
+        content, _ = _der_element(public_key, 0x30)
+        _, rest = _der_element(content, 0x30)
+        bit_string, _ = _der_element(rest, 0x03)
+        public_key = bit_string[1:]
+    if public_key[:1] not in (b'\x02', b'\x03', b'\x04') or len(public_key) < CURVE25519_FIELD_SIZE + 1:
+        raise ValueError('Invalid public key')
+    return public_key
+
+
+def _der_element(data, tag):
+    """Returns content of DER element with `tag` at the start of `data`, and the data after it"""
+    if len(data) < 2 or data[0] != tag:
+        raise ValueError('Invalid public key')
+    length, offset = data[1], 2
+    if length & 0x80:
+        length_size = length & 0x7f
+        length, offset = int.from_bytes(data[2:2 + length_size], 'big'), 2 + length_size
+    return data[offset:offset + length], data[offset + length:]
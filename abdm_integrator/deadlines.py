@@ -0,0 +1,93 @@
+"""
+Timeouts of outbound requests and deadline budgets of the work they are made for.
+Each outbound request gets separate connect and read timeouts as per `HTTP_CONNECT_TIMEOUT`, `HTTP_READ_TIMEOUT`
+and `HTTP_TIMEOUTS` (per group of APIs, see `APIPathGroup`) settings.
+An API request or a celery task may have a total budget (see `REQUEST_DEADLINE` and `TASK_DEADLINE` settings),
+set using `deadline`. Timeouts of outbound requests and waits for gateway callbacks made within it are capped to
+the remaining time, and no request is sent once the budget is spent.
+Note that the read timeout of `requests` applies to each read from the socket, so a slow response that keeps
+sending data may still run past the deadline.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import requests
+
+from abdm_integrator.settings import app_settings
+
+# Monotonic time by which the current work must be done, if any
+_deadline = ContextVar('abdm_integrator_deadline', default=None)
+
+
+class DeadlineExceeded(requests.Timeout):
+    """Raised instead of sending a request when the deadline has passed"""
+
+
+@contextmanager
+def deadline(seconds):
+    """
+    Sets a budget of `seconds` for the enclosed block. A nested deadline never extends the enclosing one.
+    Does nothing if `seconds` is None.
+    """
+    if seconds is None:
+        yield
+        return
+    deadline_at = time.monotonic() + seconds
+    current_deadline_at = _deadline.get()
+    if current_deadline_at is not None:
+        deadline_at = min(deadline_at, current_deadline_at)
+    token = _deadline.set(deadline_at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time():
+    """Returns number of seconds left before the current deadline, or None if there is no deadline."""
+    deadline_at = _deadline.get()
+    if deadline_at is None:
+        return None
+    return max(deadline_at - time.monotonic(), 0)
+
+
+def within_deadline(seconds):
+    """Returns `seconds` capped to the time left before the current deadline."""
+    remaining = remaining_time()
+    if remaining is None:
+        return seconds
+    return min(seconds, remaining)
+
+
+def configured_request_timeout(path_group, read_timeout=None):
+    """
+    Returns tuple of (connect, read) timeout for an outbound request of `path_group` as per settings, without
+    the current deadline. `read_timeout` if given is used instead of the configured read timeout.
+    """
+    timeouts = (app_settings.HTTP_TIMEOUTS or {}).get(path_group, {})
+    connect_timeout = timeouts.get('connect', app_settings.HTTP_CONNECT_TIMEOUT)
+    return connect_timeout, read_timeout or timeouts.get('read', app_settings.HTTP_READ_TIMEOUT)
+
+
+def request_timeout(path_group, read_timeout=None):
+    """
+    Returns tuple of (connect, read) timeout for an outbound request of `path_group`, capped to the time left
+    before the current deadline. `read_timeout` if given is used instead of the configured read timeout.
+    Raises `DeadlineExceeded` if the deadline has passed.
+    """
+    connect_timeout, read_timeout = configured_request_timeout(path_group, read_timeout)
+    remaining = remaining_time()
+    if remaining is None:
+        return connect_timeout, read_timeout
+    if remaining <= 0:
+        raise DeadlineExceeded('Deadline exceeded before sending the request')
+    return min(connect_timeout, remaining), min(read_timeout, remaining)
+
+
+class RequestDeadlineMixin:
+    """Mixin for API views that sets `REQUEST_DEADLINE` budget for handling of the request."""
+
+    def dispatch(self, request, *args, **kwargs):
+        with deadline(app_settings.REQUEST_DEADLINE):
+            return super().dispatch(request, *args, **kwargs)
@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from abdm_integrator.crypto import CryptographyBackend, FideliusBackend
+
+
+class Command(BaseCommand):
+    help = ('Prints known-answer vectors generated by fidelius as json, to be saved as '
+            '"abdm_integrator/tests/data/fidelius_vectors.json" for testing CryptographyBackend against fidelius. '
+            'Key pairs are generated by both backends, as fidelius reduces the clamped private keys generated '
+            'by CryptographyBackend modulo the curve order. Requires fidelius package to be installed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vectors', type=int, default=3,
+                            help='Number of vectors generated for each combination of key pair backends')
+
+    def handle(self, *args, **options):
+        # Imported after FideliusBackend checks that fidelius is installed
+        key_backends = {'fidelius': FideliusBackend(), 'cryptography': CryptographyBackend()}
+        from fidelius import CryptoController, EncryptionRequest
+        vectors = []
+        for sender_backend in key_backends:
+            for requester_backend in key_backends:
+                for index in range(options['vectors']):
+                    sender = key_backends[sender_backend].generate_key_material()
+                    requester = key_backends[requester_backend].generate_key_material()
+                    plaintext = json.dumps({'resourceType': 'Bundle', 'id': str(index), 'entry': []})
+                    vector = {'sender_backend': sender_backend, 'requester_backend': requester_backend}
+                    vector.update({f'sender_{key}': value for key, value in vars(sender).items()})
+                    vector.update({f'requester_{key}': value for key, value in vars(requester).items()})
+                    vector['plaintext'] = plaintext
+                    # Encrypted by fidelius for the requester public key as EC point and as X.509
+                    for ciphertext_key, requester_public_key in (('ciphertext', requester.public_key),
+                                                                 ('x509_ciphertext', requester.x509_public_key)):
+                        vector[ciphertext_key] = CryptoController.encrypt(EncryptionRequest(
+                            string_to_encrypt=plaintext,
+                            sender_nonce=sender.nonce,
+                            requester_nonce=requester.nonce,
+                            sender_private_key=sender.private_key,
+                            requester_public_key=requester_public_key,
+                        ))
+                    vectors.append(vector)
+        self.stdout.write(json.dumps(vectors, indent=4))
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("abdm_hip", "0006_alter_hiplinkrequest_user"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="linkcarecontext",
+            index=models.Index(
+                fields=["reference", "link_request_details"],
+                name="abdm_hip_li_referen_007c1e_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="linkrequestdetails",
+            index=models.Index(
+                fields=["hip_id", "status"], name="abdm_hip_li_hip_id_7ffc88_idx"
+            ),
+        ),
+    ]
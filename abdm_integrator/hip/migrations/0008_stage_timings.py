@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("abdm_hip", "0007_linkcarecontext_linkrequestdetails_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="healthdatatransfer",
+            name="stage_timings",
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name="healthinformationrequest",
+            name="stage_timings",
+            field=models.JSONField(default=dict),
+        ),
+    ]
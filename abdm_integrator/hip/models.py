@@ -34,7 +34,8 @@ class LinkRequestDetails(models.Model):
     class Meta:
         app_label = 'abdm_hip'
         indexes = [
-            models.Index(fields=['patient_reference', 'hip_id'])
+            models.Index(fields=['patient_reference', 'hip_id']),
+            models.Index(fields=['hip_id', 'status']),
         ]
 
 
@@ -48,6 +49,9 @@ class LinkCareContext(models.Model):
 
     class Meta:
         app_label = 'abdm_hip'
+        indexes = [
+            models.Index(fields=['reference', 'link_request_details'])
+        ]
 
 
 class HIPLinkRequest(models.Model):
@@ -69,6 +73,8 @@ class HealthInformationRequest(models.Model):
     status = models.CharField(choices=HealthInformationStatus.HIP_CHOICES,
                               default=HealthInformationStatus.ACKNOWLEDGED, max_length=40)
     error = models.JSONField(null=True)
+    # Seconds spent in each stage of processing the request, see `abdm_integrator.hip.timings`
+    stage_timings = models.JSONField(default=dict)
     date_created = models.DateTimeField(auto_now_add=True)
     last_modified = models.DateTimeField(auto_now=True)
 
@@ -82,6 +88,8 @@ class HealthDataTransfer(models.Model):
                                                    related_name='health_data_transfer')
     page_number = models.SmallIntegerField()
     care_contexts_status = models.JSONField()
+    # Seconds spent in each stage of building and sending the page, see `abdm_integrator.hip.timings`
+    stage_timings = models.JSONField(default=dict)
     date_created = models.DateTimeField(auto_now_add=True)
     last_modified = models.DateTimeField(auto_now=True)
 
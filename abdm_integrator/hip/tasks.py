@@ -3,6 +3,7 @@ from datetime import datetime
 from celery.schedules import crontab
 
 from abdm_integrator.const import CELERY_PERIODIC_TASK, CELERY_TASK
+from abdm_integrator.deadlines import deadline
 from abdm_integrator.exceptions import ABDMServiceUnavailable
 from abdm_integrator.hip.models import ConsentArtefact
 from abdm_integrator.settings import app_settings
@@ -12,37 +13,43 @@ from abdm_integrator.settings import app_settings
              autoretry_for=(ABDMServiceUnavailable,), retry_backoff=2, max_retries=3)
 def process_hip_consent_notification_request(self, request_data):
     from abdm_integrator.hip.views.consents import GatewayConsentRequestNotifyProcessor
-    GatewayConsentRequestNotifyProcessor(request_data).process_request()
+    with deadline(app_settings.TASK_DEADLINE):
+        GatewayConsentRequestNotifyProcessor(request_data).process_request()
 
 
 @CELERY_TASK(queue=app_settings.CELERY_QUEUE, bind=True, ignore_result=False)
 def process_hip_health_information_request(self, request_data):
     from abdm_integrator.hip.views.health_information import GatewayHealthInformationRequestProcessor
-    GatewayHealthInformationRequestProcessor(request_data).process_request()
+    with deadline(app_settings.TASK_DEADLINE):
+        GatewayHealthInformationRequestProcessor(request_data).process_request()
 
 
 @CELERY_TASK(queue=app_settings.CELERY_QUEUE, bind=True, ignore_result=False)
 def process_patient_care_context_discover_request(self, request_data):
     from abdm_integrator.hip.views.care_contexts import GatewayCareContextsDiscoverProcessor
-    GatewayCareContextsDiscoverProcessor(request_data).process_request()
+    with deadline(app_settings.TASK_DEADLINE):
+        GatewayCareContextsDiscoverProcessor(request_data).process_request()
 
 
 @CELERY_TASK(queue=app_settings.CELERY_QUEUE, bind=True, ignore_result=False)
 def process_patient_care_context_link_init_request(self, request_data):
     from abdm_integrator.hip.views.care_contexts import GatewayCareContextsLinkInitProcessor
-    GatewayCareContextsLinkInitProcessor(request_data).process_request()
+    with deadline(app_settings.TASK_DEADLINE):
+        GatewayCareContextsLinkInitProcessor(request_data).process_request()
 
 
 @CELERY_TASK(queue=app_settings.CELERY_QUEUE, bind=True, ignore_result=False)
 def process_patient_care_context_link_confirm_request(self, request_data):
     from abdm_integrator.hip.views.care_contexts import GatewayCareContextsLinkConfirmProcessor
-    GatewayCareContextsLinkConfirmProcessor(request_data).process_request()
+    with deadline(app_settings.TASK_DEADLINE):
+        GatewayCareContextsLinkConfirmProcessor(request_data).process_request()
 
 
 @CELERY_TASK(queue=app_settings.CELERY_QUEUE, bind=True, ignore_result=False)
 def process_care_context_link_notify(self, link_request_data):
     from abdm_integrator.hip.views.care_contexts import gateway_care_contexts_link_notify
-    gateway_care_contexts_link_notify(link_request_data)
+    with deadline(app_settings.TASK_DEADLINE):
+        gateway_care_contexts_link_notify(link_request_data)
 
 
 @CELERY_PERIODIC_TASK(run_every=crontab(hour='*/2', minute='0'), queue=app_settings.CELERY_QUEUE)
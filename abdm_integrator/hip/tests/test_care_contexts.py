@@ -202,13 +202,13 @@ class TestHIPLinkCareContextAPI(APITestCase, APITestHelperMixin):
                                   expected_error_message, None)
         self._assert_records_count_in_db(1)
 
-    @patch('abdm_integrator.utils.requests.post')
+    @patch('abdm_integrator.utils.http_sessions.post')
     def test_link_care_context_gateway_error(self, mocked_post, *args):
         self.gateway_error_test(mocked_post, self.link_care_context_url,
                                 self._link_care_context_sample_request_data())
         self._assert_records_count_in_db(0)
 
-    @patch('abdm_integrator.utils.requests.post', side_effect=requests.Timeout)
+    @patch('abdm_integrator.utils.http_sessions.post', side_effect=requests.Timeout)
     def test_link_care_context_service_unavailable_error(self, *args):
         client = APIClient(raise_request_exception=False)
         client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
@@ -798,7 +798,7 @@ class TestPatientLinkCareContextAPI(APITestCase, APITestHelperMixin):
             {'code': HIPError.CODE_LINK_CONFIRM_OTP_VERIFICATION_FAILED, 'message': error_message}
         )
 
-    @patch('abdm_integrator.utils.requests.post')
+    @patch('abdm_integrator.utils.http_sessions.post')
     @patch('abdm_integrator.hip.views.care_contexts.GatewayCareContextsLinkConfirmProcessor'
            '.verify_otp_from_patient')
     def test_link_confirm_task_gateway_error(self, mocked_verify_otp_response, mocked_post, *args):
@@ -948,7 +948,7 @@ class TestPatientSMSNotifyAPI(APITestCase, APITestHelperMixin):
             'phoneNo'
         )
 
-    @patch('abdm_integrator.utils.requests.post')
+    @patch('abdm_integrator.utils.http_sessions.post')
     def test_patient_sms_notify_gateway_error(self, mocked_post, *args):
         self.gateway_error_test(
             mocked_post,
@@ -956,7 +956,7 @@ class TestPatientSMSNotifyAPI(APITestCase, APITestHelperMixin):
             self._patient_sms_notify_request_data()
         )
 
-    @patch('abdm_integrator.utils.requests.post', side_effect=requests.Timeout)
+    @patch('abdm_integrator.utils.http_sessions.post', side_effect=requests.Timeout)
     def test_patient_sms_notify_service_unavailable_error(self, *args):
         client = APIClient(raise_request_exception=False)
         client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
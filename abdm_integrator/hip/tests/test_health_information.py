@@ -1,9 +1,14 @@
 import json
+import pickle
+import time
 import uuid
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 from django.contrib.auth.models import User
+from django.test import override_settings
 from rest_framework.reverse import reverse
 from rest_framework.status import (
     HTTP_202_ACCEPTED,
@@ -14,13 +19,15 @@ from rest_framework.status import (
 from rest_framework.test import APIClient, APITestCase
 
 from abdm_integrator.const import (
+    HEALTH_INFORMATION_MEDIA_TYPE,
     HealthInformationStatus,
     HealthInformationType,
     LinkRequestInitiator,
     LinkRequestStatus,
 )
+from abdm_integrator.deadlines import deadline, remaining_time
 from abdm_integrator.exceptions import STANDARD_ERRORS, ABDMGatewayError, ABDMServiceUnavailable
-from abdm_integrator.hip.exceptions import HIPError
+from abdm_integrator.hip.exceptions import HealthDataTransferException, HIPError
 from abdm_integrator.hip.models import (
     ConsentArtefact,
     HealthDataTransfer,
@@ -28,13 +35,30 @@ from abdm_integrator.hip.models import (
     LinkCareContext,
     LinkRequestDetails,
 )
+from abdm_integrator.hip.timings import HIPStage, health_information_timings
 from abdm_integrator.hip.views.health_information import (
     GatewayHealthInformationRequestProcessor,
     HealthDataTransferProcessor,
+    _encrypt_entry_in_process,
 )
+from abdm_integrator.instrumentation import HealthInformationTimingsEvent
+from abdm_integrator.tests.test_instrumentation import EventsCollector
 from abdm_integrator.tests.utils import APITestHelperMixin, generate_mock_response
 
 
+class EncryptedSession:
+    """Crypto session that can be sent to processes"""
+
+    def encrypt(self, data):
+        return 'encrypted'
+
+
+def _completed_future(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
 class TestHIPGatewayHealthInformationRequestAPI(APITestCase, APITestHelperMixin):
 
     @classmethod
@@ -187,6 +211,52 @@ class TestHIPGatewayHealthInformationRequestAPI(APITestCase, APITestHelperMixin)
 
         self.assertEqual(res.status_code, HTTP_202_ACCEPTED)
 
+    @patch('abdm_integrator.hip.views.health_information.process_hip_health_information_request')
+    def test_gateway_health_information_request_duplicate(self, mocked_process_request):
+        request_data = self._health_information_request_data(self.consent_artefact_id)
+
+        for _ in range(2):
+            res = self.client.post(
+                self.gateway_health_information_request_url,
+                data=json.dumps(request_data),
+                content_type='application/json'
+            )
+            self.assertEqual(res.status_code, HTTP_202_ACCEPTED)
+        mocked_process_request.delay.assert_called_once()
+
+    @patch('abdm_integrator.hip.views.health_information.process_hip_health_information_request')
+    def test_gateway_health_information_request_duplicate_transaction(self, mocked_process_request):
+        request_data = self._health_information_request_data(self.consent_artefact_id)
+
+        for _ in range(2):
+            request_data['requestId'] = str(uuid.uuid4())
+            res = self.client.post(
+                self.gateway_health_information_request_url,
+                data=json.dumps(request_data),
+                content_type='application/json'
+            )
+            self.assertEqual(res.status_code, HTTP_202_ACCEPTED)
+        mocked_process_request.delay.assert_called_once()
+
+    @patch('abdm_integrator.hip.views.health_information.process_hip_health_information_request')
+    def test_gateway_health_information_request_queue_error(self, mocked_process_request):
+        mocked_process_request.delay.side_effect = [ConnectionError, None]
+        request_data = self._health_information_request_data(self.consent_artefact_id)
+
+        with self.assertRaises(ConnectionError):
+            self.client.post(
+                self.gateway_health_information_request_url,
+                data=json.dumps(request_data),
+                content_type='application/json'
+            )
+        res = self.client.post(
+            self.gateway_health_information_request_url,
+            data=json.dumps(request_data),
+            content_type='application/json'
+        )
+        self.assertEqual(res.status_code, HTTP_202_ACCEPTED)
+        self.assertEqual(mocked_process_request.delay.call_count, 2)
+
     @patch('abdm_integrator.hip.views.health_information.process_hip_health_information_request')
     def test_gateway_health_information_request_authentication_error(self, *args):
         request_data = self._health_information_request_data(self.consent_artefact_id)
@@ -356,7 +426,7 @@ class TestHIPGatewayHealthInformationRequestAPI(APITestCase, APITestHelperMixin)
 
     @patch('abdm_integrator.integrations.HRPIntegration.fetch_health_data', return_value=['health data'])
     @patch('abdm_integrator.hip.views.health_information.ABDMCrypto.encrypt', return_value='encrypted')
-    @patch('abdm_integrator.hip.views.health_information.requests.post')
+    @patch('abdm_integrator.hip.views.health_information.http_sessions.post')
     def test_process_health_information_transfer_care_contexts_success(self, *args):
         self._add_consent_artefact(self.consent_artefact_id, care_context_references=[self.care_context_reference])
         self._add_linked_care_context_data(self.care_context_reference, [HealthInformationType.PRESCRIPTION])
@@ -384,7 +454,7 @@ class TestHIPGatewayHealthInformationRequestAPI(APITestCase, APITestHelperMixin)
 
     @patch('abdm_integrator.integrations.HRPIntegration.fetch_health_data', return_value=['health data'])
     @patch('abdm_integrator.hip.views.health_information.ABDMCrypto.encrypt', return_value='encrypted')
-    @patch('abdm_integrator.hip.views.health_information.requests.post')
+    @patch('abdm_integrator.hip.views.health_information.http_sessions.post')
     def test_process_health_information_transfer_linked_care_contexts_not_found(self, *args):
         self._add_consent_artefact(self.consent_artefact_id, care_context_references=[self.care_context_reference])
         request_data = self._health_information_request_data(self.consent_artefact_id)
@@ -411,7 +481,7 @@ class TestHIPGatewayHealthInformationRequestAPI(APITestCase, APITestHelperMixin)
 
     @patch('abdm_integrator.integrations.HRPIntegration.fetch_health_data', return_value=['health data'])
     @patch('abdm_integrator.hip.views.health_information.ABDMCrypto.encrypt', return_value='encrypted')
-    @patch('abdm_integrator.hip.views.health_information.requests.post')
+    @patch('abdm_integrator.hip.views.health_information.http_sessions.post')
     def test_process_health_information_transfer_hi_types_validation_failed(self, *args):
         self._add_consent_artefact(self.consent_artefact_id, care_context_references=[self.care_context_reference])
         self._add_linked_care_context_data(self.care_context_reference, [HealthInformationType.WELLNESS_RECORD])
@@ -439,7 +509,7 @@ class TestHIPGatewayHealthInformationRequestAPI(APITestCase, APITestHelperMixin)
 
     @patch('abdm_integrator.integrations.HRPIntegration.fetch_health_data', return_value=['health data'])
     @patch('abdm_integrator.hip.views.health_information.ABDMCrypto.encrypt', return_value='encrypted')
-    @patch('abdm_integrator.hip.views.health_information.requests.post')
+    @patch('abdm_integrator.hip.views.health_information.http_sessions.post')
     def test_process_health_information_transfer_health_data_not_in_range(self, *args):
         self._add_consent_artefact(self.consent_artefact_id, care_context_references=[self.care_context_reference])
         record_date = datetime(year=2023, month=1, day=2).isoformat()
@@ -473,7 +543,7 @@ class TestHIPGatewayHealthInformationRequestAPI(APITestCase, APITestHelperMixin)
 
     @patch('abdm_integrator.integrations.HRPIntegration.fetch_health_data', return_value=[])
     @patch('abdm_integrator.hip.views.health_information.ABDMCrypto.encrypt', return_value='encrypted')
-    @patch('abdm_integrator.hip.views.health_information.requests.post')
+    @patch('abdm_integrator.hip.views.health_information.http_sessions.post')
     def test_process_health_information_transfer_fetch_no_health_data(self, *args):
         self._add_consent_artefact(self.consent_artefact_id, care_context_references=[self.care_context_reference])
         self._add_linked_care_context_data(self.care_context_reference, [HealthInformationType.PRESCRIPTION])
@@ -503,7 +573,7 @@ class TestHIPGatewayHealthInformationRequestAPI(APITestCase, APITestHelperMixin)
     @patch('abdm_integrator.integrations.HRPIntegration.fetch_health_data',
            side_effect=Exception('Internal error'))
     @patch('abdm_integrator.hip.views.health_information.ABDMCrypto.encrypt', return_value='encrypted')
-    @patch('abdm_integrator.hip.views.health_information.requests.post')
+    @patch('abdm_integrator.hip.views.health_information.http_sessions.post')
     def test_process_health_information_transfer_fetch_health_data_error(self, *args):
         self._add_consent_artefact(self.consent_artefact_id, care_context_references=[self.care_context_reference])
         self._add_linked_care_context_data(self.care_context_reference, [HealthInformationType.PRESCRIPTION])
@@ -532,7 +602,7 @@ class TestHIPGatewayHealthInformationRequestAPI(APITestCase, APITestHelperMixin)
     @patch('abdm_integrator.integrations.HRPIntegration.fetch_health_data', return_value=['health data'])
     @patch('abdm_integrator.hip.views.health_information.ABDMCrypto.encrypt',
            side_effect=Exception('Crypto error'))
-    @patch('abdm_integrator.hip.views.health_information.requests.post')
+    @patch('abdm_integrator.hip.views.health_information.http_sessions.post')
     def test_process_health_information_transfer_health_data_encryption_error(self, *args):
         self._add_consent_artefact(self.consent_artefact_id, care_context_references=[self.care_context_reference])
         self._add_linked_care_context_data(self.care_context_reference, [HealthInformationType.PRESCRIPTION])
@@ -561,7 +631,7 @@ class TestHIPGatewayHealthInformationRequestAPI(APITestCase, APITestHelperMixin)
 
     @patch('abdm_integrator.integrations.HRPIntegration.fetch_health_data', return_value=['health data'])
     @patch('abdm_integrator.hip.views.health_information.ABDMCrypto.encrypt', return_value='encrypted')
-    @patch('abdm_integrator.hip.views.health_information.requests.post')
+    @patch('abdm_integrator.hip.views.health_information.http_sessions.post')
     def test_process_health_information_transfer_send_data_hiu_failed(self, mocked_post, *args):
         mocked_post.return_value = generate_mock_response(status_code=HTTP_404_NOT_FOUND,
                                                           json_response={'code': 'error'})
@@ -592,7 +662,7 @@ class TestHIPGatewayHealthInformationRequestAPI(APITestCase, APITestHelperMixin)
 
     @patch('abdm_integrator.integrations.HRPIntegration.fetch_health_data', return_value=['health data'])
     @patch('abdm_integrator.hip.views.health_information.ABDMCrypto.encrypt', return_value='encrypted')
-    @patch('abdm_integrator.hip.views.health_information.requests.post')
+    @patch('abdm_integrator.hip.views.health_information.http_sessions.post')
     def test_process_health_information_transfer_multiple_care_contexts_success(self, *args):
         care_context_references = [self.care_context_reference, uuid.uuid4().hex]
         self._add_consent_artefact(self.consent_artefact_id, care_context_references=care_context_references)
@@ -625,7 +695,7 @@ class TestHIPGatewayHealthInformationRequestAPI(APITestCase, APITestHelperMixin)
 
     @patch('abdm_integrator.integrations.HRPIntegration.fetch_health_data', return_value=['health data'])
     @patch('abdm_integrator.hip.views.health_information.ABDMCrypto.encrypt', return_value='encrypted')
-    @patch('abdm_integrator.hip.views.health_information.requests.post')
+    @patch('abdm_integrator.hip.views.health_information.http_sessions.post')
     def test_process_health_information_multiple_care_contexts_error(self, *args):
         care_context_references = [self.care_context_reference, uuid.uuid4().hex]
         self._add_consent_artefact(self.consent_artefact_id, care_context_references=care_context_references)
@@ -656,7 +726,7 @@ class TestHIPGatewayHealthInformationRequestAPI(APITestCase, APITestHelperMixin)
 
     @patch('abdm_integrator.integrations.HRPIntegration.fetch_health_data', return_value=['health data'])
     @patch('abdm_integrator.hip.views.health_information.ABDMCrypto.encrypt', return_value='encrypted')
-    @patch('abdm_integrator.hip.views.health_information.requests.post')
+    @patch('abdm_integrator.hip.views.health_information.http_sessions.post')
     def test_process_health_information_transfer_multiple_care_contexts_partial_success(self, *args):
         care_context_references = [self.care_context_reference, uuid.uuid4().hex]
         request_data = self._health_information_request_data(self.consent_artefact_id)
@@ -698,9 +768,197 @@ class TestHIPGatewayHealthInformationRequestAPI(APITestCase, APITestHelperMixin)
         )
         self._assert_for_health_data_transfer_single_page(health_information_request, care_contexts_status)
 
+    @override_settings(ABDM_INTEGRATOR={'HIP_HEALTH_DATA_FETCH_WORKERS': 4})
+    @patch('abdm_integrator.hip.views.health_information.ABDMCrypto.encrypt', side_effect=lambda data, _: data)
+    @patch('abdm_integrator.hip.views.health_information.http_sessions.post')
+    @patch('abdm_integrator.integrations.HRPIntegration.fetch_health_data')
+    def test_process_health_information_transfer_concurrent_fetch(self, mocked_fetch_health_data, mocked_post,
+                                                                  *args):
+        care_context_references = [uuid.uuid4().hex for _ in range(6)]
+
+        def fetch_health_data(care_context_reference, *args):
+            index = care_context_references.index(care_context_reference)
+            # Earlier care contexts take longer so that fetches complete out of order
+            time.sleep(0.02 * (len(care_context_references) - index))
+            if index == 2:
+                raise Exception('HRP error')
+            return [{'reference': care_context_reference}]
+        mocked_fetch_health_data.side_effect = fetch_health_data
+
+        self._add_consent_artefact(self.consent_artefact_id, care_context_references=care_context_references)
+        for reference in care_context_references:
+            self._add_linked_care_context_data(reference, [HealthInformationType.PRESCRIPTION])
+        request_data = self._health_information_request_data(self.consent_artefact_id)
+        health_information_request = self._add_health_information_request(
+            self.consent_artefact_id,
+            request_data['transactionId']
+        )
+
+        overall_transfer_status, care_contexts_status = HealthDataTransferProcessor(
+            health_information_request,
+            request_data['hiRequest']
+        ).process()
+
+        self.assertFalse(overall_transfer_status)
+        delivered_references = care_context_references[:2] + care_context_references[3:]
+        self.assertEqual(care_contexts_status[0], {
+            'careContextReference': care_context_references[2],
+            'hiStatus': HealthInformationStatus.ERRORED,
+            'description': 'Error occurred while fetching health data from HRP: HRP error'
+        })
+        self.assertEqual([status['careContextReference'] for status in care_contexts_status[1:]],
+                         delivered_references)
+        entries = json.loads(mocked_post.call_args.kwargs['data'])['entries']
+        self.assertEqual([entry['careContextReference'] for entry in entries], delivered_references)
+        self.assertEqual([json.loads(entry['content'])['reference'] for entry in entries], delivered_references)
+
+    @override_settings(ABDM_INTEGRATOR={'HIP_HEALTH_DATA_FETCH_WORKERS': 2})
+    @patch('abdm_integrator.hip.views.health_information.ABDMCrypto.encrypt', side_effect=lambda data, _: data)
+    @patch('abdm_integrator.hip.views.health_information.http_sessions.post')
+    @patch('abdm_integrator.integrations.HRPIntegration.fetch_health_data')
+    def test_process_health_information_transfer_concurrent_fetch_within_deadline(self, mocked_fetch_health_data,
+                                                                                  *args):
+        care_context_references = [uuid.uuid4().hex for _ in range(2)]
+        remaining_times = []
+
+        def fetch_health_data(care_context_reference, *args):
+            remaining_times.append(remaining_time())
+            return [{'reference': care_context_reference}]
+        mocked_fetch_health_data.side_effect = fetch_health_data
+
+        self._add_consent_artefact(self.consent_artefact_id, care_context_references=care_context_references)
+        for reference in care_context_references:
+            self._add_linked_care_context_data(reference, [HealthInformationType.PRESCRIPTION])
+        request_data = self._health_information_request_data(self.consent_artefact_id)
+        health_information_request = self._add_health_information_request(
+            self.consent_artefact_id,
+            request_data['transactionId']
+        )
+
+        with deadline(60):
+            HealthDataTransferProcessor(health_information_request, request_data['hiRequest']).process()
+
+        self.assertEqual(len(remaining_times), 2)
+        self.assertTrue(all(remaining is not None and 0 < remaining <= 60 for remaining in remaining_times))
+
+    def test_encrypt_entry_in_process(self):
+        entry, timings = _encrypt_entry_in_process(EncryptedSession(), self.care_context_reference, {'data': 1},
+                                                   HEALTH_INFORMATION_MEDIA_TYPE)
+        self.assertEqual(entry['careContextReference'], self.care_context_reference)
+        self.assertEqual(entry['content'], 'encrypted')
+        self.assertEqual(set(timings), {HIPStage.SERIALIZATION, HIPStage.ENCRYPTION})
+
+    def _process_transfer_with_encryption_processes(self):
+        self._add_consent_artefact(self.consent_artefact_id, care_context_references=[self.care_context_reference])
+        self._add_linked_care_context_data(self.care_context_reference, [HealthInformationType.PRESCRIPTION])
+        request_data = self._health_information_request_data(self.consent_artefact_id)
+        health_information_request = self._add_health_information_request(
+            self.consent_artefact_id,
+            request_data['transactionId']
+        )
+        overall_transfer_status, care_contexts_status = HealthDataTransferProcessor(
+            health_information_request,
+            request_data['hiRequest']
+        ).process()
+        self.assertTrue(overall_transfer_status)
+        self.assertEqual([status['hiStatus'] for status in care_contexts_status],
+                         [HealthInformationStatus.DELIVERED])
+        self._assert_for_health_data_transfer_single_page(health_information_request, care_contexts_status)
+
+    @override_settings(ABDM_INTEGRATOR={'HIP_HEALTH_DATA_ENCRYPTION_PROCESSES': 2})
+    @patch('abdm_integrator.integrations.HRPIntegration.fetch_health_data', return_value=['health data'])
+    @patch('abdm_integrator.hip.views.health_information.ABDMCrypto.encrypt', return_value='encrypted')
+    @patch('abdm_integrator.hip.views.health_information.http_sessions.post')
+    def test_process_health_information_transfer_encryption_in_daemonic_process(self, mocked_post, *args):
+        with patch('abdm_integrator.process_pools.multiprocessing.current_process',
+                   return_value=Mock(daemon=True)):
+            self._process_transfer_with_encryption_processes()
+        entries = json.loads(mocked_post.call_args.kwargs['data'])['entries']
+        self.assertEqual([entry['content'] for entry in entries], ['encrypted'])
+
+    @override_settings(ABDM_INTEGRATOR={'HIP_HEALTH_DATA_ENCRYPTION_PROCESSES': 2})
+    @patch('abdm_integrator.integrations.HRPIntegration.fetch_health_data', return_value=['health data'])
+    @patch('abdm_integrator.hip.views.health_information.ABDMCrypto.session', return_value=EncryptedSession())
+    @patch('abdm_integrator.hip.views.health_information.http_sessions.post')
+    def test_process_health_information_transfer_encryption_processes(self, mocked_post, mocked_session, *args):
+        pool = Mock()
+        # Arguments are pickled, as when sent to the processes
+        pool.submit.side_effect = lambda func, *args: _completed_future(func(*pickle.loads(pickle.dumps(args))))
+        with patch('abdm_integrator.hip.views.health_information.ProcessPools.get_pool',
+                   return_value=pool) as mocked_get_pool:
+            self._process_transfer_with_encryption_processes()
+        mocked_get_pool.assert_called_once_with('hip_encryption', 2)
+        pool.submit.assert_called_once()
+        pool.shutdown.assert_not_called()
+        self.assertIs(pool.submit.call_args.args[1], mocked_session.return_value)
+        entries = json.loads(mocked_post.call_args.kwargs['data'])['entries']
+        self.assertEqual([entry['content'] for entry in entries], ['encrypted'])
+
+    @override_settings(ABDM_INTEGRATOR={'HIP_HEALTH_DATA_ENCRYPTION_PROCESSES': 2})
+    @patch('abdm_integrator.integrations.HRPIntegration.fetch_health_data', return_value=['health data'])
+    @patch('abdm_integrator.hip.views.health_information.ABDMCrypto.encrypt', return_value='encrypted')
+    @patch('abdm_integrator.hip.views.health_information.http_sessions.post')
+    def test_process_health_information_transfer_broken_encryption_pool(self, *args):
+        pool = Mock()
+        pool.submit.side_effect = BrokenProcessPool()
+        with patch('abdm_integrator.hip.views.health_information.ProcessPools.get_pool', return_value=pool), \
+                patch('abdm_integrator.hip.views.health_information.ProcessPools.discard') as mocked_discard:
+            self._process_transfer_with_encryption_processes()
+        mocked_discard.assert_called_once_with('hip_encryption', pool)
+
+    @patch('abdm_integrator.hip.views.health_information.ABDMRequestHelper.gateway_post')
+    @patch('abdm_integrator.integrations.HRPIntegration.fetch_health_data', return_value=['health data'])
+    @patch('abdm_integrator.hip.views.health_information.ABDMCrypto.encrypt', return_value='encrypted')
+    @patch('abdm_integrator.hip.views.health_information.http_sessions.post')
+    @patch('abdm_integrator.hip.views.health_information.HealthDataTransferProcessor.entries_per_page', 1)
+    @override_settings(ABDM_INTEGRATOR={
+        'OUTBOUND_REQUEST_COLLECTORS': ['abdm_integrator.tests.test_instrumentation.EventsCollector'],
+    })
+    def test_process_health_information_request_stage_timings(self, *args):
+        EventsCollector.events = []
+        care_context_references = [self.care_context_reference, uuid.uuid4().hex]
+        self._add_consent_artefact(self.consent_artefact_id, care_context_references=care_context_references)
+        for reference in care_context_references:
+            self._add_linked_care_context_data(reference, [HealthInformationType.PRESCRIPTION])
+        request_data = self._health_information_request_data(self.consent_artefact_id)
+        signals = []
+
+        def receiver(sender, transaction_id, page_number, timings, **kwargs):
+            signals.append((page_number, timings))
+
+        health_information_timings.connect(receiver)
+        self.addCleanup(health_information_timings.disconnect, receiver)
+
+        GatewayHealthInformationRequestProcessor(request_data).process_request()
+
+        page_stages = {HIPStage.LINKED_CARE_CONTEXT_LOOKUP, HIPStage.HRP_FETCH, HIPStage.SERIALIZATION,
+                       HIPStage.ENCRYPTION, HIPStage.PUSH}
+        results = HealthDataTransfer.objects.filter(
+            health_information_request__transaction_id=request_data['transactionId']
+        ).order_by('page_number')
+        self.assertEqual([set(result.stage_timings) for result in results], [page_stages, page_stages])
+        health_information_request = HealthInformationRequest.objects.get(
+            transaction_id=request_data['transactionId']
+        )
+        self.assertEqual(
+            set(health_information_request.stage_timings),
+            page_stages | {HIPStage.ARTEFACT_LOOKUP, HIPStage.VALIDATION, HIPStage.ON_REQUEST, HIPStage.NOTIFY}
+        )
+        self.assertAlmostEqual(
+            health_information_request.stage_timings[HIPStage.PUSH],
+            sum(result.stage_timings[HIPStage.PUSH] for result in results),
+            places=5
+        )
+        self.assertEqual([page_number for page_number, _ in signals], [1, 2, None])
+        self.assertEqual(signals[-1][1], health_information_request.stage_timings)
+        timings_events = [event for event in EventsCollector.events
+                          if isinstance(event, HealthInformationTimingsEvent)]
+        self.assertEqual([event.page_number for event in timings_events], [1, 2, None])
+        self.assertEqual(timings_events[-1].timings, health_information_request.stage_timings)
+
     @patch('abdm_integrator.integrations.HRPIntegration.fetch_health_data', return_value=['health data'])
     @patch('abdm_integrator.hip.views.health_information.ABDMCrypto.encrypt', return_value='encrypted')
-    @patch('abdm_integrator.hip.views.health_information.requests.post')
+    @patch('abdm_integrator.hip.views.health_information.http_sessions.post')
     @patch('abdm_integrator.hip.views.health_information.HealthDataTransferProcessor.entries_per_page', 1)
     def test_process_health_information_transfer_multi_page(self, *args):
         care_context_references = [self.care_context_reference, uuid.uuid4().hex]
@@ -739,3 +997,230 @@ class TestHIPGatewayHealthInformationRequestAPI(APITestCase, APITestHelperMixin)
         self.assertEqual(results[1].page_number, 2)
         self.assertEqual(results[0].care_contexts_status, [care_contexts_status[0]])
         self.assertEqual(results[1].care_contexts_status, [care_contexts_status[1]])
+
+    @override_settings(ABDM_INTEGRATOR={'HIP_PAGE_DELIVERY_QUEUE_SIZE': 1, 'HIP_PAGE_DELIVERY_WORKERS': 2})
+    @patch('abdm_integrator.integrations.HRPIntegration.fetch_health_data', return_value=['health data'])
+    @patch('abdm_integrator.hip.views.health_information.ABDMCrypto.encrypt', return_value='encrypted')
+    @patch('abdm_integrator.hip.views.health_information.http_sessions.post')
+    @patch('abdm_integrator.hip.views.health_information.HealthDataTransferProcessor.entries_per_page', 1)
+    def test_process_health_information_transfer_pipelined_pages(self, mocked_post, *args):
+        care_context_references = [uuid.uuid4().hex for _ in range(4)]
+
+        def post(url, data, **kwargs):
+            page_number = json.loads(data)['pageNumber']
+            # Earlier pages take longer so that deliveries complete out of order
+            time.sleep(0.02 * (len(care_context_references) - page_number))
+            if page_number == 2:
+                raise Exception('HIU error')
+            return generate_mock_response(HTTP_202_ACCEPTED)
+        mocked_post.side_effect = post
+
+        self._add_consent_artefact(self.consent_artefact_id, care_context_references=care_context_references)
+        for reference in care_context_references:
+            self._add_linked_care_context_data(reference, [HealthInformationType.PRESCRIPTION])
+        request_data = self._health_information_request_data(self.consent_artefact_id)
+        health_information_request = self._add_health_information_request(
+            self.consent_artefact_id,
+            request_data['transactionId']
+        )
+
+        overall_transfer_status, care_contexts_status = HealthDataTransferProcessor(
+            health_information_request,
+            request_data['hiRequest'],
+        ).process()
+
+        self.assertFalse(overall_transfer_status)
+        self.assertEqual([status['careContextReference'] for status in care_contexts_status],
+                         care_context_references)
+        self.assertEqual([status['hiStatus'] for status in care_contexts_status], [
+            HealthInformationStatus.DELIVERED,
+            HealthInformationStatus.ERRORED,
+            HealthInformationStatus.DELIVERED,
+            HealthInformationStatus.DELIVERED,
+        ])
+        payloads = sorted((json.loads(call.kwargs['data']) for call in mocked_post.call_args_list),
+                          key=lambda payload: payload['pageNumber'])
+        self.assertEqual([(payload['pageNumber'], payload['pageCount']) for payload in payloads],
+                         [(1, 4), (2, 4), (3, 4), (4, 4)])
+        results = HealthDataTransfer.objects.filter(
+            health_information_request=health_information_request
+        ).order_by('id')
+        self.assertEqual([result.page_number for result in results], [1, 2, 3, 4])
+        self.assertEqual([result.care_contexts_status for result in results],
+                         [[status] for status in care_contexts_status])
+
+    @override_settings(ABDM_INTEGRATOR={'HIP_PAGE_MAX_BYTES': 1000, 'HIP_PAGE_MAX_ENTRIES': 3})
+    @patch('abdm_integrator.hip.views.health_information.ABDMCrypto.encrypt', side_effect=lambda data, _: data)
+    @patch('abdm_integrator.hip.views.health_information.http_sessions.post')
+    @patch('abdm_integrator.integrations.HRPIntegration.fetch_health_data')
+    def test_process_health_information_transfer_pages_by_size(self, mocked_fetch_health_data, mocked_post,
+                                                               *args):
+        care_context_references = [uuid.uuid4().hex for _ in range(7)]
+        bundles_by_reference = {
+            care_context_references[0]: [{'data': 'a' * 100}],
+            care_context_references[1]: [{'data': 'b' * 100}, {'data': 'b' * 100}],
+            # Does not fit in the first page as the page would have 4 entries
+            care_context_references[2]: [{'data': 'c' * 100}, {'data': 'c' * 100}],
+            # Exceeds the byte limit alone and is sent in a page of its own
+            care_context_references[3]: [{'data': 'd' * 2000}],
+            # Linked care context is not found for index 4
+            care_context_references[5]: [{'data': 'e' * 300}],
+            care_context_references[6]: [{'data': 'f' * 300}],
+        }
+        mocked_fetch_health_data.side_effect = lambda reference, *args: bundles_by_reference[reference]
+        mocked_post.return_value = generate_mock_response(HTTP_202_ACCEPTED)
+
+        self._add_consent_artefact(self.consent_artefact_id, care_context_references=care_context_references)
+        for reference in bundles_by_reference:
+            self._add_linked_care_context_data(reference, [HealthInformationType.PRESCRIPTION])
+        request_data = self._health_information_request_data(self.consent_artefact_id)
+        health_information_request = self._add_health_information_request(
+            self.consent_artefact_id,
+            request_data['transactionId']
+        )
+
+        overall_transfer_status, care_contexts_status = HealthDataTransferProcessor(
+            health_information_request,
+            request_data['hiRequest'],
+        ).process()
+
+        self.assertFalse(overall_transfer_status)
+        payloads = [json.loads(call.kwargs['data']) for call in mocked_post.call_args_list]
+        self.assertEqual([(payload['pageNumber'], payload['pageCount']) for payload in payloads],
+                         [(1, 4), (2, 4), (3, 4), (4, 4)])
+        self.assertEqual(
+            [[entry['careContextReference'] for entry in payload['entries']] for payload in payloads],
+            [
+                care_context_references[:2] + care_context_references[1:2],
+                care_context_references[2:3] * 2,
+                care_context_references[3:4],
+                care_context_references[5:7],
+            ]
+        )
+        results = HealthDataTransfer.objects.filter(
+            health_information_request=health_information_request
+        ).order_by('id')
+        self.assertEqual(
+            [[status['careContextReference'] for status in result.care_contexts_status] for result in results],
+            [
+                care_context_references[:2],
+                care_context_references[2:3],
+                care_context_references[3:4],
+                care_context_references[4:7],
+            ]
+        )
+        self.assertEqual(results[3].care_contexts_status[0]['hiStatus'], HealthInformationStatus.ERRORED)
+
+    @override_settings(ABDM_INTEGRATOR={'HIP_PAGE_MAX_BYTES': 1000, 'HIP_PAGE_MAX_ENTRIES': 100})
+    # Care contexts are processed one at a time instead of in chunks of 10
+    @patch('abdm_integrator.hip.views.health_information.HealthDataTransferProcessor.entries_per_page', 1)
+    @patch('abdm_integrator.hip.views.health_information.ABDMCrypto.encrypt', side_effect=lambda data, _: data)
+    @patch('abdm_integrator.hip.views.health_information.http_sessions.post')
+    @patch('abdm_integrator.integrations.HRPIntegration.fetch_health_data')
+    def test_process_health_information_transfer_pages_by_size_spooled(self, mocked_fetch_health_data,
+                                                                       mocked_post, *args):
+        care_context_references = [uuid.uuid4().hex for _ in range(3)]
+        spooled_pages_at_fetch = []
+
+        def fetch_health_data(care_context_reference, *args):
+            spooled_pages_at_fetch.append(mocked_spool_page.call_count)
+            return [{'data': care_context_reference * 20}]
+        mocked_fetch_health_data.side_effect = fetch_health_data
+        mocked_post.return_value = generate_mock_response(HTTP_202_ACCEPTED)
+
+        self._add_consent_artefact(self.consent_artefact_id, care_context_references=care_context_references)
+        for reference in care_context_references:
+            self._add_linked_care_context_data(reference, [HealthInformationType.PRESCRIPTION])
+        request_data = self._health_information_request_data(self.consent_artefact_id)
+        health_information_request = self._add_health_information_request(
+            self.consent_artefact_id,
+            request_data['transactionId']
+        )
+
+        with patch.object(HealthDataTransferProcessor, '_spool_page',
+                          wraps=HealthDataTransferProcessor._spool_page) as mocked_spool_page:
+            HealthDataTransferProcessor(health_information_request, request_data['hiRequest']).process()
+
+        # Each care context fills a page, which is spooled before the next care context is fetched
+        self.assertEqual(spooled_pages_at_fetch, [0, 0, 1])
+        self.assertEqual(mocked_spool_page.call_count, 3)
+        payloads = [json.loads(call.kwargs['data']) for call in mocked_post.call_args_list]
+        self.assertEqual(
+            [(payload['pageNumber'], payload['pageCount'], payload['entries'][0]['careContextReference'])
+             for payload in payloads],
+            [(index + 1, 3, reference) for index, reference in enumerate(care_context_references)]
+        )
+
+    @patch('abdm_integrator.hip.views.health_information.HealthDataTransferProcessor'
+           '.linked_care_contexts_query_chunk_size', 2)
+    def test_fetch_linked_care_contexts_in_chunks(self):
+        care_context_references = [uuid.uuid4().hex for _ in range(5)]
+        self._add_consent_artefact(self.consent_artefact_id, care_context_references=care_context_references)
+        for reference in care_context_references[:4]:
+            self._add_linked_care_context_data(reference, [HealthInformationType.PRESCRIPTION])
+        request_data = self._health_information_request_data(self.consent_artefact_id)
+        health_information_request = self._add_health_information_request(
+            self.consent_artefact_id,
+            request_data['transactionId']
+        )
+        processor = HealthDataTransferProcessor(health_information_request, request_data['hiRequest'])
+
+        with self.assertNumQueries(3):
+            for care_context in processor.care_contexts[:4]:
+                linked_care_context = processor.fetch_linked_care_context(care_context)
+                self.assertEqual(linked_care_context.reference, care_context['careContextReference'])
+                self.assertEqual(linked_care_context.link_request_details.hip_id, '1001')
+        with self.assertRaisesMessage(HealthDataTransferException,
+                                      f'Linked Care Context not found for {care_context_references[4]}'):
+            processor.fetch_linked_care_context(processor.care_contexts[4])
+
+    @patch('abdm_integrator.hip.views.health_information.ABDMCrypto.encrypt', side_effect=lambda data, _: data)
+    @patch('abdm_integrator.hip.views.health_information.http_sessions.post')
+    @patch('abdm_integrator.integrations.HRPIntegration.fetch_health_data')
+    @patch('abdm_integrator.integrations.HRPIntegration.fetch_health_data_bulk')
+    def test_process_health_information_transfer_bulk_fetch(self, mocked_fetch_health_data_bulk,
+                                                            mocked_fetch_health_data, mocked_post, *args):
+        care_context_references = [uuid.uuid4().hex for _ in range(4)]
+        mocked_fetch_health_data_bulk.return_value = {
+            care_context_references[0]: [{'reference': care_context_references[0]}],
+            care_context_references[1]: Exception('HRP error'),
+            care_context_references[3]: [{'reference': care_context_references[3]}],
+        }
+        mocked_post.return_value = generate_mock_response(HTTP_202_ACCEPTED)
+        self._add_consent_artefact(self.consent_artefact_id, care_context_references=care_context_references)
+        for reference in care_context_references:
+            self._add_linked_care_context_data(reference, [HealthInformationType.PRESCRIPTION])
+        request_data = self._health_information_request_data(self.consent_artefact_id)
+        health_information_request = self._add_health_information_request(
+            self.consent_artefact_id,
+            request_data['transactionId']
+        )
+
+        overall_transfer_status, care_contexts_status = HealthDataTransferProcessor(
+            health_information_request,
+            request_data['hiRequest'],
+        ).process()
+
+        self.assertFalse(overall_transfer_status)
+        mocked_fetch_health_data.assert_not_called()
+        mocked_fetch_health_data_bulk.assert_called_once()
+        references, health_info_types, details_by_reference = mocked_fetch_health_data_bulk.call_args.args
+        self.assertEqual(references, care_context_references)
+        self.assertEqual(health_info_types[care_context_references[0]], [HealthInformationType.PRESCRIPTION])
+        self.assertEqual(details_by_reference[care_context_references[0]]['reference'], care_context_references[0])
+        self.assertEqual(care_contexts_status[:2], [
+            {
+                'careContextReference': care_context_references[1],
+                'hiStatus': HealthInformationStatus.ERRORED,
+                'description': 'Error occurred while fetching health data from HRP: HRP error'
+            },
+            {
+                'careContextReference': care_context_references[2],
+                'hiStatus': HealthInformationStatus.ERRORED,
+                'description': 'Error occurred while fetching health data from HRP: '
+                               f'No health record available from HRP for {care_context_references[2]}'
+            },
+        ])
+        entries = json.loads(mocked_post.call_args.kwargs['data'])['entries']
+        self.assertEqual([json.loads(entry['content'])['reference'] for entry in entries],
+                         [care_context_references[0], care_context_references[3]])
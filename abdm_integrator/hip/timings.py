@@ -0,0 +1,82 @@
+"""
+Timings of the stages of processing a health information request by HIP, to find whether HRP, encryption or the
+HIU endpoint is the bottleneck of a slow transfer.
+Timings of the stages of a page are saved with its `HealthDataTransfer` and are summed over its care contexts,
+so may exceed the wall time when care contexts are processed concurrently. Timings of the request and the sum
+over all pages are saved with `HealthInformationRequest`.
+Timings are also sent as `health_information_timings` signal and emitted as `HealthInformationTimingsEvent` to the
+instrumentation collectors.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.dispatch import Signal
+
+from abdm_integrator.instrumentation import HealthInformationTimingsEvent, emit_event
+
+logger = logging.getLogger('abdm_integrator')
+
+# Sent with `transaction_id`, `page_number` (None for timings of the whole request) and `timings` arguments
+health_information_timings = Signal()
+
+
+class HIPStage:
+    ARTEFACT_LOOKUP = 'artefact_lookup'
+    VALIDATION = 'validation'
+    ON_REQUEST = 'on_request'
+    LINKED_CARE_CONTEXT_LOOKUP = 'linked_care_context_lookup'
+    HRP_FETCH = 'hrp_fetch'
+    SERIALIZATION = 'serialization'
+    ENCRYPTION = 'encryption'
+    PUSH = 'push'
+    NOTIFY = 'notify'
+
+
+class StageTimings:
+    """Thread safe sum of seconds spent in each stage"""
+
+    def __init__(self):
+        self._seconds = Counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self._seconds[stage] += seconds
+
+    def merge(self, timings):
+        """Adds timings from other `StageTimings` or dict of stage to seconds"""
+        if isinstance(timings, StageTimings):
+            timings = timings.as_dict()
+        for stage, seconds in timings.items():
+            self.add(stage, seconds)
+
+    def as_dict(self):
+        with self._lock:
+            return {stage: round(seconds, 6) for stage, seconds in self._seconds.items()}
+
+
+def emit_stage_timings(transaction_id, timings, page_number=None):
+    """
+    Sends `health_information_timings` signal and emits `HealthInformationTimingsEvent` for timings of a page,
+    or of the whole request if `page_number` is None.
+    """
+    emit_event(HealthInformationTimingsEvent(transaction_id=transaction_id, page_number=page_number,
+                                             timings=timings))
+    responses = health_information_timings.send_robust(
+        sender=None, transaction_id=transaction_id, page_number=page_number, timings=timings
+    )
+    for receiver, response in responses:
+        if isinstance(response, Exception):
+            logger.error('ABDM: Error in health information timings signal receiver %s', receiver,
+                         exc_info=response)
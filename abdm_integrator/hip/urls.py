@@ -1,7 +1,10 @@
 from django.urls import path
 
+from abdm_integrator.async_views import sync_or_async_view
 from abdm_integrator.const import GATEWAY_CALLBACK_URL_PREFIX
 from abdm_integrator.hip.views.care_contexts import (
+    AsyncLinkCareContextRequest,
+    AsyncPatientSMSNotify,
     GatewayCareContextsDiscover,
     GatewayCareContextsLinkConfirm,
     GatewayCareContextsLinkInit,
@@ -15,8 +18,12 @@ from abdm_integrator.hip.views.consents import GatewayConsentRequestNotify
 from abdm_integrator.hip.views.health_information import GatewayHealthInformationRequest
 
 hip_urls = [
-    path('api/hip/link_care_context', LinkCareContextRequest.as_view(), name='link_care_context'),
-    path('api/hip/patients/sms/notify2', PatientSMSNotify.as_view(), name='patient_sms_notify'),
+    path('api/hip/link_care_context',
+         sync_or_async_view('link_care_context', LinkCareContextRequest, AsyncLinkCareContextRequest),
+         name='link_care_context'),
+    path('api/hip/patients/sms/notify2',
+         sync_or_async_view('patient_sms_notify', PatientSMSNotify, AsyncPatientSMSNotify),
+         name='patient_sms_notify'),
     # APIS that will be triggered by ABDM Gateway
     path(f'{GATEWAY_CALLBACK_URL_PREFIX}/consents/hip/notify', GatewayConsentRequestNotify.as_view(),
          name='gateway_consent_request_notify_hip'),
@@ -2,10 +2,13 @@ import logging
 from copy import deepcopy
 from dataclasses import dataclass
 
+from asgiref.sync import sync_to_async
 from django.db import transaction
 from rest_framework.response import Response
 from rest_framework.status import HTTP_200_OK, HTTP_202_ACCEPTED
 
+from abdm_integrator.async_views import AsyncAPIViewMixin, run_in_thread
+from abdm_integrator.callbacks import delay_callback_once, publish_callback_response
 from abdm_integrator.const import (
     CALLBACK_RESPONSE_CACHE_TIMEOUT,
     AuthenticationMode,
@@ -54,9 +57,9 @@ from abdm_integrator.hip.views.base import HIPBaseView, HIPGatewayBaseView
 from abdm_integrator.settings import app_settings
 from abdm_integrator.user_auth.views import AuthConfirm, AuthInit
 from abdm_integrator.utils import (
-    ABDMCache,
     ABDMRequestHelper,
     abdm_iso_to_datetime,
+    async_poll_and_pop_data_from_cache,
     datetime_to_abdm_iso,
     poll_and_pop_data_from_cache,
     removes_prefix_for_abdm_mobile,
@@ -140,13 +143,28 @@ class LinkCareContextRequest(HIPBaseView):
         return Response(status=HTTP_200_OK, data=response_data["acknowledgement"])
 
 
+class AsyncLinkCareContextRequest(AsyncAPIViewMixin, LinkCareContextRequest):
+    """Async variant of `LinkCareContextRequest` that waits for callback response without holding a thread."""
+
+    async def post(self, request, format=None):
+        serializer = LinkCareContextRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        await sync_to_async(self.ensure_not_already_linked)(serializer.data)
+        gateway_request_id = await run_in_thread(self.gateway_add_care_contexts, serializer.data)
+        await sync_to_async(self.save_link_request)(request.user, gateway_request_id, serializer.data)
+        response_data = await async_poll_and_pop_data_from_cache(gateway_request_id)
+        response = self.generate_response_from_callback(response_data)
+        await sync_to_async(process_care_context_link_notify.delay)(serializer.data)
+        return response
+
+
 class GatewayOnAddContexts(HIPGatewayBaseView):
 
     def post(self, request, format=None):
         serializer = GatewayOnAddContextsSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         self.update_linking_status(serializer.data)
-        ABDMCache.set(serializer.data['resp']['requestId'], serializer.data, 10)
+        publish_callback_response(serializer.data['resp']['requestId'], serializer.data, 10)
         return Response(status=HTTP_202_ACCEPTED)
 
     def update_linking_status(self, request_data):
@@ -233,7 +251,8 @@ class GatewayCareContextsDiscover(HIPGatewayBaseView):
     def post(self, request, format=None):
         GatewayCareContextsDiscoverSerializer(data=request.data).is_valid(raise_exception=True)
         request.data['hip_id'] = request.META.get(HEADER_NAME_HIP_ID)
-        process_patient_care_context_discover_request.delay(request.data)
+        delay_callback_once('hip_care_contexts_discover', [request.data['requestId']],
+                            process_patient_care_context_discover_request, request.data)
         return Response(status=HTTP_202_ACCEPTED)
 
 
@@ -325,7 +344,8 @@ class GatewayCareContextsLinkInit(HIPGatewayBaseView):
     def post(self, request, format=None):
         GatewayCareContextsLinkInitSerializer(data=request.data).is_valid(raise_exception=True)
         request.data['hip_id'] = request.META.get(HEADER_NAME_HIP_ID)
-        process_patient_care_context_link_init_request.delay(request.data)
+        delay_callback_once('hip_care_contexts_link_init', [request.data['requestId']],
+                            process_patient_care_context_link_init_request, request.data)
         return Response(status=HTTP_202_ACCEPTED)
 
 
@@ -477,7 +497,8 @@ class GatewayCareContextsLinkConfirm(HIPGatewayBaseView):
     def post(self, request, format=None):
         GatewayCareContextsLinkConfirmSerializer(data=request.data).is_valid(raise_exception=True)
         request.data['hip_id'] = request.META.get(HEADER_NAME_HIP_ID)
-        process_patient_care_context_link_confirm_request.delay(request.data)
+        delay_callback_once('hip_care_contexts_link_confirm', [request.data['requestId']],
+                            process_patient_care_context_link_confirm_request, request.data)
         return Response(status=HTTP_202_ACCEPTED)
 
 
@@ -604,10 +625,23 @@ class PatientSMSNotify(HIPBaseView):
         return Response(status=HTTP_200_OK, data={'status': status})
 
 
+class AsyncPatientSMSNotify(AsyncAPIViewMixin, PatientSMSNotify):
+    """Async variant of `PatientSMSNotify` that waits for callback response without holding a thread."""
+
+    async def post(self, request, format=None):
+        serializer = PatientSMSNotifySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        gateway_request_id = await run_in_thread(self.gateway_patient_sms_notify, serializer.data)
+        response_data = await async_poll_and_pop_data_from_cache(gateway_request_id)
+        return self.generate_response_from_callback(response_data)
+
+
 class GatewayPatientSMSOnNotify(HIPGatewayBaseView):
 
     def post(self, request, format=None):
         serializer = GatewayPatientSMSOnNotifySerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        ABDMCache.set(serializer.data['resp']['requestId'], serializer.data, CALLBACK_RESPONSE_CACHE_TIMEOUT)
+        publish_callback_response(
+            serializer.data['resp']['requestId'], serializer.data, CALLBACK_RESPONSE_CACHE_TIMEOUT
+        )
         return Response(status=HTTP_202_ACCEPTED)
@@ -2,6 +2,7 @@ from django.db import transaction
 from rest_framework.response import Response
 from rest_framework.status import HTTP_202_ACCEPTED
 
+from abdm_integrator.callbacks import delay_callback_once
 from abdm_integrator.const import ConsentStatus
 from abdm_integrator.hip.const import HIPGatewayAPIPath
 from abdm_integrator.hip.models import ConsentArtefact
@@ -15,7 +16,8 @@ class GatewayConsentRequestNotify(HIPGatewayBaseView):
 
     def post(self, request, format=None):
         GatewayConsentRequestNotifySerializer(data=request.data).is_valid(raise_exception=True)
-        process_hip_consent_notification_request.delay(request.data)
+        delay_callback_once('hip_consent_notify', [request.data['requestId']],
+                            process_hip_consent_notification_request, request.data)
         return Response(status=HTTP_202_ACCEPTED)
 
 
@@ -1,18 +1,30 @@
+import itertools
 import json
 import math
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager, nullcontext
+from contextvars import copy_context
 from datetime import datetime
 
-import requests
+from django.db import close_old_connections
 from rest_framework.response import Response
 from rest_framework.status import HTTP_202_ACCEPTED
 
+from abdm_integrator import http_sessions
+from abdm_integrator.callbacks import delay_callback_once
 from abdm_integrator.const import (
     HEALTH_INFORMATION_MEDIA_TYPE,
+    APIPathGroup,
     HealthInformationStatus,
     LinkRequestStatus,
     RequesterType,
 )
 from abdm_integrator.crypto import ABDMCrypto
+from abdm_integrator.deadlines import request_timeout
 from abdm_integrator.exceptions import ABDMGatewayError, ABDMServiceUnavailable
 from abdm_integrator.hip.const import HIPGatewayAPIPath
 from abdm_integrator.hip.exceptions import HealthDataTransferException, HIPError
@@ -25,16 +37,24 @@ from abdm_integrator.hip.models import (
 from abdm_integrator.hip.serializers.care_contexts import LinkCareContextFetchSerializer
 from abdm_integrator.hip.serializers.health_information import GatewayHealthInformationRequestSerializer
 from abdm_integrator.hip.tasks import process_hip_health_information_request
+from abdm_integrator.hip.timings import HIPStage, StageTimings, emit_stage_timings
 from abdm_integrator.hip.views.base import HIPGatewayBaseView
+from abdm_integrator.instrumentation import send_instrumented
+from abdm_integrator.process_pools import ProcessPools
 from abdm_integrator.settings import app_settings
 from abdm_integrator.utils import ABDMRequestHelper, abdm_iso_to_datetime, datetime_to_abdm_iso
 
+ENCRYPTION_POOL = 'hip_encryption'
+
 
 class GatewayHealthInformationRequest(HIPGatewayBaseView):
 
     def post(self, request, format=None):
         GatewayHealthInformationRequestSerializer(data=request.data).is_valid(raise_exception=True)
-        process_hip_health_information_request.delay(request.data)
+        # Gateway may also deliver the same transaction again with a new requestId
+        delay_callback_once('hip_health_information_request',
+                            [request.data['requestId'], request.data['transactionId']],
+                            process_hip_health_information_request, request.data)
         return Response(status=HTTP_202_ACCEPTED)
 
 
@@ -45,23 +65,32 @@ class GatewayHealthInformationRequestProcessor:
         self.health_information_request = HealthInformationRequest.objects.create(
             transaction_id=self.request_data['transactionId']
         )
+        self.timings = StageTimings()
 
     def process_request(self):
-        artefact = self.fetch_artefact()
-        self.update_health_information_request_artefact(artefact)
-        error = self.validate_request(artefact)
+        with self.timings.time(HIPStage.ARTEFACT_LOOKUP):
+            artefact = self.fetch_artefact()
+            self.update_health_information_request_artefact(artefact)
+        with self.timings.time(HIPStage.VALIDATION):
+            error = self.validate_request(artefact)
         try:
-            self.gateway_health_information_on_request(error)
+            with self.timings.time(HIPStage.ON_REQUEST):
+                self.gateway_health_information_on_request(error)
         except (ABDMServiceUnavailable, ABDMGatewayError) as err:
             error = err.error
         if error:
             self.update_health_information_request_error(error)
+            self.save_stage_timings()
             return error
-        overall_transfer_status, care_contexts_status = HealthDataTransferProcessor(
+        health_data_transfer_processor = HealthDataTransferProcessor(
             self.health_information_request, self.request_data['hiRequest']
-        ).process()
+        )
+        overall_transfer_status, care_contexts_status = health_data_transfer_processor.process()
+        self.timings.merge(health_data_transfer_processor.timings)
         self.update_health_information_request_transfer_status(overall_transfer_status)
-        self.gateway_health_information_on_transfer(overall_transfer_status, care_contexts_status)
+        with self.timings.time(HIPStage.NOTIFY):
+            self.gateway_health_information_on_transfer(overall_transfer_status, care_contexts_status)
+        self.save_stage_timings()
 
     def fetch_artefact(self):
         artefact_id = self.request_data['hiRequest']['consent']['id']
@@ -123,6 +152,11 @@ class GatewayHealthInformationRequestProcessor:
         ABDMRequestHelper().gateway_post(HIPGatewayAPIPath.HEALTH_INFO_ON_REQUEST, payload)
         return payload['requestId']
 
+    def save_stage_timings(self):
+        self.health_information_request.stage_timings = self.timings.as_dict()
+        self.health_information_request.save(update_fields=['stage_timings', 'last_modified'])
+        emit_stage_timings(self.request_data['transactionId'], self.health_information_request.stage_timings)
+
     def update_health_information_request_transfer_status(self, overall_transfer_status):
         self.health_information_request.status = (
             HealthInformationStatus.TRANSFERRED if overall_transfer_status else HealthInformationStatus.FAILED
@@ -158,31 +192,171 @@ class GatewayHealthInformationRequestProcessor:
 
 
 class HealthDataTransferProcessor:
+    """
+    Fetches health data of care contexts from HRP, encrypts it and sends it to HIU page by page.
+    Health data of care contexts in a page is fetched by `HIP_HEALTH_DATA_FETCH_WORKERS` threads and encrypted
+    by the process wide pool of `HIP_HEALTH_DATA_ENCRYPTION_PROCESSES` processes if set and available, else in
+    the fetching thread.
+    If `HIP_PAGE_DELIVERY_QUEUE_SIZE` is set, pages are sent to HIU by `HIP_PAGE_DELIVERY_WORKERS` threads while
+    the next pages are being built, with up to `HIP_PAGE_DELIVERY_QUEUE_SIZE` built pages waiting to be sent.
+    Pages have `entries_per_page` care contexts each, unless `HIP_PAGE_MAX_BYTES` is set, in which case pages are
+    packed by size of the encrypted entries.
+    Time spent in each stage is recorded per care context and summed for its page and in `timings` for all pages.
+    """
     media_type = HEALTH_INFORMATION_MEDIA_TYPE
     entries_per_page = 10
+    linked_care_contexts_query_chunk_size = 500
 
     def __init__(self, health_information_request, hi_request):
         self.health_information_request = health_information_request
         self.hi_request = hi_request
         self.care_contexts = health_information_request.consent_artefact.details['careContexts']
         self.crypto = ABDMCrypto(use_x509_for_transfer=True)
+        self.fetch_executor = None
+        self.encryption_pool = None
+        self._page_count = None
+        self._linked_care_contexts = None
+        self._bulk_fetch_implemented = True
+        self.timings = StageTimings()
 
     def process(self):
         care_contexts_status = []
-        for index, care_contexts_chunks in enumerate(
-            self._generate_chunks(self.care_contexts, self.entries_per_page)
-        ):
-            care_contexts_chunks_status = self._process_page(index + 1, care_contexts_chunks)
-            care_contexts_status.extend(care_contexts_chunks_status)
+        with self._executors():
+            pages = self._generate_pages()
+            if app_settings.HIP_PAGE_DELIVERY_QUEUE_SIZE and self.page_count > 1:
+                care_contexts_status = self._process_pages_pipelined(pages)
+            else:
+                for page in pages:
+                    care_contexts_status.extend(self._process_page(page))
         overall_transfer_status = not any(status['hiStatus'] == HealthInformationStatus.ERRORED
                                           for status in care_contexts_status)
         return overall_transfer_status, care_contexts_status
 
+    @contextmanager
+    def _executors(self):
+        fetch_workers = app_settings.HIP_HEALTH_DATA_FETCH_WORKERS
+        encryption_processes = app_settings.HIP_HEALTH_DATA_ENCRYPTION_PROCESSES
+        if fetch_workers > 1:
+            self.fetch_executor = ThreadPoolExecutor(max_workers=fetch_workers)
+        # Pool is shared by the transfers of the process, so it is not shut down once the transfer is done
+        self.encryption_pool = ProcessPools.get_pool(ENCRYPTION_POOL, encryption_processes)
+        try:
+            yield
+        finally:
+            # Futures not awaited are cancelled where they are submitted, so shutdown does not wait on them
+            if self.fetch_executor is not None:
+                self.fetch_executor.shutdown()
+            self.fetch_executor = None
+            self.encryption_pool = None
+
     @property
     def page_count(self):
-        return int(math.ceil(len(self.care_contexts) / self.entries_per_page))
+        if self._page_count is None:
+            self._page_count = int(math.ceil(len(self.care_contexts) / self.entries_per_page))
+        return self._page_count
+
+    def _generate_pages(self):
+        """
+        Returns an iterable of pages, each as a tuple of HIU payload, status of failed care contexts, care
+        contexts to be transferred and stage timings.
+        """
+        if app_settings.HIP_PAGE_MAX_BYTES:
+            return self._generate_pages_by_size()
+        return self._generate_pages_by_care_contexts_count()
+
+    def _generate_pages_by_care_contexts_count(self):
+        for index, care_contexts_chunks in enumerate(
+            self._generate_chunks(self.care_contexts, self.entries_per_page)
+        ):
+            processed_care_contexts = zip(care_contexts_chunks, self._process_care_contexts(care_contexts_chunks))
+            yield self._build_page(index + 1, processed_care_contexts)
+
+    def _generate_pages_by_size(self):
+        """
+        Packs care contexts into pages of up to `HIP_PAGE_MAX_BYTES` bytes and `HIP_PAGE_MAX_ENTRIES` entries.
+        Entries of a care context are always sent in the same page, alone if they exceed the limits.
+        All care contexts are processed before the first page is sent, so that page count is known. Entries of
+        each page are spooled to a temporary file as soon as the page is full, so that only the page being packed
+        and the chunk of `entries_per_page` care contexts being processed are held in memory. Pages are read back
+        one at a time while sending.
+        """
+        processed_care_contexts = itertools.chain.from_iterable(
+            zip(care_contexts_chunks, self._process_care_contexts(care_contexts_chunks))
+            for care_contexts_chunks in self._generate_chunks(self.care_contexts, self.entries_per_page)
+        )
+        spool = tempfile.TemporaryFile(mode='w+')
+        try:
+            # Care contexts of each page with error and timings, without entries which are spooled
+            pages_care_contexts = []
+            page_care_contexts, page_entries = [], []
+            page_bytes = page_entries_count = 0
+            for care_context, (entries, error, timings) in processed_care_contexts:
+                entries = entries or []
+                entries_bytes = sum(len(json.dumps(entry)) for entry in entries)
+                if page_entries_count and (
+                    page_bytes + entries_bytes > app_settings.HIP_PAGE_MAX_BYTES
+                    or page_entries_count + len(entries) > app_settings.HIP_PAGE_MAX_ENTRIES
+                ):
+                    pages_care_contexts.append(self._spool_page(spool, page_care_contexts, page_entries))
+                    page_care_contexts, page_entries = [], []
+                    page_bytes = page_entries_count = 0
+                page_care_contexts.append((care_context, error, timings))
+                page_entries.append(entries)
+                page_bytes += entries_bytes
+                page_entries_count += len(entries)
+            pages_care_contexts.append(self._spool_page(spool, page_care_contexts, page_entries))
+            self._page_count = len(pages_care_contexts)
+            spool.seek(0)
+        except BaseException:
+            spool.close()
+            raise
+        return self._read_spooled_pages(spool, pages_care_contexts)
+
+    @staticmethod
+    def _spool_page(spool, page_care_contexts, page_entries):
+        spool.write(json.dumps(page_entries) + '\n')
+        return page_care_contexts
+
+    def _read_spooled_pages(self, spool, pages_care_contexts):
+        with spool:
+            for index, page_care_contexts in enumerate(pages_care_contexts):
+                page_entries = json.loads(spool.readline())
+                yield self._build_page(index + 1, (
+                    (care_context, (entries, error, timings))
+                    for (care_context, error, timings), entries in zip(page_care_contexts, page_entries)
+                ))
+
+    def _process_pages_pipelined(self, pages):
+        """
+        Builds pages in the calling thread and sends them to HIU from delivery threads. Pages are completed
+        (status generated and saved) in page order once sent, so the result is the same as processing serially.
+        """
+        care_contexts_status = []
+        max_pending_pages = app_settings.HIP_PAGE_DELIVERY_WORKERS + app_settings.HIP_PAGE_DELIVERY_QUEUE_SIZE
+        pending_pages = deque()
+        with ThreadPoolExecutor(max_workers=app_settings.HIP_PAGE_DELIVERY_WORKERS) as delivery_executor:
+            for page in pages:
+                # Runs in a copy of the current context, so that the deadline applies to sending the page
+                send_future = delivery_executor.submit(copy_context().run, self._send_page, page[0], page[3])
+                pending_pages.append((page, send_future))
+                # Waits for the oldest page to be sent when the queue is full
+                if len(pending_pages) >= max_pending_pages:
+                    care_contexts_status.extend(self._complete_pending_page(*pending_pages.popleft()))
+            while pending_pages:
+                care_contexts_status.extend(self._complete_pending_page(*pending_pages.popleft()))
+        return care_contexts_status
+
+    def _complete_pending_page(self, page, send_future):
+        return self._complete_page(*page, send_future.result())
+
+    def _process_page(self, page):
+        error = self._send_page(page[0], page[3])
+        return self._complete_page(*page, error)
 
-    def _process_page(self, page_number, care_contexts):
+    def _build_page(self, page_number, processed_care_contexts):
+        """
+        :param processed_care_contexts: Iterable of care context and its tuple of (entries, error, timings)
+        """
         payload = {
             'pageCount': self.page_count,
             'transactionId': self.health_information_request.transaction_id,
@@ -192,61 +366,163 @@ class HealthDataTransferProcessor:
         }
         care_contexts_status = []
         care_contexts_transfer = []
+        page_timings = StageTimings()
 
-        for care_context in care_contexts:
-            try:
-                payload['entries'].extend(self._process_care_context(care_context))
+        for care_context, (entries, error, timings) in processed_care_contexts:
+            page_timings.merge(timings)
+            if error is None:
+                payload['entries'].extend(entries)
                 care_contexts_transfer.append(care_context)
-            except Exception as err:
-                care_contexts_status.extend(self._generate_care_contexts_status([care_context], str(err)))
+            else:
+                care_contexts_status.extend(self._generate_care_contexts_status([care_context], error))
+        return payload, care_contexts_status, care_contexts_transfer, page_timings
 
+    def _send_page(self, payload, timings):
         # In case no data is available, sends empty entries so that HIU is aware of that.
-        error = None
         try:
-            self.send_data_to_hiu(payload)
+            with timings.time(HIPStage.PUSH):
+                self.send_data_to_hiu(payload)
         except Exception as err:
-            error = str(err)
+            return str(err)
+        return None
+
+    def _complete_page(self, payload, care_contexts_status, care_contexts_transfer, timings, error):
         if care_contexts_transfer:
             care_contexts_status.extend(self._generate_care_contexts_status(care_contexts_transfer, error))
-
-        self.save_health_data_transfer(page_number, care_contexts_status)
+        self.save_health_data_transfer(payload['pageNumber'], care_contexts_status, timings.as_dict())
+        self.timings.merge(timings)
         return care_contexts_status
 
-    def _process_care_context(self, care_context):
-        entries = []
-        linked_care_context = self.fetch_linked_care_context(care_context)
+    def _process_care_contexts(self, care_contexts):
+        """
+        Returns a tuple of (entries, error, timings) for each of the care contexts, in the same order.
+        Database lookups are done in the calling thread while HRP fetch and encryption may run concurrently.
+        """
+        care_contexts_timings = [StageTimings() for _ in care_contexts]
+        prepared_care_contexts = [
+            self._run_for_care_context(self._prepare_care_context, care_context, timings)
+            for care_context, timings in zip(care_contexts, care_contexts_timings)
+        ]
+        fhir_data_by_reference = self._fetch_fhir_data_from_hrp_bulk_timed(
+            prepared_care_contexts, care_contexts_timings
+        )
+        if self.fetch_executor is None:
+            results = [
+                (None, error) if error else self._run_for_care_context(
+                    self._fetch_and_encrypt, *prepared, fhir_data_by_reference, timings
+                )
+                for (prepared, error), timings in zip(prepared_care_contexts, care_contexts_timings)
+            ]
+        else:
+            # Each care context runs in a copy of the current context, so that the deadline applies to its fetch
+            futures = [
+                None if error else self.fetch_executor.submit(
+                    copy_context().run, self._fetch_and_encrypt_in_thread, *prepared, fhir_data_by_reference,
+                    timings
+                )
+                for (prepared, error), timings in zip(prepared_care_contexts, care_contexts_timings)
+            ]
+            try:
+                results = [
+                    (None, error) if future is None else future.result()
+                    for future, (_, error) in zip(futures, prepared_care_contexts)
+                ]
+            finally:
+                _cancel_pending(futures)
+        return [(entries, error, timings) for (entries, error), timings in zip(results, care_contexts_timings)]
+
+    def _fetch_fhir_data_from_hrp_bulk_timed(self, prepared_care_contexts, care_contexts_timings):
+        # Time of a bulk fetch is shared equally by its care contexts
+        fetched_care_contexts_timings = [timings for (_, error), timings
+                                         in zip(prepared_care_contexts, care_contexts_timings) if error is None]
+        start = time.perf_counter()
+        fhir_data_by_reference = self.fetch_fhir_data_from_hrp_bulk(
+            [prepared for prepared, error in prepared_care_contexts if error is None]
+        )
+        if fhir_data_by_reference is not None:
+            seconds = (time.perf_counter() - start) / len(fetched_care_contexts_timings)
+            for timings in fetched_care_contexts_timings:
+                timings.add(HIPStage.HRP_FETCH, seconds)
+        return fhir_data_by_reference
+
+    @staticmethod
+    def _run_for_care_context(func, *args):
+        # Isolates errors for a care context so that other care contexts are still transferred
+        try:
+            return func(*args), None
+        except Exception as err:
+            return None, str(err)
+
+    def _prepare_care_context(self, care_context, timings):
+        with timings.time(HIPStage.LINKED_CARE_CONTEXT_LOOKUP):
+            linked_care_context = self.fetch_linked_care_context(care_context)
         valid_health_info_types = self.validate_health_information_types(linked_care_context)
         self.validate_health_info_date_range(linked_care_context)
-        fhir_data = self.fetch_fhir_data_from_hrp(linked_care_context, valid_health_info_types)
-        for bundle in fhir_data:
-            encrypted_entry = self.get_encrypted_entry(care_context['careContextReference'], bundle)
-            entries.append(encrypted_entry)
-        return entries
+        linked_care_context_details = LinkCareContextFetchSerializer(linked_care_context).data
+        return care_context, linked_care_context, valid_health_info_types, linked_care_context_details
+
+    def _fetch_and_encrypt(self, care_context, linked_care_context, health_info_types,
+                           linked_care_context_details, fhir_data_by_reference=None, timings=None):
+        if fhir_data_by_reference is None:
+            with _time_stage(timings, HIPStage.HRP_FETCH):
+                fhir_data = self.fetch_fhir_data_from_hrp(linked_care_context, health_info_types,
+                                                          linked_care_context_details)
+        else:
+            fhir_data = self._fhir_data_from_bulk_fetch(linked_care_context, fhir_data_by_reference)
+        return self.get_encrypted_entries(care_context['careContextReference'], fhir_data, timings)
+
+    def _fetch_and_encrypt_in_thread(self, *args):
+        try:
+            return self._run_for_care_context(self._fetch_and_encrypt, *args)
+        finally:
+            # HRP integration may use database in this thread
+            close_old_connections()
 
-    def save_health_data_transfer(self, page_number, care_contexts_status):
+    def save_health_data_transfer(self, page_number, care_contexts_status, stage_timings=None):
         HealthDataTransfer.objects.create(
             health_information_request=self.health_information_request,
             page_number=page_number,
-            care_contexts_status=care_contexts_status
+            care_contexts_status=care_contexts_status,
+            stage_timings=stage_timings or {}
         )
+        if stage_timings:
+            emit_stage_timings(self.health_information_request.transaction_id, stage_timings, page_number)
 
     def fetch_linked_care_context(self, care_context):
+        reference = care_context['careContextReference']
+        if self._linked_care_contexts is None:
+            self._linked_care_contexts = self._fetch_linked_care_contexts()
+        linked_care_contexts = self._linked_care_contexts.get(reference, [])
+        if not linked_care_contexts:
+            raise HealthDataTransferException(f'Linked Care Context not found for {reference}')
+        if len(linked_care_contexts) > 1:
+            raise HealthDataTransferException(f'Multiple Linked Care Contexts found for {reference}')
+        return linked_care_contexts[0]
+
+    def _fetch_linked_care_contexts(self):
+        """
+        Fetches linked care contexts for all care contexts of the consent artefact in chunked queries.
+        Returns a dict of care context reference to the list of matching linked care contexts.
+        """
         hip_id = self.health_information_request.consent_artefact.details['hip']['id']
-        # ABDM does not support multiple patient reference for a HIP . It does accept a different patient
-        # reference during linking while keeping the first reference earlier linked.
-        # Care context reference is assumed to be unique across HRP for a given HIP and hence filter
-        # for patient reference is omitted here to allow support for a rare case of multiple patient reference for
-        # a given HIP.
-        try:
-            return LinkCareContext.objects.get(
-                reference=care_context['careContextReference'],
+        references = list(dict.fromkeys(
+            care_context['careContextReference'] for care_context in self.care_contexts
+        ))
+        linked_care_contexts = {}
+        for references_chunk in self._generate_chunks(references, self.linked_care_contexts_query_chunk_size):
+            # ABDM does not support multiple patient reference for a HIP . It does accept a different patient
+            # reference during linking while keeping the first reference earlier linked.
+            # Care context reference is assumed to be unique across HRP for a given HIP and hence filter
+            # for patient reference is omitted here to allow support for a rare case of multiple patient
+            # reference for a given HIP.
+            queryset = LinkCareContext.objects.filter(
+                reference__in=references_chunk,
                 link_request_details__hip_id=hip_id,
                 link_request_details__status=LinkRequestStatus.SUCCESS
-            )
-        except LinkCareContext.DoesNotExist:
-            raise HealthDataTransferException(
-                f"Linked Care Context not found for {care_context['careContextReference']}"
-            )
+            ).select_related('link_request_details')
+            for linked_care_context in queryset:
+                linked_care_contexts.setdefault(linked_care_context.reference, []).append(linked_care_context)
+        return linked_care_contexts
 
     def validate_health_information_types(self, linked_care_context):
         consented_health_info_types = self.health_information_request.consent_artefact.details['hiTypes']
@@ -272,8 +548,9 @@ class HealthDataTransferProcessor:
                 f'Health record date is not in requested date range for {linked_care_context.reference}'
             )
 
-    def fetch_fhir_data_from_hrp(self, linked_care_context, health_info_types):
-        linked_care_context_serialized = LinkCareContextFetchSerializer(linked_care_context).data
+    def fetch_fhir_data_from_hrp(self, linked_care_context, health_info_types, linked_care_context_details=None):
+        linked_care_context_serialized = (linked_care_context_details if linked_care_context_details is not None
+                                          else LinkCareContextFetchSerializer(linked_care_context).data)
         try:
             fhir_data = (
                 app_settings.HRP_INTEGRATION_CLASS().fetch_health_data(
@@ -290,23 +567,88 @@ class HealthDataTransferProcessor:
             raise HealthDataTransferException(f'Error occurred while fetching health data from HRP: {err}')
         return fhir_data
 
-    def get_encrypted_entry(self, care_context_reference, content):
-        entry = {'media': self.media_type, 'careContextReference': care_context_reference}
+    def fetch_fhir_data_from_hrp_bulk(self, prepared_care_contexts):
+        """
+        Fetches health data of care contexts in a single call to `HRPIntegration.fetch_health_data_bulk`.
+        Returns None if the HRP integration does not implement it, in which case health data is fetched
+        for each care context separately.
+        """
+        if not prepared_care_contexts or not self._bulk_fetch_implemented:
+            return None
+        references = []
+        health_info_types = {}
+        details_by_reference = {}
+        for _, linked_care_context, valid_health_info_types, linked_care_context_details in prepared_care_contexts:
+            references.append(linked_care_context.reference)
+            health_info_types[linked_care_context.reference] = valid_health_info_types
+            details_by_reference[linked_care_context.reference] = linked_care_context_details
         try:
-            content_str = json.dumps(content)
-            entry['checksum'] = self.crypto.generate_checksum(content_str)
-            entry['content'] = self.crypto.encrypt(content_str, self.hi_request['keyMaterial'])
+            return app_settings.HRP_INTEGRATION_CLASS().fetch_health_data_bulk(
+                references,
+                health_info_types,
+                details_by_reference
+            )
+        except NotImplementedError:
+            self._bulk_fetch_implemented = False
+            return None
         except Exception as err:
-            raise HealthDataTransferException(f'Error occurred while encryption process: {err}')
-        return entry
+            return {reference: err for reference in references}
+
+    @staticmethod
+    def _fhir_data_from_bulk_fetch(linked_care_context, fhir_data_by_reference):
+        fhir_data = fhir_data_by_reference.get(linked_care_context.reference)
+        try:
+            if isinstance(fhir_data, Exception):
+                raise fhir_data
+            if not fhir_data:
+                raise HealthDataTransferException(
+                    f'No health record available from HRP for {linked_care_context.reference}'
+                )
+        except Exception as err:
+            raise HealthDataTransferException(f'Error occurred while fetching health data from HRP: {err}')
+        return fhir_data
+
+    def get_encrypted_entries(self, care_context_reference, fhir_data, timings=None):
+        pool = self.encryption_pool
+        if pool is not None:
+            try:
+                return self._get_encrypted_entries_in_processes(pool, care_context_reference, fhir_data, timings)
+            except BrokenProcessPool:
+                ProcessPools.discard(ENCRYPTION_POOL, pool)
+                self.encryption_pool = None
+        return [self.get_encrypted_entry(care_context_reference, bundle, timings) for bundle in fhir_data]
+
+    def _get_encrypted_entries_in_processes(self, pool, care_context_reference, fhir_data, timings):
+        # Session is sent with each bundle with the key already derived for the transfer
+        session = self.crypto.session(self.hi_request['keyMaterial'])
+        futures = [
+            pool.submit(_encrypt_entry_in_process, session, care_context_reference, bundle, self.media_type)
+            for bundle in fhir_data
+        ]
+        try:
+            results = [future.result() for future in futures]
+        finally:
+            _cancel_pending(futures)
+        entries = []
+        for entry, entry_timings in results:
+            if timings is not None:
+                timings.merge(entry_timings)
+            entries.append(entry)
+        return entries
+
+    def get_encrypted_entry(self, care_context_reference, content, timings=None):
+        return encrypt_health_data_entry(self.crypto, care_context_reference, content,
+                                         self.hi_request['keyMaterial'], self.media_type, timings)
 
     def send_data_to_hiu(self, payload):
         try:
-            resp = requests.post(
+            resp = send_instrumented(
+                http_sessions.post,
+                APIPathGroup.HIU_DATA_PUSH,
                 url=self.hi_request['dataPushUrl'],
                 data=json.dumps(payload),
                 headers={'Content-Type': 'application/json'},
-                timeout=60
+                timeout=request_timeout(APIPathGroup.HIU_DATA_PUSH)
             )
             resp.raise_for_status()
         except Exception as err:
@@ -322,3 +664,40 @@ class HealthDataTransferProcessor:
         description = error if error else 'Delivered'
         return [{'careContextReference': care_context['careContextReference'], 'hiStatus': hi_status,
                 'description': description} for care_context in care_contexts]
+
+
+def encrypt_health_data_entry(crypto, care_context_reference, content, peer_transfer_material, media_type,
+                              timings=None):
+    return _encrypted_entry(lambda data: crypto.encrypt(data, peer_transfer_material), care_context_reference,
+                            content, media_type, timings)
+
+
+def _encrypted_entry(encrypt, care_context_reference, content, media_type, timings=None):
+    entry = {'media': media_type, 'careContextReference': care_context_reference}
+    try:
+        with _time_stage(timings, HIPStage.SERIALIZATION):
+            content_str = json.dumps(content)
+        with _time_stage(timings, HIPStage.ENCRYPTION):
+            entry['checksum'] = ABDMCrypto.generate_checksum(content_str)
+            entry['content'] = encrypt(content_str)
+    except Exception as err:
+        raise HealthDataTransferException(f'Error occurred while encryption process: {err}')
+    return entry
+
+
+def _encrypt_entry_in_process(session, care_context_reference, content, media_type):
+    """Returns tuple of encrypted entry and its stage timings"""
+    timings = StageTimings()
+    entry = _encrypted_entry(session.encrypt, care_context_reference, content, media_type, timings)
+    return entry, timings.as_dict()
+
+
+def _cancel_pending(futures):
+    # Cancels futures not yet started, if waiting for the others failed
+    for future in futures:
+        if future is not None:
+            future.cancel()
+
+
+def _time_stage(timings, stage):
+    return timings.time(stage) if timings is not None else nullcontext()
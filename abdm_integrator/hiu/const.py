@@ -11,3 +11,5 @@ class HIUGatewayAPIPath:
 ABHA_EXISTS_BY_HEALTH_ID_PATH = '/v1/search/existsByHealthId'
 
 HEALTH_DATA_CACHE_TIMEOUT = 60
+# Published through cache in place of health data that is saved in the health data store
+HEALTH_DATA_STORED_NOTIFICATION = {'stored': True}
@@ -1,17 +1,40 @@
+import hashlib
+import json
 import logging
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
 
 # Same package as used in HQ
 from jsonpath_ng import parse as parse_jsonpath
 
 from abdm_integrator.hiu.fhir.const import HEALTH_INFO_TYPE_RESOURCES_MAP, SNOMED_CODE_HEALTH_INFO_TYPE_MAP
+from abdm_integrator.process_pools import ProcessPools
+from abdm_integrator.settings import app_settings
 from abdm_integrator.utils import json_from_file
 
 parser_config_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'config.json')
 parser_config = json_from_file(parser_config_path)
+# First configuration of a resource type is used if it is repeated
+parser_config_by_resource_type = {config['resource_type']: config for config in reversed(parser_config)}
+# Changes whenever 'config.json' changes, so that bundles parsed using an older config are not reused
+parser_config_version = hashlib.md5(json.dumps(parser_config, sort_keys=True).encode('utf-8')).hexdigest()
 
 logger = logging.getLogger('abdm_integrator')
 
+FHIR_PARSING_POOL = 'hiu_fhir_parsing'
+
+# Paths made of only field names and integer indices, like '$.name[0].text'
+SIMPLE_JSON_PATH_REGEX = re.compile(r'\$((\.[a-zA-Z_][a-zA-Z0-9_]*)|(\[-?\d+\]))*')
+SIMPLE_JSON_PATH_STEP_REGEX = re.compile(r'\.([a-zA-Z_][a-zA-Z0-9_]*)|\[(-?\d+)\]')
+# Field names that are keywords in jsonpath_ng grammar
+JSON_PATH_RESERVED_WORDS = ('where', 'wherenot')
+_NOT_SET = object()
+
 
 class FHIRUnsupportedHIType(Exception):
     pass
@@ -26,14 +49,131 @@ def simplify_list_as_string(seq):
     return result
 
 
+class CompiledJsonPath:
+    """
+    JSONPath expression parsed once to be evaluated against any number of resources.
+    Parsing error is kept and raised as `JsonpathError` on evaluation, same as when parsing on every evaluation.
+    """
+
+    def __init__(self, json_path):
+        self.json_path = json_path
+        self.error = None
+        try:
+            self.expression = parse_jsonpath(json_path)
+        except Exception as err:
+            self.expression = None
+            self.error = err
+
+    def values(self, resource):
+        if self.error is not None:
+            raise JsonpathError from self.error
+        return [match.value for match in self.expression.find(resource)]
+
+    def value_as_string(self, resource):
+        return simplify_list_as_string(self.values(resource))
+
+
+class SimpleJsonPath(CompiledJsonPath):
+    """
+    JSONPath expression made of only field names and integer indices, evaluated by directly accessing the fields
+    and indices instead of using jsonpath_ng. Matches the result of jsonpath_ng:
+    a field matches if the value is a mapping having the field, even if the field value is null, and an index
+    matches if the value is a non-empty sequence (not a mapping) having the index.
+    """
+
+    def __init__(self, json_path, steps):
+        self.json_path = json_path
+        self.error = None
+        self.expression = None
+        # Tuple of (is_index, field name or index)
+        self.steps = steps
+
+    @classmethod
+    def from_json_path(cls, json_path):
+        """Returns instance if `json_path` is a simple path, else None"""
+        if not SIMPLE_JSON_PATH_REGEX.fullmatch(json_path):
+            return None
+        steps = []
+        for field, index in SIMPLE_JSON_PATH_STEP_REGEX.findall(json_path[1:]):
+            if field in JSON_PATH_RESERVED_WORDS:
+                return None
+            steps.append((True, int(index)) if index else (False, field))
+        return cls(json_path, tuple(steps))
+
+    def value(self, resource):
+        """Returns value at the path or `_NOT_SET` if not found"""
+        value = resource
+        for is_index, key in self.steps:
+            if is_index:
+                if isinstance(value, dict) or not value or not -len(value) <= key < len(value):
+                    return _NOT_SET
+                value = value[key]
+            else:
+                try:
+                    value = value.get(key, _NOT_SET)
+                except (TypeError, AttributeError):
+                    return _NOT_SET
+                if value is _NOT_SET:
+                    return _NOT_SET
+        return value
+
+    def values(self, resource):
+        value = self.value(resource)
+        return [] if value is _NOT_SET else [value]
+
+    def value_as_string(self, resource):
+        value = self.value(resource)
+        return '' if value is _NOT_SET else str(value)
+
+
+@lru_cache(maxsize=None)
+def compiled_json_path(json_path):
+    return SimpleJsonPath.from_json_path(json_path) or CompiledJsonPath(json_path)
+
+
 def resource_value_using_json_path(json_path, resource):
-    try:
-        jsonpath_expr = parse_jsonpath(json_path)
-    except Exception as err:
-        raise JsonpathError from err
-    matches = jsonpath_expr.find(resource)
-    values = [m.value for m in matches]
-    return simplify_list_as_string(values)
+    return compiled_json_path(json_path).value_as_string(resource)
+
+
+def compile_parser_config(config):
+    """
+    Compiles parser configuration into a plan that maps resource type to its sections, with JSONPath of each
+    section entry parsed. Simple paths are evaluated without jsonpath_ng. Format of plan:
+    {
+        "Patient": [
+            {
+                "section": "Patient Details",
+                "entries": [("Patient Registered As", SimpleJsonPath("$.name[0].text"))]
+            }
+        ]
+    }
+    """
+    plan = {}
+    for resource_config in config:
+        if resource_config['resource_type'] in plan:
+            continue
+        plan[resource_config['resource_type']] = [
+            {
+                'section': section['section'],
+                'entries': [
+                    (section_entry['label'], compiled_json_path(section_entry['path']))
+                    for section_entry in section['entries']
+                ]
+            }
+            for section in resource_config['sections']
+        ]
+    return plan
+
+
+_parser_plan = None
+
+
+def get_parser_plan():
+    """Returns plan compiled from 'config.json'. Compiled on first use as parsing all paths is slow."""
+    global _parser_plan
+    if _parser_plan is None:
+        _parser_plan = compile_parser_config(parser_config)
+    return _parser_plan
 
 
 def resource_type_to_resources_from_bundle(fhir_bundle):
@@ -44,7 +184,7 @@ def resource_type_to_resources_from_bundle(fhir_bundle):
 
 
 def get_config_for_resource_type(resource_type):
-    return next((config for config in parser_config if config['resource_type'] == resource_type), None)
+    return parser_config_by_resource_type.get(resource_type)
 
 
 def snomed_code_title_from_bundle(resource_type_to_resources):
@@ -78,9 +218,10 @@ def parse_fhir_bundle(fhir_bundle):
         'health_information_type': health_information_type
     }
     parsed_content = []
+    parser_plan = get_parser_plan()
     for resource_type in HEALTH_INFO_TYPE_RESOURCES_MAP[health_information_type]:
-        config = get_config_for_resource_type(resource_type)
-        if not config:
+        sections = parser_plan.get(resource_type)
+        if sections is None:
             logger.error(
                 'ABDM HIU Parsing Error: Missing Configuration for %s obtained in HIType %s',
                 resource_type,
@@ -88,7 +229,7 @@ def parse_fhir_bundle(fhir_bundle):
             )
             continue
         for resource in resource_type_to_resources.get(resource_type, []):
-            for section in config['sections']:
+            for section in sections:
                 section_data = _process_section(section, resource_type, resource)
                 if section_data['entries']:
                     parsed_content.append(section_data)
@@ -96,12 +237,130 @@ def parse_fhir_bundle(fhir_bundle):
     return parsed_entry
 
 
+def parse_fhir_bundles(fhir_bundles, processes=0, content_hashes=None, processes_min_bytes=0):
+    """
+    Parses many fhir bundles using `parse_fhir_bundle`. Returns a list of tuple (parsed entry, error) in the order
+    of bundles, where error is the exception raised while parsing the bundle if any.
+    Bundles are parsed by a process wide pool of `processes` worker processes if set, there is more than one
+    bundle and the bundles are at least `processes_min_bytes` in size as JSON, else in the calling thread.
+    If `content_hashes` of bundles (see `bundle_content_hash`) are given, bundles found in the parsed bundle cache
+    are not parsed again.
+    Parsed entries from the cache are shared, so must not be modified.
+    """
+    cache = parsed_bundle_cache()
+    if cache is None or content_hashes is None:
+        return _parse_fhir_bundles(fhir_bundles, processes, processes_min_bytes)
+    results = [cache.get(content_hash) for content_hash in content_hashes]
+    missing_indexes = [index for index, result in enumerate(results) if result is None]
+    parsed_results = _parse_fhir_bundles([fhir_bundles[index] for index in missing_indexes], processes,
+                                         processes_min_bytes)
+    for index, result in zip(missing_indexes, parsed_results):
+        results[index] = result
+        if result[1] is None:
+            cache.set(content_hashes[index], result)
+    return results
+
+
+def _parse_fhir_bundles(fhir_bundles, processes, processes_min_bytes):
+    pool = None
+    if processes and len(fhir_bundles) > 1 and _bundles_size_at_least(fhir_bundles, processes_min_bytes):
+        pool = ProcessPools.get_pool(FHIR_PARSING_POOL, processes)
+    if pool is not None:
+        try:
+            return list(pool.map(_parse_fhir_bundle_with_error, fhir_bundles))
+        except BrokenProcessPool:
+            ProcessPools.discard(FHIR_PARSING_POOL, pool)
+    return [_parse_fhir_bundle_with_error(fhir_bundle) for fhir_bundle in fhir_bundles]
+
+
+def _bundles_size_at_least(fhir_bundles, min_bytes):
+    # Stops measuring once the size is reached, as small pages cost more to send to processes than to parse
+    size = 0
+    for fhir_bundle in fhir_bundles:
+        if size >= min_bytes:
+            break
+        size += len(json.dumps(fhir_bundle))
+    return size >= min_bytes
+
+
+def _parse_fhir_bundle_with_error(fhir_bundle):
+    try:
+        return parse_fhir_bundle(fhir_bundle), None
+    except Exception as err:
+        return None, err
+
+
+def bundle_content_hash(content_str):
+    """
+    Returns key of the parsed bundle cache for the JSON content of a bundle. It is computed by the HIU from the
+    decrypted content instead of using the checksum sent by HIP, so that a bundle can not be matched to parsed
+    results of another bundle.
+    """
+    return hashlib.sha256(content_str.encode('utf-8')).hexdigest()
+
+
+class ParsedBundleCache:
+    """
+    In-process LRU cache of results of parsing bundles, keyed by `bundle_content_hash` of the bundle content and
+    `parser_config_version`. Keeps up to `max_size` results for `timeout` seconds each.
+    """
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+
+    def get(self, content_hash):
+        key = (parser_config_version, content_hash)
+        with self._lock:
+            result, expires_at = self._results.get(key, (None, 0))
+            if expires_at <= time.monotonic():
+                self._results.pop(key, None)
+                return None
+            self._results.move_to_end(key)
+            return result
+
+    def set(self, content_hash, result):
+        key = (parser_config_version, content_hash)
+        with self._lock:
+            self._results[key] = (result, time.monotonic() + self.timeout)
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+_cache = None
+_cache_config = None
+_cache_lock = threading.Lock()
+
+
+def parsed_bundle_cache():
+    """Returns cache as per `HIU_PARSED_FHIR_BUNDLE_CACHE_SIZE` setting, or None if not set"""
+    global _cache, _cache_config
+    cache_config = (
+        app_settings.HIU_PARSED_FHIR_BUNDLE_CACHE_SIZE,
+        app_settings.HIU_PARSED_FHIR_BUNDLE_CACHE_TIMEOUT,
+    )
+    if not app_settings.HIU_PARSED_FHIR_BUNDLE_CACHE_SIZE:
+        return None
+    with _cache_lock:
+        if _cache is None or _cache_config != cache_config:
+            _cache = ParsedBundleCache(*cache_config)
+            _cache_config = cache_config
+        return _cache
+
+
 def _process_section(section, resource_type, resource):
     section_data = {'section': section['section'], 'resource': resource_type, 'entries': []}
-    for section_entry in section['entries']:
-        section_entry_data = {'label': section_entry['label']}
+    for label, json_path in section['entries']:
+        section_entry_data = {'label': label}
         try:
-            section_entry_data['value'] = resource_value_using_json_path(section_entry['path'], resource)
+            section_entry_data['value'] = json_path.value_as_string(resource)
             if section_entry_data['value']:
                 section_data['entries'].append(section_entry_data)
         except JsonpathError as err:
@@ -109,14 +368,14 @@ def _process_section(section, resource_type, resource):
                 'ABDM HIU Parsing Error: Invalid path for %s:%s:%s and error: %s',
                 resource_type,
                 section_data['section'],
-                section_entry['label'],
+                label,
                 err
             )
         except Exception as err:
             logger.exception(
                 'ABDM HIU Parsing Error: Error for %s:%s and error: %s',
                 resource_type,
-                section_entry['label'],
+                label,
                 err
             )
     return section_data
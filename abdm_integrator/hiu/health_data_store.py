@@ -0,0 +1,141 @@
+"""
+Stores for health data pages received by HIU, to be read by `RequestHealthInformation` using the gateway request
+id and page number. Unlike the callback hand-off through cache, stored pages can be read any number of times and
+in any order till they expire.
+Store is selected using `HIU_HEALTH_DATA_STORE` setting, with `HIU_HEALTH_DATA_STORE_OPTIONS` passed to its
+constructor. Pages are kept for `HIU_HEALTH_DATA_RETENTION` seconds.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+
+from abdm_integrator.settings import app_settings
+
+
+class HealthDataStore:
+    """Base interface for received health data stores"""
+
+    def __init__(self, retention=None):
+        self.retention = retention or app_settings.HIU_HEALTH_DATA_RETENTION
+
+    def save(self, gateway_request_id, page_number, data):
+        """
+        Saves the data of a page, replacing the data if already saved.
+        """
+        raise NotImplementedError(f'{self.__class__.__name__}.save() must be implemented.')
+
+    def get(self, gateway_request_id, page_number):
+        """
+        Returns the data of a page, or None if not saved or expired.
+        """
+        raise NotImplementedError(f'{self.__class__.__name__}.get() must be implemented.')
+
+    def delete_expired(self):
+        """
+        Deletes pages saved more than `retention` seconds ago.
+        """
+        raise NotImplementedError(f'{self.__class__.__name__}.delete_expired() must be implemented.')
+
+
+class DatabaseHealthDataStore(HealthDataStore):
+    """Stores pages in `ReceivedHealthData` table."""
+
+    def save(self, gateway_request_id, page_number, data):
+        from abdm_integrator.hiu.models import ReceivedHealthData
+        ReceivedHealthData.objects.update_or_create(
+            health_information_request_id=gateway_request_id,
+            page_number=page_number,
+            defaults={'data': data, 'date_created': datetime.utcnow()}
+        )
+
+    def get(self, gateway_request_id, page_number):
+        from abdm_integrator.hiu.models import ReceivedHealthData
+        received_health_data = ReceivedHealthData.objects.filter(
+            health_information_request_id=gateway_request_id,
+            page_number=page_number,
+            date_created__gte=self._expiry_datetime()
+        ).first()
+        return received_health_data.data if received_health_data else None
+
+    def delete_expired(self):
+        from abdm_integrator.hiu.models import ReceivedHealthData
+        ReceivedHealthData.objects.filter(date_created__lt=self._expiry_datetime()).delete()
+
+    def _expiry_datetime(self):
+        return datetime.utcnow() - timedelta(seconds=self.retention)
+
+
+class FileSystemHealthDataStore(HealthDataStore):
+    """
+    Stores each page as a JSON file in `directory`, which can be a local disk or a mounted object store.
+    Files are written to a temporary file first and then renamed, so a partially written page is never read.
+    """
+
+    def __init__(self, directory=None, retention=None):
+        super().__init__(retention)
+        if not directory:
+            raise ImproperlyConfigured(
+                'FileSystemHealthDataStore requires "directory" in HIU_HEALTH_DATA_STORE_OPTIONS.'
+            )
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def save(self, gateway_request_id, page_number, data):
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(file_descriptor, 'w') as file:
+                json.dump(data, file, cls=DjangoJSONEncoder)
+            os.replace(temp_path, self._path(gateway_request_id, page_number))
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    def get(self, gateway_request_id, page_number):
+        path = self._path(gateway_request_id, page_number)
+        try:
+            if self._is_expired(path):
+                return None
+            with open(path) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def delete_expired(self):
+        for file_name in os.listdir(self.directory):
+            path = os.path.join(self.directory, file_name)
+            try:
+                if self._is_expired(path):
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _path(self, gateway_request_id, page_number):
+        return os.path.join(self.directory, f'{gateway_request_id}_{int(page_number)}.json')
+
+    def _is_expired(self, path):
+        return os.path.getmtime(path) < time.time() - self.retention
+
+
+_store = None
+_store_config = None
+_store_lock = threading.Lock()
+
+
+def health_data_store():
+    """Returns the configured store, or None if received health data is only handed off through cache"""
+    global _store, _store_config
+    store_config = (app_settings.HIU_HEALTH_DATA_STORE, app_settings.HIU_HEALTH_DATA_STORE_OPTIONS,
+                    app_settings.HIU_HEALTH_DATA_RETENTION)
+    if app_settings.HIU_HEALTH_DATA_STORE is None:
+        return None
+    with _store_lock:
+        if _store is None or _store_config != store_config:
+            _store = app_settings.HIU_HEALTH_DATA_STORE(**(app_settings.HIU_HEALTH_DATA_STORE_OPTIONS or {}))
+            _store_config = store_config
+        return _store
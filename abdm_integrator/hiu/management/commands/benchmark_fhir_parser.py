@@ -0,0 +1,80 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from jsonpath_ng import parse as parse_jsonpath
+
+from abdm_integrator.hiu.fhir import parser
+from abdm_integrator.utils import json_from_file
+
+
+class UncompiledJsonPath(parser.CompiledJsonPath):
+    """Parses JSONPath expression on every evaluation as done before parser plan was introduced"""
+
+    def values(self, resource):
+        return [match.value for match in parse_jsonpath(self.json_path).find(resource)]
+
+
+class Command(BaseCommand):
+    help = ('Compares time taken to parse sample FHIR bundles without the compiled parser plan, with the plan '
+            'evaluating all paths using jsonpath_ng and with the plan evaluating simple paths directly.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bundles-dir', required=True,
+                            help='Directory with FHIR bundle json files, for e.g. '
+                                 '"abdm_integrator/hiu/tests/data/sample_fhir_bundles" of the source repository')
+        parser.add_argument('--iterations', type=int, default=20,
+                            help='Number of times each bundle is parsed')
+
+    def handle(self, *args, **options):
+        bundles_dir = options['bundles_dir']
+        bundles = [
+            json_from_file(os.path.join(bundles_dir, file_name))
+            for file_name in sorted(os.listdir(bundles_dir))
+            if file_name.endswith('.json')
+        ]
+        iterations = options['iterations']
+
+        compiled_plan = parser.get_parser_plan()
+        timings = [
+            ('Without plan', self._time_parsing(bundles, iterations, self._plan_with(UncompiledJsonPath))),
+            ('With plan, jsonpath_ng only',
+             self._time_parsing(bundles, iterations, self._plan_with(parser.CompiledJsonPath))),
+            ('With plan', self._time_parsing(bundles, iterations, compiled_plan)),
+        ]
+
+        count = len(bundles) * iterations
+        baseline_time = timings[0][1]
+        self.stdout.write(f'Parsed {len(bundles)} bundles {iterations} times each')
+        for name, total_time in timings:
+            self.stdout.write(
+                f'{name}: {total_time:.3f}s ({total_time / count * 1000:.3f}ms/bundle, '
+                f'{baseline_time / total_time:.1f}x)'
+            )
+
+    @staticmethod
+    def _plan_with(json_path_class):
+        return {
+            resource_type: [
+                {
+                    'section': section['section'],
+                    'entries': [(label, json_path_class(json_path.json_path)) for label, json_path in
+                                section['entries']]
+                }
+                for section in sections
+            ]
+            for resource_type, sections in parser.get_parser_plan().items()
+        }
+
+    @staticmethod
+    def _time_parsing(bundles, iterations, plan):
+        original_plan = parser._parser_plan
+        parser._parser_plan = plan
+        try:
+            start = time.perf_counter()
+            for _ in range(iterations):
+                for bundle in bundles:
+                    parser.parse_fhir_bundle(bundle)
+            return time.perf_counter() - start
+        finally:
+            parser._parser_plan = original_plan
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("abdm_hiu", "0003_alter_consentartefact_consent_request_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReceivedHealthData",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("page_number", models.SmallIntegerField()),
+                ("data", models.JSONField()),
+                ("date_created", models.DateTimeField(db_index=True)),
+                (
+                    "health_information_request",
+                    models.ForeignKey(
+                        db_column="gateway_request_id",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="received_health_data",
+                        to="abdm_hiu.healthinformationrequest",
+                        to_field="gateway_request_id",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("health_information_request", "page_number")},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("abdm_hiu", "0004_receivedhealthdata"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="healthinformationrequest",
+            name="care_contexts_delivered",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="healthinformationrequest",
+            name="care_contexts_errored",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="healthinformationrequest",
+            name="pages_received",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:29
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def delete_duplicate_receipts(apps, schema_editor):
+    # Keeps the first receipt of each page so that the unique constraint can be added
+    HealthDataReceiver = apps.get_model("abdm_hiu", "HealthDataReceiver")
+    duplicates = (
+        HealthDataReceiver.objects.values("health_information_request", "page_number")
+        .annotate(first_id=Min("id"), receipts=Count("id"))
+        .filter(receipts__gt=1)
+    )
+    for duplicate in duplicates:
+        HealthDataReceiver.objects.filter(
+            health_information_request=duplicate["health_information_request"],
+            page_number=duplicate["page_number"],
+        ).exclude(id=duplicate["first_id"]).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("abdm_hiu", "0005_healthinformationrequest_received_counts"),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_receipts, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name="healthdatareceiver",
+            unique_together={("health_information_request", "page_number")},
+        ),
+    ]
@@ -63,6 +63,10 @@ class HealthInformationRequest(models.Model):
     status = models.CharField(choices=HealthInformationStatus.HIU_CHOICES,
                               default=HealthInformationStatus.PENDING, max_length=40)
     error = models.JSONField(null=True)
+    # Counts of distinct pages and their care contexts received from HIP, updated as each page is processed
+    pages_received = models.PositiveIntegerField(default=0)
+    care_contexts_delivered = models.PositiveIntegerField(default=0)
+    care_contexts_errored = models.PositiveIntegerField(default=0)
     date_created = models.DateTimeField(auto_now_add=True)
     last_modified = models.DateTimeField(auto_now=True)
 
@@ -81,3 +85,18 @@ class HealthDataReceiver(models.Model):
 
     class Meta:
         app_label = 'abdm_hiu'
+        # A page delivered again by HIP is received only once
+        unique_together = ('health_information_request', 'page_number')
+
+
+class ReceivedHealthData(models.Model):
+    health_information_request = models.ForeignKey(HealthInformationRequest, to_field='gateway_request_id',
+                                                   on_delete=models.CASCADE, db_column='gateway_request_id',
+                                                   related_name='received_health_data')
+    page_number = models.SmallIntegerField()
+    data = models.JSONField()
+    date_created = models.DateTimeField(db_index=True)
+
+    class Meta:
+        app_label = 'abdm_hiu'
+        unique_together = ('health_information_request', 'page_number')
@@ -4,7 +4,9 @@ from celery.schedules import crontab
 from django.db import transaction
 
 from abdm_integrator.const import CELERY_PERIODIC_TASK, CELERY_TASK, ConsentStatus
+from abdm_integrator.deadlines import deadline
 from abdm_integrator.exceptions import ABDMServiceUnavailable
+from abdm_integrator.hiu.health_data_store import health_data_store
 from abdm_integrator.hiu.models import ConsentRequest
 from abdm_integrator.settings import app_settings
 
@@ -13,13 +15,15 @@ from abdm_integrator.settings import app_settings
              autoretry_for=(ABDMServiceUnavailable,), retry_backoff=2, max_retries=3)
 def process_hiu_consent_notification_request(self, request_data):
     from abdm_integrator.hiu.views.consents import GatewayConsentRequestNotifyProcessor
-    GatewayConsentRequestNotifyProcessor(request_data).process_request()
+    with deadline(app_settings.TASK_DEADLINE):
+        GatewayConsentRequestNotifyProcessor(request_data).process_request()
 
 
 @CELERY_TASK(queue=app_settings.CELERY_QUEUE, bind=True, ignore_result=False)
 def process_hiu_health_information_receiver(self, request_data):
     from abdm_integrator.hiu.views.health_information import ReceiveHealthInformationProcessor
-    ReceiveHealthInformationProcessor(request_data).process_request()
+    with deadline(app_settings.TASK_DEADLINE):
+        ReceiveHealthInformationProcessor(request_data).process_request()
 
 
 @CELERY_PERIODIC_TASK(run_every=crontab(hour='*/2', minute='0'), queue=app_settings.CELERY_QUEUE)
@@ -34,3 +38,10 @@ def _process_hiu_expired_consents():
         with transaction.atomic():
             consent.update_status(ConsentStatus.EXPIRED)
             consent.artefacts.all().delete()
+
+
+@CELERY_PERIODIC_TASK(run_every=crontab(minute='30'), queue=app_settings.CELERY_QUEUE)
+def delete_expired_received_health_data():
+    store = health_data_store()
+    if store is not None:
+        store.delete_expired()
@@ -115,12 +115,12 @@ class TestGenerateConsentRequestAPI(APITestCase, APITestHelperMixin):
         self.assertEqual(ConsentRequest.objects.all().count(), 0)
 
     @patch('abdm_integrator.hiu.views.consents.GenerateConsent.check_if_health_id_exists')
-    @patch('abdm_integrator.utils.requests.post')
+    @patch('abdm_integrator.utils.http_sessions.post')
     def test_generate_consent_request_gateway_error(self, mocked_post, *args):
         self.gateway_error_test(mocked_post, reverse('generate_consent_request'),
                                 self._sample_generate_consent_data())
 
-    @patch('abdm_integrator.utils.requests.post', side_effect=requests.Timeout)
+    @patch('abdm_integrator.utils.http_sessions.post', side_effect=requests.Timeout)
     def test_generate_consent_request_service_unavailable_error(self, mocked_post):
         client = APIClient(raise_request_exception=False)
         client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
@@ -1,10 +1,23 @@
 import os
+from unittest.mock import patch
 
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, override_settings
 
 from abdm_integrator.const import HealthInformationType
 from abdm_integrator.hiu.fhir.const import HEALTH_INFO_TYPE_RESOURCES_MAP
-from abdm_integrator.hiu.fhir.parser import FHIRUnsupportedHIType, parse_fhir_bundle
+from abdm_integrator.hiu.fhir.parser import (
+    CompiledJsonPath,
+    FHIRUnsupportedHIType,
+    JsonpathError,
+    ParsedBundleCache,
+    SimpleJsonPath,
+    compile_parser_config,
+    get_config_for_resource_type,
+    get_parser_plan,
+    parse_fhir_bundle,
+    parse_fhir_bundles,
+    parsed_bundle_cache,
+)
 from abdm_integrator.utils import json_from_file
 
 CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
@@ -42,3 +55,158 @@ class TestFHIRParser(SimpleTestCase):
         with self.assertRaises(FHIRUnsupportedHIType) as error:
             parse_fhir_bundle(fhir_bundle)
         self.assertEqual(str(error.exception), 'Unsupported Health Info type with code: does_not_exist found.')
+
+    def test_parse_fhir_bundles(self):
+        fhir_bundles = [
+            json_from_file(os.path.join(SAMPLE_FHIR_BUNDLES_DIR, f'Bundle-{health_info_type}.json'))
+            for health_info_type in HEALTH_INFO_TYPE_RESOURCES_MAP.keys()
+        ]
+        fhir_bundles.insert(1, {'entry': []})
+        for processes in (0, 2):
+            with self.subTest(processes=processes):
+                results = parse_fhir_bundles(fhir_bundles, processes=processes)
+                self.assertEqual(len(results), len(fhir_bundles))
+                self.assertIsNone(results[1][0])
+                self.assertIsInstance(results[1][1], KeyError)
+                for fhir_bundle, (parsed_entry, error) in zip(fhir_bundles[:1] + fhir_bundles[2:],
+                                                              results[:1] + results[2:]):
+                    self.assertIsNone(error)
+                    self.assertEqual(parsed_entry, parse_fhir_bundle(fhir_bundle))
+
+
+class TestParserPlan(SimpleTestCase):
+
+    def test_compile_parser_config(self):
+        config = [
+            {
+                'resource_type': 'Patient',
+                'sections': [
+                    {'section': 'Patient Details', 'entries': [{'path': '$.name[0].text', 'label': 'Name'}]}
+                ]
+            },
+            {
+                'resource_type': 'Patient',
+                'sections': [{'section': 'Ignored', 'entries': []}]
+            },
+        ]
+        plan = compile_parser_config(config)
+        self.assertEqual(list(plan), ['Patient'])
+        self.assertEqual(len(plan['Patient']), 1)
+        self.assertEqual(plan['Patient'][0]['section'], 'Patient Details')
+        label, json_path = plan['Patient'][0]['entries'][0]
+        self.assertEqual(label, 'Name')
+        self.assertEqual(json_path.value_as_string({'name': [{'text': 'Alex'}]}), 'Alex')
+
+    def test_compiled_json_path_invalid(self):
+        json_path = CompiledJsonPath('$.name[')
+        with self.assertRaises(JsonpathError):
+            json_path.values({'name': []})
+
+    def test_compiled_json_path_multiple_values(self):
+        json_path = CompiledJsonPath('$.name[*].text')
+        self.assertEqual(json_path.value_as_string({'name': [{'text': 'A'}, {'text': 'B'}]}), 'A,B')
+
+    def test_get_config_for_resource_type(self):
+        self.assertEqual(get_config_for_resource_type('Patient')['resource_type'], 'Patient')
+        self.assertIsNone(get_config_for_resource_type('DoesNotExist'))
+
+
+class TestSimpleJsonPath(SimpleTestCase):
+
+    def test_classification(self):
+        self.assertIsInstance(SimpleJsonPath.from_json_path('$.name[0].text'), SimpleJsonPath)
+        self.assertIsInstance(SimpleJsonPath.from_json_path('$.a[-1][0]'), SimpleJsonPath)
+        for json_path in ('$.name[*].text', '$..text', '$.name[0:1]', '$.where', "$.name['text']", '$.a-b'):
+            with self.subTest(json_path):
+                self.assertIsNone(SimpleJsonPath.from_json_path(json_path))
+
+    def test_same_result_as_jsonpath_ng(self):
+        values = [None, 0, '', 'text', [], [None], ['a', 'b'], {}, {'a': None}, {'a': []}, {'a': 'text'},
+                  {'a': [{'b': 'x'}, {'b': 'y'}]}, {'a': {'b': [1]}}, {'a': {0: 'x'}}, {'a': [[False]]}]
+        for json_path in ('$.a', '$.a[0]', '$.a[-1]', '$.a[1]', '$.a.b', '$.a[0].b', '$.a.b[0]', '$.a[0][0]'):
+            simple_json_path = SimpleJsonPath.from_json_path(json_path)
+            compiled_json_path = CompiledJsonPath(json_path)
+            for value in values:
+                with self.subTest(json_path=json_path, value=value):
+                    self.assertEqual(simple_json_path.values(value), compiled_json_path.values(value))
+                    self.assertEqual(simple_json_path.value_as_string(value),
+                                     compiled_json_path.value_as_string(value))
+
+    def test_same_result_as_jsonpath_ng_for_sample_bundles(self):
+        parser_plan = get_parser_plan()
+        for file_name in os.listdir(SAMPLE_FHIR_BUNDLES_DIR):
+            fhir_bundle = json_from_file(os.path.join(SAMPLE_FHIR_BUNDLES_DIR, file_name))
+            for entry in fhir_bundle['entry']:
+                for section in parser_plan.get(entry['resource']['resourceType'], []):
+                    for label, json_path in section['entries']:
+                        with self.subTest(file_name=file_name, json_path=json_path.json_path):
+                            self.assertEqual(
+                                json_path.value_as_string(entry['resource']),
+                                CompiledJsonPath(json_path.json_path).value_as_string(entry['resource'])
+                            )
+
+
+class TestParsedBundleCache(SimpleTestCase):
+
+    def test_lru(self):
+        cache = ParsedBundleCache(max_size=2, timeout=60)
+        cache.set('hash-1', ({'title': '1'}, None))
+        cache.set('hash-2', ({'title': '2'}, None))
+        self.assertEqual(cache.get('hash-1'), ({'title': '1'}, None))
+        cache.set('hash-3', ({'title': '3'}, None))
+        self.assertIsNone(cache.get('hash-2'))
+        self.assertEqual(cache.get('hash-1'), ({'title': '1'}, None))
+        self.assertEqual(cache.get('hash-3'), ({'title': '3'}, None))
+
+    def test_expiry(self):
+        cache = ParsedBundleCache(max_size=2, timeout=60)
+        with patch('abdm_integrator.hiu.fhir.parser.time.monotonic', return_value=1000):
+            cache.set('hash-1', ({'title': '1'}, None))
+        with patch('abdm_integrator.hiu.fhir.parser.time.monotonic', return_value=1059):
+            self.assertEqual(cache.get('hash-1'), ({'title': '1'}, None))
+        with patch('abdm_integrator.hiu.fhir.parser.time.monotonic', return_value=1060):
+            self.assertIsNone(cache.get('hash-1'))
+
+    def test_config_version_change(self):
+        cache = ParsedBundleCache(max_size=2, timeout=60)
+        cache.set('hash-1', ({'title': '1'}, None))
+        with patch('abdm_integrator.hiu.fhir.parser.parser_config_version', 'new-version'):
+            self.assertIsNone(cache.get('hash-1'))
+
+    @patch('abdm_integrator.hiu.fhir.parser.ProcessPools.get_pool')
+    def test_parse_fhir_bundles_below_processes_min_bytes(self, mocked_get_pool):
+        fhir_bundles = [{'entry': []}, {'entry': []}]
+        parse_fhir_bundles(fhir_bundles, processes=2, processes_min_bytes=1024)
+        mocked_get_pool.assert_not_called()
+        mocked_get_pool.return_value.map.side_effect = map
+        parse_fhir_bundles(fhir_bundles, processes=2, processes_min_bytes=20)
+        mocked_get_pool.assert_called_once_with('hiu_fhir_parsing', 2)
+
+    @patch('abdm_integrator.hiu.fhir.parser.ProcessPools.get_pool', return_value=None)
+    def test_parse_fhir_bundles_without_pool(self, mocked_get_pool):
+        results = parse_fhir_bundles([{'entry': []}, {'entry': []}], processes=2)
+        mocked_get_pool.assert_called_once_with('hiu_fhir_parsing', 2)
+        self.assertEqual(len(results), 2)
+
+    @override_settings(ABDM_INTEGRATOR={'HIU_PARSED_FHIR_BUNDLE_CACHE_SIZE': 10})
+    @patch('abdm_integrator.hiu.fhir.parser.parse_fhir_bundle')
+    def test_parse_fhir_bundles_with_content_hashes(self, mocked_parse_fhir_bundle):
+        mocked_parse_fhir_bundle.side_effect = lambda bundle: {'title': bundle['title']}
+        parsed_bundle_cache().clear()
+        fhir_bundles = [{'title': '1'}, {'title': '2'}]
+
+        results = parse_fhir_bundles(fhir_bundles, content_hashes=['hash-1', 'hash-2'])
+        self.assertEqual(results, [({'title': '1'}, None), ({'title': '2'}, None)])
+        self.assertEqual(mocked_parse_fhir_bundle.call_count, 2)
+
+        fhir_bundles.append({'title': '3'})
+        results = parse_fhir_bundles(fhir_bundles, content_hashes=['hash-1', 'hash-2', 'hash-3'])
+        self.assertEqual(results, [({'title': '1'}, None), ({'title': '2'}, None), ({'title': '3'}, None)])
+        self.assertEqual(mocked_parse_fhir_bundle.call_count, 3)
+
+    @patch('abdm_integrator.hiu.fhir.parser.parse_fhir_bundle')
+    def test_parse_fhir_bundles_cache_disabled(self, mocked_parse_fhir_bundle):
+        self.assertIsNone(parsed_bundle_cache())
+        parse_fhir_bundles([{}], content_hashes=['hash-1'])
+        parse_fhir_bundles([{}], content_hashes=['hash-1'])
+        self.assertEqual(mocked_parse_fhir_bundle.call_count, 2)
@@ -0,0 +1,132 @@
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from abdm_integrator.hiu.health_data_store import (
+    DatabaseHealthDataStore,
+    FileSystemHealthDataStore,
+    HealthDataStore,
+    health_data_store,
+)
+from abdm_integrator.hiu.models import (
+    ConsentArtefact,
+    ConsentRequest,
+    HealthInformationRequest,
+    ReceivedHealthData,
+)
+
+
+class SlowHealthDataStore(HealthDataStore):
+    """Store that takes time to create, counting its instances"""
+    instances = 0
+
+    def __init__(self, **kwargs):
+        time.sleep(0.05)
+        super().__init__(**kwargs)
+        SlowHealthDataStore.instances += 1
+
+
+class TestDatabaseHealthDataStore(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='test_user', password='test')
+        consent_request = ConsentRequest.objects.create(
+            user=user,
+            consent_request_id=str(uuid.uuid4()),
+            gateway_request_id=str(uuid.uuid4()),
+            health_info_from_date=datetime.utcnow(),
+            health_info_to_date=datetime.utcnow(),
+            health_info_types=[],
+            expiry_date=datetime.utcnow() + timedelta(days=1),
+            details={},
+        )
+        artefact = ConsentArtefact.objects.create(
+            consent_request=consent_request,
+            artefact_id=str(uuid.uuid4()),
+            gateway_request_id=str(uuid.uuid4()),
+            details={},
+        )
+        cls.health_information_request = HealthInformationRequest.objects.create(
+            user=user,
+            consent_artefact=artefact,
+            gateway_request_id=str(uuid.uuid4()),
+            key_material={},
+        )
+
+    def test_save_and_get(self):
+        store = DatabaseHealthDataStore()
+        gateway_request_id = self.health_information_request.gateway_request_id
+        store.save(gateway_request_id, 2, {'page': 2})
+        store.save(gateway_request_id, 1, {'page': 1})
+        store.save(gateway_request_id, 1, {'page': 1, 'entries': []})
+        self.assertEqual(store.get(gateway_request_id, 1), {'page': 1, 'entries': []})
+        self.assertEqual(store.get(gateway_request_id, '2'), {'page': 2})
+        # Can be read again
+        self.assertEqual(store.get(gateway_request_id, 2), {'page': 2})
+        self.assertIsNone(store.get(gateway_request_id, 3))
+
+    def test_expired(self):
+        store = DatabaseHealthDataStore(retention=60)
+        gateway_request_id = self.health_information_request.gateway_request_id
+        store.save(gateway_request_id, 1, {'page': 1})
+        store.save(gateway_request_id, 2, {'page': 2})
+        ReceivedHealthData.objects.filter(page_number=1).update(
+            date_created=datetime.utcnow() - timedelta(seconds=120)
+        )
+        self.assertIsNone(store.get(gateway_request_id, 1))
+        store.delete_expired()
+        self.assertEqual(list(ReceivedHealthData.objects.values_list('page_number', flat=True)), [2])
+
+
+class TestFileSystemHealthDataStore(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = FileSystemHealthDataStore(directory=self.directory.name, retention=60)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_save_and_get(self):
+        gateway_request_id = str(uuid.uuid4())
+        self.store.save(gateway_request_id, 1, {'page': 1})
+        self.store.save(gateway_request_id, 1, {'page': 1, 'entries': []})
+        self.assertEqual(self.store.get(gateway_request_id, '1'), {'page': 1, 'entries': []})
+        self.assertEqual(self.store.get(gateway_request_id, 1), {'page': 1, 'entries': []})
+        self.assertIsNone(self.store.get(gateway_request_id, 2))
+        self.assertEqual(len(os.listdir(self.directory.name)), 1)
+
+    def test_expired(self):
+        gateway_request_id = str(uuid.uuid4())
+        self.store.save(gateway_request_id, 1, {'page': 1})
+        self.store.save(gateway_request_id, 2, {'page': 2})
+        expired_time = time.time() - 120
+        os.utime(self.store._path(gateway_request_id, 1), (expired_time, expired_time))
+        self.assertIsNone(self.store.get(gateway_request_id, 1))
+        self.store.delete_expired()
+        self.assertEqual(os.listdir(self.directory.name), [f'{gateway_request_id}_2.json'])
+
+    def test_health_data_store_from_settings(self):
+        self.assertIsNone(health_data_store())
+        with override_settings(ABDM_INTEGRATOR={
+            'HIU_HEALTH_DATA_STORE': 'abdm_integrator.hiu.health_data_store.FileSystemHealthDataStore',
+            'HIU_HEALTH_DATA_STORE_OPTIONS': {'directory': self.directory.name},
+        }):
+            self.assertIsInstance(health_data_store(), FileSystemHealthDataStore)
+            self.assertIs(health_data_store(), health_data_store())
+
+    def test_health_data_store_created_once_by_concurrent_threads(self):
+        with override_settings(ABDM_INTEGRATOR={
+            'HIU_HEALTH_DATA_STORE': 'abdm_integrator.hiu.tests.test_health_data_store.SlowHealthDataStore',
+        }):
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                stores = list(executor.map(lambda _: health_data_store(), range(4)))
+        self.assertEqual(SlowHealthDataStore.instances, 1)
+        self.assertTrue(all(store is stores[0] for store in stores))
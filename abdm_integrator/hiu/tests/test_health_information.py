@@ -1,20 +1,39 @@
+import hashlib
+import json
+import pickle
 import uuid
 from copy import deepcopy
+from dataclasses import asdict
 from datetime import datetime, timedelta
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 import requests
 from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
 from rest_framework.authtoken.models import Token
 from rest_framework.exceptions import NotFound
 from rest_framework.reverse import reverse
 from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND
 from rest_framework.test import APIClient, APITestCase
 
-from abdm_integrator.const import ConsentPurpose, ConsentStatus, HealthInformationType
+from abdm_integrator.const import ConsentPurpose, ConsentStatus, HealthInformationStatus, HealthInformationType
+from abdm_integrator.crypto import (
+    ABDMCrypto,
+    CryptographyBackend,
+    CryptoSession,
+    FideliusSession,
+    curve25519_shared_secret,
+)
 from abdm_integrator.exceptions import ERROR_CODE_INVALID, STANDARD_ERRORS, ABDMGatewayError
-from abdm_integrator.hiu.exceptions import HIUError
+from abdm_integrator.hiu.exceptions import HealthDataReceiverException, HIUError
+from abdm_integrator.hiu.health_data_store import health_data_store
 from abdm_integrator.hiu.models import ConsentArtefact, ConsentRequest, HealthInformationRequest
+from abdm_integrator.hiu.views.health_information import (
+    ReceiveHealthInformationProcessor,
+    RequestHealthInformation,
+    _decrypt_entry_in_process,
+    parse_fhir_entries_for_ui,
+)
 from abdm_integrator.tests.utils import APITestHelperMixin, generate_mock_response
 from abdm_integrator.utils import ABDMCache
 
@@ -179,7 +198,7 @@ class TestRequestHealthInformationAPI(APITestCase, APITestHelperMixin):
 
     @patch('abdm_integrator.hiu.views.health_information.ABDMRequestHelper.gateway_post')
     @patch('abdm_integrator.hiu.views.health_information.app_settings.HIU_PARSE_FHIR_BUNDLE', return_value=True)
-    @patch('abdm_integrator.hiu.views.health_information.parse_fhir_bundle')
+    @patch('abdm_integrator.hiu.fhir.parser.parse_fhir_bundle')
     @patch('abdm_integrator.hiu.views.health_information.ABDMRequestHelper.common_request_data')
     def test_request_health_information_success_parsed_fhir_data(self, mocked_common_request_data,
                                                                  mocked_parse_fhir_bundle, *args):
@@ -211,11 +230,85 @@ class TestRequestHealthInformationAPI(APITestCase, APITestHelperMixin):
         self.assertIsNotNone(health_information_request.key_material)
         self.assertEqual(str(health_information_request.consent_artefact.artefact_id), self.artefact_id_1)
 
+    @override_settings(ABDM_INTEGRATOR={
+        'HIU_HEALTH_DATA_STORE': 'abdm_integrator.hiu.health_data_store.DatabaseHealthDataStore'
+    })
+    @patch('abdm_integrator.hiu.views.health_information.poll_and_pop_data_from_cache')
+    def test_request_health_information_stored_page(self, mocked_poll_and_pop_data_from_cache):
+        response_data = self._health_info_success_response()
+        response_data['page'] = 2
+        response_data['page_count'] = 2
+        health_information_request = HealthInformationRequest.objects.create(
+            user=self.user,
+            consent_artefact_id=self.artefact_id_1,
+            gateway_request_id=str(uuid.uuid4()),
+            transaction_id=response_data['transaction_id'],
+            key_material={},
+        )
+        health_data_store().save(health_information_request.gateway_request_id, 2, response_data)
+        request_data = {
+            **self._health_information_request_data(),
+            'transaction_id': response_data['transaction_id'],
+            'page': 2,
+        }
+
+        # Stored page can be requested again
+        for _ in range(2):
+            res = self.client.get(self.request_health_information_url, data=request_data)
+            self.assertEqual(res.status_code, HTTP_200_OK)
+            json_res = res.json()
+            self.assertEqual(json_res['page'], 2)
+            self.assertIsNone(json_res['next'])
+            self.assertEqual(json_res['results'], response_data['entries'])
+        mocked_poll_and_pop_data_from_cache.assert_not_called()
+
+    @override_settings(ABDM_INTEGRATOR={
+        'HIU_HEALTH_DATA_STORE': 'abdm_integrator.hiu.health_data_store.DatabaseHealthDataStore'
+    })
+    @patch('abdm_integrator.hiu.views.health_information.ABDMRequestHelper.gateway_post')
+    @patch('abdm_integrator.hiu.views.health_information.ABDMRequestHelper.common_request_data')
+    def test_request_health_information_stored_page_gateway_error(self, mocked_common_request_data, *args):
+        mocked_common_request_data.return_value = {
+            'requestId': str(uuid.uuid4()),
+            'timestamp': datetime.utcnow().isoformat()
+        }
+        gateway_error = {'error': {'code': 2500, 'message': 'Invalid request'}}
+        ABDMCache.set(f"{mocked_common_request_data.return_value['requestId']}_1", gateway_error, 10)
+
+        res = self.client.get(self.request_health_information_url, data=self._health_information_request_data())
+
+        self.assertEqual(res.status_code, ABDMGatewayError.status_code)
+        self.assert_error(res.json()['error'], gateway_error['error']['code'], ABDMGatewayError.error_message)
+
+    @override_settings(ABDM_INTEGRATOR={
+        'HIU_HEALTH_DATA_STORE': 'abdm_integrator.hiu.health_data_store.DatabaseHealthDataStore'
+    })
+    def test_request_health_information_stored_page_of_other_user(self):
+        response_data = self._health_info_success_response()
+        other_user = User.objects.create_user(username='other_user', password='test')
+        health_information_request = HealthInformationRequest.objects.create(
+            user=other_user,
+            consent_artefact_id=self.artefact_id_1,
+            gateway_request_id=str(uuid.uuid4()),
+            transaction_id=response_data['transaction_id'],
+            key_material={},
+        )
+        health_data_store().save(health_information_request.gateway_request_id, 1, response_data)
+        request_data = {
+            **self._health_information_request_data(),
+            'transaction_id': response_data['transaction_id'],
+            'page': 1,
+        }
+
+        res = self.client.get(self.request_health_information_url, data=request_data)
+
+        self.assertEqual(res.status_code, HTTP_404_NOT_FOUND)
+
     def test_request_health_information_authentication_error(self):
         res = APIClient().get(self.request_health_information_url)
         self.assert_for_authentication_error(res, HIUError.CODE_PREFIX)
 
-    @patch('abdm_integrator.utils.requests.post')
+    @patch('abdm_integrator.utils.http_sessions.post')
     def test_request_health_information_gateway_error(self, mocked_post):
         gateway_error = {'error': {'code': 2500, 'message': 'Invalid request'}}
         mocked_post.return_value = generate_mock_response(HTTP_400_BAD_REQUEST, gateway_error)
@@ -230,7 +323,7 @@ class TestRequestHealthInformationAPI(APITestCase, APITestHelperMixin):
         )
         self.assertEqual(HealthInformationRequest.objects.all().count(), 0)
 
-    @patch('abdm_integrator.utils.requests.post', side_effect=requests.Timeout)
+    @patch('abdm_integrator.utils.http_sessions.post', side_effect=requests.Timeout)
     def test_request_health_information_service_unavailable_error(self, mocked_post):
         client = APIClient(raise_request_exception=False)
         client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
@@ -328,3 +421,293 @@ class TestRequestHealthInformationAPI(APITestCase, APITestHelperMixin):
             mocked_response_cache['error']['message'], None
         )
         self.assertEqual(HealthInformationRequest.objects.all().count(), 1)
+
+
+def _sha256(data):
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+@patch('abdm_integrator.hiu.views.health_information.ABDMCrypto.decrypt', side_effect=lambda data, _: data)
+class TestReceiveHealthInformationProcessor(SimpleTestCase):
+
+    @staticmethod
+    def _entry(content, care_context_reference='CC-101'):
+        content_str = json.dumps(content)
+        return {
+            'content': content_str,
+            'checksum': ABDMCrypto.generate_checksum(content_str),
+            'careContextReference': care_context_reference,
+        }
+
+    def _processor(self, entries):
+        request_data = {
+            'transactionId': str(uuid.uuid4()),
+            'pageNumber': 1,
+            'pageCount': 1,
+            'keyMaterial': {'nonce': 'nonce', 'dhPublicKey': {'keyValue': 'public key'}},
+            'entries': entries,
+        }
+        health_information_request = Mock(key_material=asdict(ABDMCrypto().key_material))
+        with patch('abdm_integrator.hiu.views.health_information.HealthInformationRequest.objects.get',
+                   return_value=health_information_request):
+            return ReceiveHealthInformationProcessor(request_data)
+
+    def test_process_entries(self, *args):
+        entries = [self._entry({'test': 1}, 'CC-101'), {'link': 'https://link', 'careContextReference': 'CC-102'},
+                   self._entry({'test': 2}, 'CC-103')]
+        self.assertEqual(self._processor(entries).process_entries(), [
+            {'care_context_reference': 'CC-101', 'content_hash': _sha256(entries[0]['content']),
+             'content': {'test': 1}},
+            {'care_context_reference': 'CC-103', 'content_hash': _sha256(entries[2]['content']),
+             'content': {'test': 2}},
+        ])
+
+    def test_process_entries_checksum_failed(self, *args):
+        entries = [self._entry({'test': 1}), dict(self._entry({'test': 2}), checksum='invalid')]
+        with self.assertRaisesMessage(HealthDataReceiverException, 'Checksum failed'):
+            self._processor(entries).process_entries()
+
+    def test_decrypt_entry_in_process(self, *args):
+        entry = self._entry({'test': 1})
+        session = Mock(decrypt=lambda data: data)
+        self.assertEqual(
+            _decrypt_entry_in_process(session, entry),
+            {'care_context_reference': 'CC-101', 'content_hash': _sha256(entry['content']), 'content': {'test': 1}}
+        )
+
+    @override_settings(ABDM_INTEGRATOR={'HIU_DECRYPTION_PROCESSES': 2})
+    @patch('abdm_integrator.hiu.views.health_information.ReceiveHealthInformationProcessor'
+           '._process_entries_in_processes')
+    def test_process_entries_inline_in_daemonic_process(self, mocked_process_entries_in_processes, *args):
+        entries = [self._entry({'test': 1}, 'CC-101'), self._entry({'test': 2}, 'CC-102')]
+        with patch('abdm_integrator.process_pools.multiprocessing.current_process',
+                   return_value=Mock(daemon=True)):
+            processed_entries = self._processor(entries).process_entries()
+        mocked_process_entries_in_processes.assert_not_called()
+        self.assertEqual([entry['content'] for entry in processed_entries], [{'test': 1}, {'test': 2}])
+
+    @override_settings(ABDM_INTEGRATOR={'HIU_DECRYPTION_PROCESSES': 2})
+    def test_process_entries_in_processes_reuses_pool(self, *args):
+        entries = [self._entry({'test': 1}, 'CC-101'), self._entry({'test': 2}, 'CC-102')]
+        processor = self._processor(entries)
+        pool = Mock()
+        pool.map.side_effect = lambda func, *iterables: map(func, *iterables)
+        session = Mock(decrypt=lambda data: data)
+        with patch('abdm_integrator.hiu.views.health_information.ProcessPools.get_pool',
+                   return_value=pool) as mocked_get_pool, \
+                patch('abdm_integrator.crypto.ABDMCrypto.session', return_value=session) as mocked_session:
+            processor.process_entries()
+            processed_entries = processor.process_entries()
+        self.assertEqual([entry['content'] for entry in processed_entries], [{'test': 1}, {'test': 2}])
+        mocked_get_pool.assert_called_with('hiu_decryption', 2)
+        # Session with the derived key is sent to the processes instead of the key material
+        self.assertIs(next(pool.map.call_args.args[1]), session)
+        mocked_session.assert_called_with(processor.request_data['keyMaterial'])
+
+
+class TestReceiveHealthInformationProcessorKeyDerivation(SimpleTestCase):
+    """Decrypts using the default crypto backend, with fidelius check of the derived key patched"""
+
+    def setUp(self):
+        backend = CryptographyBackend()
+        self.hiu_key_material = backend.generate_key_material()
+        hip_key_material = backend.generate_key_material()
+        self.hip_transfer_material = {'nonce': hip_key_material.nonce,
+                                      'dhPublicKey': {'keyValue': hip_key_material.public_key}}
+        self.hip_session = CryptoSession(hip_key_material.private_key, hip_key_material.nonce,
+                                         self.hiu_key_material.public_key, self.hiu_key_material.nonce)
+        fidelius_encrypt_patch = patch.object(FideliusSession, '_fidelius_encrypt',
+                                              return_value=self.hip_session.encrypt(FideliusSession.probe))
+        self.mocked_fidelius_encrypt = fidelius_encrypt_patch.start()
+        self.addCleanup(fidelius_encrypt_patch.stop)
+        derive_patch = patch('abdm_integrator.crypto.curve25519_shared_secret', wraps=curve25519_shared_secret)
+        self.mocked_derive = derive_patch.start()
+        self.addCleanup(derive_patch.stop)
+
+    def _processor(self, contents):
+        entries = []
+        for content in contents:
+            content_str = json.dumps(content)
+            entries.append({'content': self.hip_session.encrypt(content_str),
+                            'checksum': ABDMCrypto.generate_checksum(content_str),
+                            'careContextReference': 'CC-101'})
+        request_data = {'transactionId': str(uuid.uuid4()), 'pageNumber': 1, 'pageCount': 1,
+                        'keyMaterial': self.hip_transfer_material, 'entries': entries}
+        health_information_request = Mock(key_material=asdict(self.hiu_key_material))
+        with patch('abdm_integrator.hiu.views.health_information.HealthInformationRequest.objects.get',
+                   return_value=health_information_request):
+            return ReceiveHealthInformationProcessor(request_data)
+
+    def _assert_key_derived_once(self, processed_entries):
+        self.assertEqual([entry['content'] for entry in processed_entries],
+                         [{'test': 1}, {'test': 2}, {'test': 3}])
+        self.assertEqual(self.mocked_derive.call_count, 1)
+        self.mocked_fidelius_encrypt.assert_called_once_with(FideliusSession.probe)
+
+    def test_key_derived_once_per_page(self):
+        processed_entries = self._processor([{'test': 1}, {'test': 2}, {'test': 3}]).process_entries()
+        self._assert_key_derived_once(processed_entries)
+
+    @override_settings(ABDM_INTEGRATOR={'HIU_DECRYPTION_PROCESSES': 2})
+    def test_key_derived_once_per_page_in_processes(self):
+        pool = Mock()
+        # Session is pickled for each entry, as when sent to the processes
+        pool.map.side_effect = lambda func, sessions, entries: [
+            func(pickle.loads(pickle.dumps(session)), entry) for session, entry in zip(sessions, entries)
+        ]
+        processor = self._processor([{'test': 1}, {'test': 2}, {'test': 3}])
+        with patch('abdm_integrator.hiu.views.health_information.ProcessPools.get_pool', return_value=pool):
+            processed_entries = processor.process_entries()
+        pool.map.assert_called_once()
+        self._assert_key_derived_once(processed_entries)
+
+
+@patch('abdm_integrator.hiu.views.health_information.ReceiveHealthInformationProcessor.set_response_in_cache')
+@patch('abdm_integrator.hiu.views.health_information.ReceiveHealthInformationProcessor.validate_request')
+class TestReceiveHealthInformationProcessorStatus(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='test_user', password='test')
+        consent_request = ConsentRequest.objects.create(
+            user=user,
+            consent_request_id=str(uuid.uuid4()),
+            gateway_request_id=str(uuid.uuid4()),
+            health_info_from_date=datetime.utcnow(),
+            health_info_to_date=datetime.utcnow(),
+            health_info_types=[],
+            expiry_date=datetime.utcnow() + timedelta(days=1),
+            details={},
+        )
+        artefact = ConsentArtefact.objects.create(
+            consent_request=consent_request,
+            artefact_id=str(uuid.uuid4()),
+            gateway_request_id=str(uuid.uuid4()),
+            details={},
+        )
+        cls.health_information_request = HealthInformationRequest.objects.create(
+            user=user,
+            consent_artefact=artefact,
+            gateway_request_id=str(uuid.uuid4()),
+            transaction_id=str(uuid.uuid4()),
+            key_material={},
+        )
+
+    def _process_page(self, page_number, care_context_references, error=None):
+        request_data = {
+            'transactionId': str(self.health_information_request.transaction_id),
+            'pageNumber': page_number,
+            'pageCount': 2,
+            'entries': [{'careContextReference': reference} for reference in care_context_references],
+        }
+        processor = ReceiveHealthInformationProcessor(request_data)
+        process_entries_patch = patch.object(
+            processor, 'process_entries', side_effect=HealthDataReceiverException(error) if error else None,
+            return_value=[]
+        )
+        with process_entries_patch, patch.object(processor, 'gateway_health_information_on_transfer') as notify:
+            processor.process_request()
+        return notify
+
+    def test_pages_received_out_of_order(self, *args):
+        notify = self._process_page(2, ['CC-103'])
+        notify.assert_not_called()
+        notify = self._process_page(1, ['CC-101', 'CC-102'], error='Checksum failed')
+
+        self.health_information_request.refresh_from_db()
+        self.assertEqual(self.health_information_request.pages_received, 2)
+        self.assertEqual(self.health_information_request.care_contexts_delivered, 1)
+        self.assertEqual(self.health_information_request.care_contexts_errored, 2)
+        self.assertEqual(self.health_information_request.status, HealthInformationStatus.FAILED)
+        session_status, care_contexts_status = notify.call_args.args
+        self.assertEqual(session_status, HealthInformationStatus.FAILED)
+        self.assertEqual([status['careContextReference'] for status in care_contexts_status],
+                         ['CC-101', 'CC-102', 'CC-103'])
+
+    def test_all_pages_delivered(self, *args):
+        self._process_page(1, ['CC-101'])
+        notify = self._process_page(2, ['CC-102'])
+
+        self.health_information_request.refresh_from_db()
+        self.assertEqual(self.health_information_request.care_contexts_delivered, 2)
+        self.assertEqual(self.health_information_request.status, HealthInformationStatus.TRANSFERRED)
+        notify.assert_called_once()
+        self.assertEqual(notify.call_args.args[0], HealthInformationStatus.TRANSFERRED)
+
+    def test_overall_status_single_query(self, *args):
+        self._process_page(2, ['CC-102', 'CC-103'])
+        processor = ReceiveHealthInformationProcessor({
+            'transactionId': str(self.health_information_request.transaction_id),
+            'pageNumber': 1,
+            'pageCount': 2,
+            'entries': [],
+        })
+        current_status = processor.generate_care_contexts_status([{'care_context_reference': 'CC-101'}])
+        with self.assertNumQueries(1):
+            session_status, care_contexts_status = processor.get_overall_status(current_status)
+        self.assertEqual(session_status, HealthInformationStatus.TRANSFERRED)
+        self.assertEqual([status['careContextReference'] for status in care_contexts_status],
+                         ['CC-101', 'CC-102', 'CC-103'])
+
+    def test_page_delivered_again_counted_once(self, *args):
+        self._process_page(1, ['CC-101'])
+        notify = self._process_page(1, ['CC-101'])
+        notify.assert_not_called()
+        notify = self._process_page(2, ['CC-102'])
+        notify.assert_called_once()
+        notify = self._process_page(2, ['CC-102'])
+        notify.assert_not_called()
+
+        self.health_information_request.refresh_from_db()
+        self.assertEqual(self.health_information_request.pages_received, 2)
+        self.assertEqual(self.health_information_request.care_contexts_delivered, 2)
+        self.assertEqual(self.health_information_request.health_data_receipts.count(), 2)
+
+
+class TestParseFHIREntriesForUI(SimpleTestCase):
+
+    @patch('abdm_integrator.hiu.fhir.parser.parse_fhir_bundle')
+    def test_parse_fhir_entries_for_ui(self, mocked_parse_fhir_bundle):
+        mocked_parse_fhir_bundle.side_effect = lambda bundle: {'content': bundle['valid']}
+        entries = [
+            {'content': {'valid': 1}, 'care_context_reference': 'CC-101'},
+            {'content': {}, 'care_context_reference': 'CC-102'},
+            {'content': {'valid': 3}, 'care_context_reference': 'CC-103'},
+        ]
+        with self.assertLogs('abdm_integrator', level='ERROR') as logs:
+            parsed_entries = parse_fhir_entries_for_ui(entries)
+        self.assertEqual(parsed_entries, [
+            {'content': 1, 'care_context_reference': 'CC-101'},
+            {'content': 3, 'care_context_reference': 'CC-103'},
+        ])
+        self.assertIn('Parsing error occurred for Care Context CC-102', logs.output[0])
+
+    @patch('abdm_integrator.hiu.views.health_information.app_settings.HIU_PARSE_FHIR_BUNDLE', True)
+    @patch('abdm_integrator.hiu.views.health_information.parse_fhir_entries_for_ui')
+    def test_entries_parsed_by_receiver_not_parsed_again(self, mocked_parse_fhir_entries_for_ui):
+        parsed_entries = [{'content': 1, 'care_context_reference': 'CC-101'}]
+        health_response_data = {
+            'transaction_id': str(uuid.uuid4()),
+            'page': 1,
+            'page_count': 1,
+            'entries': parsed_entries,
+            'parsed': True,
+        }
+        response = RequestHealthInformation().generate_response_from_health_data(
+            health_response_data, 'http://localhost/', str(uuid.uuid4())
+        )
+        mocked_parse_fhir_entries_for_ui.assert_not_called()
+        self.assertEqual(response.data['results'], parsed_entries)
+        self.assertNotIn('parsed', response.data)
+
+    def test_content_hash_not_in_response(self):
+        health_response_data = {
+            'transaction_id': str(uuid.uuid4()),
+            'page': 1,
+            'page_count': 1,
+            'entries': [{'content': {'test': 1}, 'content_hash': 'hash', 'care_context_reference': 'CC-101'}],
+        }
+        response = RequestHealthInformation().generate_response_from_health_data(
+            health_response_data, 'http://localhost/', str(uuid.uuid4())
+        )
+        self.assertEqual(response.data['results'], [{'content': {'test': 1}, 'care_context_reference': 'CC-101'}])
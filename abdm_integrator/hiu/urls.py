@@ -1,5 +1,6 @@
 from django.urls import path
 
+from abdm_integrator.async_views import sync_or_async_view
 from abdm_integrator.const import GATEWAY_CALLBACK_URL_PREFIX
 from abdm_integrator.hiu.views.consents import (
     ConsentArtefactFetch,
@@ -10,6 +11,7 @@ from abdm_integrator.hiu.views.consents import (
     GenerateConsent,
 )
 from abdm_integrator.hiu.views.health_information import (
+    AsyncRequestHealthInformation,
     GatewayHealthInformationOnRequest,
     ReceiveHealthInformation,
     RequestHealthInformation,
@@ -22,7 +24,8 @@ hiu_urls = [
     path('api/hiu/consent_artefacts', ConsentArtefactFetch.as_view({'get': 'list'}), name='artefacts_list'),
     path('api/hiu/consent_artefacts/<int:pk>', ConsentArtefactFetch.as_view({'get': 'retrieve'}),
          name='artefacts_retrieve'),
-    path('api/hiu/health-information/request', RequestHealthInformation.as_view(),
+    path('api/hiu/health-information/request',
+         sync_or_async_view('request_health_information', RequestHealthInformation, AsyncRequestHealthInformation),
          name='request_health_information'),
     path('api/hiu/health-information/receive', ReceiveHealthInformation.as_view(),
          name='receive_health_information'),
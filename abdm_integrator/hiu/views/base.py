@@ -1,12 +1,13 @@
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 
+from abdm_integrator.deadlines import RequestDeadlineMixin
 from abdm_integrator.hiu.exceptions import hiu_error_response_handler, hiu_gateway_error_response_handler
 from abdm_integrator.settings import app_settings
 from abdm_integrator.utils import ABDMGatewayAuthentication
 
 
-class HIUBaseView(APIView):
+class HIUBaseView(RequestDeadlineMixin, APIView):
     authentication_classes = [app_settings.AUTHENTICATION_CLASS]
     permission_classes = [IsAuthenticated]
 
@@ -5,6 +5,7 @@ from rest_framework.response import Response
 from rest_framework.serializers import ValidationError
 from rest_framework.status import HTTP_201_CREATED, HTTP_202_ACCEPTED
 
+from abdm_integrator.callbacks import delay_callback_once
 from abdm_integrator.const import ArtefactFetchStatus, ConsentStatus
 from abdm_integrator.exceptions import (
     ERROR_CODE_REQUIRED,
@@ -88,7 +89,8 @@ class GatewayConsentRequestNotify(HIUGatewayBaseView):
 
     def post(self, request, format=None):
         GatewayConsentRequestNotifySerializer(data=request.data).is_valid(raise_exception=True)
-        process_hiu_consent_notification_request.delay(request.data)
+        delay_callback_once('hiu_consent_notify', [request.data['requestId']],
+                            process_hiu_consent_notification_request, request.data)
         return Response(status=HTTP_202_ACCEPTED)
 
 
@@ -1,21 +1,28 @@
 import itertools
 import json
 import logging
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import asdict
 from datetime import datetime
 
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import F
 from django.http import QueryDict
 from django.shortcuts import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
 from rest_framework.status import HTTP_200_OK, HTTP_202_ACCEPTED
 
+from abdm_integrator.async_views import AsyncAPIViewMixin, run_in_thread
+from abdm_integrator.callbacks import delay_callback_once, publish_callback_response
 from abdm_integrator.const import HealthInformationStatus, RequesterType
 from abdm_integrator.crypto import ABDMCrypto
 from abdm_integrator.exceptions import ABDMGatewayError, CustomError
-from abdm_integrator.hiu.const import HEALTH_DATA_CACHE_TIMEOUT, HIUGatewayAPIPath
+from abdm_integrator.hiu.const import HEALTH_DATA_CACHE_TIMEOUT, HEALTH_DATA_STORED_NOTIFICATION, HIUGatewayAPIPath
 from abdm_integrator.hiu.exceptions import HealthDataReceiverException, HIUError
-from abdm_integrator.hiu.fhir.parser import parse_fhir_bundle
+from abdm_integrator.hiu.fhir.parser import bundle_content_hash, parse_fhir_bundles
+from abdm_integrator.hiu.health_data_store import health_data_store
 from abdm_integrator.hiu.models import ConsentArtefact, HealthDataReceiver, HealthInformationRequest
 from abdm_integrator.hiu.serializers.health_information import (
     GatewayHealthInformationOnRequestSerializer,
@@ -24,17 +31,20 @@ from abdm_integrator.hiu.serializers.health_information import (
 )
 from abdm_integrator.hiu.tasks import process_hiu_health_information_receiver
 from abdm_integrator.hiu.views.base import HIUBaseView, HIUGatewayBaseView
+from abdm_integrator.process_pools import ProcessPools
 from abdm_integrator.settings import app_settings
 from abdm_integrator.utils import (
-    ABDMCache,
     ABDMRequestHelper,
     abdm_iso_to_datetime,
+    async_poll_and_pop_data_from_cache,
     datetime_to_abdm_iso,
     poll_and_pop_data_from_cache,
 )
 
 logger = logging.getLogger('abdm_integrator')
 
+DECRYPTION_POOL = 'hiu_decryption'
+
 
 class RequestHealthInformation(HIUBaseView):
 
@@ -47,11 +57,7 @@ class RequestHealthInformation(HIUBaseView):
         """
         request_data = request.query_params
         RequestHealthInformationSerializer(data=request_data).is_valid(raise_exception=True)
-
-        artefact = get_object_or_404(
-            ConsentArtefact, artefact_id=request_data['artefact_id'], consent_request__user=request.user
-        )
-        self.validate_artefact_expiry(artefact)
+        artefact = self.get_artefact(request_data['artefact_id'], request.user)
 
         current_url = request.build_absolute_uri(reverse('request_health_information'))
         health_info_url = request.build_absolute_uri(reverse('receive_health_information'))
@@ -59,10 +65,9 @@ class RequestHealthInformation(HIUBaseView):
         # 'transaction_id' and 'page' as returned from the previous request
         if request_data.get('transaction_id') and request_data.get('page'):
             page_number = request_data['page']
-            gateway_request_id = get_object_or_404(
-                HealthInformationRequest,
-                transaction_id=request_data['transaction_id']
-            ).gateway_request_id
+            gateway_request_id = self.get_gateway_request_id(
+                request_data['transaction_id'], request.user, artefact
+            )
         else:
             page_number = 1
             hiu_crypto = ABDMCrypto()
@@ -73,13 +78,45 @@ class RequestHealthInformation(HIUBaseView):
                 request.user, artefact, gateway_request_id, asdict(hiu_crypto.key_material)
             )
 
+        health_response_data = self.wait_for_health_data(gateway_request_id, page_number)
+        return self.generate_response_from_health_data(health_response_data, current_url, artefact.artefact_id)
+
+    @staticmethod
+    def wait_for_health_data(gateway_request_id, page_number):
+        """
+        Returns health data of the page from the health data store if configured, else waits for it to be handed
+        off through cache by `ReceiveHealthInformationProcessor`.
+        """
         cache_key = f'{gateway_request_id}_{page_number}'
-        health_response_data = poll_and_pop_data_from_cache(cache_key, interval=4)
+        store = health_data_store()
+        if store is None:
+            return poll_and_pop_data_from_cache(cache_key, interval=4)
+        health_response_data = store.get(gateway_request_id, page_number)
+        if health_response_data is None:
+            health_response_data = poll_and_pop_data_from_cache(cache_key, interval=4)
+            # Saved pages are only notified through cache, while errors from Gateway are published in full
+            if health_response_data == HEALTH_DATA_STORED_NOTIFICATION:
+                health_response_data = store.get(gateway_request_id, page_number)
+        return health_response_data
+
+    def get_artefact(self, artefact_id, user):
+        artefact = get_object_or_404(ConsentArtefact, artefact_id=artefact_id, consent_request__user=user)
+        self.validate_artefact_expiry(artefact)
+        return artefact
+
+    @staticmethod
+    def get_gateway_request_id(transaction_id, user, artefact):
+        return get_object_or_404(
+            HealthInformationRequest, transaction_id=transaction_id, user=user, consent_artefact=artefact
+        ).gateway_request_id
 
+    def generate_response_from_health_data(self, health_response_data, current_url, artefact_id):
         self.handle_for_error(health_response_data)
-        if app_settings.HIU_PARSE_FHIR_BUNDLE:
+        # Entries may have been already parsed by the receiver as per `HIU_PARSE_FHIR_BUNDLE_IN_RECEIVER`
+        parsed = health_response_data.pop('parsed', False)
+        if app_settings.HIU_PARSE_FHIR_BUNDLE and not parsed:
             health_response_data['entries'] = self.parse_fhir_bundle_for_ui(health_response_data['entries'])
-        response_data = self.generate_response_data(health_response_data, current_url, artefact.artefact_id)
+        response_data = self.generate_response_data(health_response_data, current_url, artefact_id)
         return Response(status=HTTP_200_OK, data=response_data)
 
     def validate_artefact_expiry(self, artefact):
@@ -121,6 +158,9 @@ class RequestHealthInformation(HIUBaseView):
     def generate_response_data(self, health_response_data, current_url, artefact_id):
         health_response_data['next'] = None
         health_response_data['results'] = health_response_data.pop('entries')
+        # Content hash is kept in received entries only to look up parsed bundles in the cache
+        for entry in health_response_data['results']:
+            entry.pop('content_hash', None)
         if health_response_data['page'] < health_response_data['page_count']:
             health_response_data['next'] = (
                 f'{current_url}?{self._get_next_query_params(health_response_data, artefact_id).urlencode()}'
@@ -128,19 +168,7 @@ class RequestHealthInformation(HIUBaseView):
         return health_response_data
 
     def parse_fhir_bundle_for_ui(self, fhir_entries):
-        parsed_entries = []
-        for entry in fhir_entries:
-            try:
-                parsed_entry = parse_fhir_bundle(entry['content'])
-                parsed_entry['care_context_reference'] = entry['care_context_reference']
-                parsed_entries.append(parsed_entry)
-            except Exception as err:
-                logger.exception(
-                    'ABDM HIU: Parsing error occurred for Care Context %s: %s',
-                    entry['care_context_reference'],
-                    err
-                )
-        return parsed_entries
+        return parse_fhir_entries_for_ui(fhir_entries)
 
     def handle_for_error(self, health_response_data):
         if not health_response_data:
@@ -156,6 +184,50 @@ class RequestHealthInformation(HIUBaseView):
             raise ABDMGatewayError(error.get('code'), error.get('message'))
 
 
+class AsyncRequestHealthInformation(AsyncAPIViewMixin, RequestHealthInformation):
+    """Async variant of `RequestHealthInformation` that waits for health data without holding a thread."""
+
+    @staticmethod
+    async def async_wait_for_health_data(gateway_request_id, page_number):
+        cache_key = f'{gateway_request_id}_{page_number}'
+        store = health_data_store()
+        if store is None:
+            return await async_poll_and_pop_data_from_cache(cache_key, interval=4)
+        health_response_data = await sync_to_async(store.get)(gateway_request_id, page_number)
+        if health_response_data is None:
+            health_response_data = await async_poll_and_pop_data_from_cache(cache_key, interval=4)
+            if health_response_data == HEALTH_DATA_STORED_NOTIFICATION:
+                health_response_data = await sync_to_async(store.get)(gateway_request_id, page_number)
+        return health_response_data
+
+    async def get(self, request, format=None):
+        request_data = request.query_params
+        RequestHealthInformationSerializer(data=request_data).is_valid(raise_exception=True)
+        artefact = await sync_to_async(self.get_artefact)(request_data['artefact_id'], request.user)
+
+        current_url = request.build_absolute_uri(reverse('request_health_information'))
+        health_info_url = request.build_absolute_uri(reverse('receive_health_information'))
+        if request_data.get('transaction_id') and request_data.get('page'):
+            page_number = request_data['page']
+            gateway_request_id = await sync_to_async(self.get_gateway_request_id)(
+                request_data['transaction_id'], request.user, artefact
+            )
+        else:
+            page_number = 1
+            hiu_crypto = ABDMCrypto()
+            gateway_request_id = await run_in_thread(
+                self.gateway_health_information_cm_request, artefact, health_info_url, hiu_crypto.transfer_material
+            )
+            await sync_to_async(self.save_health_info_request)(
+                request.user, artefact, gateway_request_id, asdict(hiu_crypto.key_material)
+            )
+
+        health_response_data = await self.async_wait_for_health_data(gateway_request_id, page_number)
+        return await run_in_thread(
+            self.generate_response_from_health_data, health_response_data, current_url, artefact.artefact_id
+        )
+
+
 class GatewayHealthInformationOnRequest(HIUGatewayBaseView):
 
     def post(self, request, format=None):
@@ -174,7 +246,7 @@ class GatewayHealthInformationOnRequest(HIUGatewayBaseView):
             health_information_request.error = request_data['error']
             health_information_request.status = HealthInformationStatus.ERROR
             cache_key = f'{health_information_request.gateway_request_id}_1'
-            ABDMCache.set(cache_key, request_data, 20)
+            publish_callback_response(cache_key, request_data, 20)
         health_information_request.save()
 
 
@@ -183,7 +255,9 @@ class ReceiveHealthInformation(HIUBaseView):
 
     def post(self, request, format=None):
         ReceiveHealthInformationSerializer(data=request.data).is_valid(raise_exception=True)
-        process_hiu_health_information_receiver.delay(request.data)
+        callback_id = f"{request.data['transactionId']}_{request.data['pageNumber']}"
+        delay_callback_once('hiu_health_information_receiver', [callback_id],
+                            process_hiu_health_information_receiver, request.data)
         return Response(status=HTTP_202_ACCEPTED)
 
 
@@ -191,6 +265,10 @@ class ReceiveHealthInformationProcessor:
     """
     Processes health information received from Provider and stores the processed data temporarily in cache
     to be picked up the health information request.
+    Entries of a page are decrypted by a pool of `HIU_DECRYPTION_PROCESSES` processes if set, kept for the life
+    of the worker, unless processes can not be created by the worker, for e.g. celery prefork pool workers.
+    FHIR bundles of entries are parsed here instead of the health information request if
+    `HIU_PARSE_FHIR_BUNDLE_IN_RECEIVER` is set.
     """
 
     def __init__(self, request_data):
@@ -210,13 +288,19 @@ class ReceiveHealthInformationProcessor:
         try:
             self.validate_request()
             self.response_data['entries'] = self.process_entries()
+            if app_settings.HIU_PARSE_FHIR_BUNDLE and app_settings.HIU_PARSE_FHIR_BUNDLE_IN_RECEIVER:
+                self.response_data['entries'] = parse_fhir_entries_for_ui(self.response_data['entries'])
+                self.response_data['parsed'] = True
         except HealthDataReceiverException as err:
             error = str(err)
         care_contexts_status = self.generate_care_contexts_status(self._care_contexts_from_request(), error)
-        self.save_health_data_receipt(care_contexts_status)
+        all_pages_received = False
+        with transaction.atomic():
+            if self.save_health_data_receipt(care_contexts_status):
+                all_pages_received = self.update_received_counts(care_contexts_status)
         self.set_response_in_cache(error)
-        # Notifies Gateway once all pages are received
-        if self.request_data['pageNumber'] == self.request_data['pageCount']:
+        # Notifies Gateway once all pages are received, which may arrive in any order
+        if all_pages_received:
             session_status, all_care_context_status = self.get_overall_status(care_contexts_status)
             self.update_health_information_request_status(session_status)
             self.gateway_health_information_on_transfer(session_status, all_care_context_status)
@@ -243,39 +327,70 @@ class ReceiveHealthInformationProcessor:
                 for entry in self.request_data['entries']]
 
     def process_entries(self):
-        hiu_crypto = ABDMCrypto(key_material_dict=self.health_information_request.key_material)
-        decrypted_entries = []
+        entries = []
+        for entry in self.request_data['entries']:
+            if entry.get('content'):
+                entries.append(entry)
+            else:
+                logger.info(
+                    'ABDM HIU: Entry type link received is not supported. Transaction: %s Care Context: %s',
+                    self.request_data['transactionId'],
+                    entry['careContextReference']
+                )
         try:
-            for entry in self.request_data['entries']:
-                if entry.get('content'):
-                    encrypted_data = entry['content']
-                    processed_entry = self._process_entry(entry, encrypted_data, hiu_crypto)
-                else:
-                    logger.info(
-                        'ABDM HIU: Entry type link received is not supported. Transaction: %s Care Context: %s',
-                        self.request_data['transactionId'],
-                        entry['careContextReference']
-                    )
-                    continue
-                decrypted_entries.append(processed_entry)
+            hiu_crypto = ABDMCrypto(key_material_dict=self.health_information_request.key_material)
+            pool = ProcessPools.get_pool(DECRYPTION_POOL, app_settings.HIU_DECRYPTION_PROCESSES)
+            if pool is not None and len(entries) > 1:
+                try:
+                    return self._process_entries_in_processes(pool, entries, hiu_crypto)
+                except BrokenProcessPool:
+                    ProcessPools.discard(DECRYPTION_POOL, pool)
+            return [self._process_entry(entry, entry['content'], hiu_crypto) for entry in entries]
         except Exception as err:
             raise HealthDataReceiverException(f'Error occurred while decryption process: {err}')
-        return decrypted_entries
+
+    def _process_entries_in_processes(self, pool, entries, hiu_crypto):
+        # Session is sent to the processes with the key already derived for the page.
+        # Results are returned in the order of entries, and the first error fails the whole page.
+        session = hiu_crypto.session(self.request_data['keyMaterial'])
+        return list(pool.map(_decrypt_entry_in_process, itertools.repeat(session), entries))
 
     def _process_entry(self, entry, encrypted_data, hiu_crypto):
-        data = {'care_context_reference': entry['careContextReference']}
-        decrypted_data_str = hiu_crypto.decrypt(encrypted_data, self.request_data['keyMaterial'])
-        if not hiu_crypto.generate_checksum(decrypted_data_str) == entry['checksum']:
-            raise HealthDataReceiverException('Error occurred while decryption process: Checksum failed')
-        data['content'] = json.loads(decrypted_data_str)
-        return data
+        return decrypt_health_data_entry(hiu_crypto, entry, encrypted_data, self.request_data['keyMaterial'])
 
     def save_health_data_receipt(self, care_contexts_status):
-        HealthDataReceiver.objects.create(
+        """
+        Saves the receipt of the page unless the page has already been received, for e.g. when delivered again
+        by HIP concurrently or after the callback dedupe timeout. Returns True if the page is received first time.
+        """
+        _, created = HealthDataReceiver.objects.get_or_create(
             health_information_request=self.health_information_request,
             page_number=self.request_data['pageNumber'],
-            care_contexts_status=care_contexts_status
+            defaults={'care_contexts_status': care_contexts_status}
+        )
+        if not created:
+            logger.info('ABDM HIU: Page %s already received. Transaction: %s', self.request_data['pageNumber'],
+                        self.request_data['transactionId'])
+        return created
+
+    def update_received_counts(self, care_contexts_status):
+        """
+        Adds a page received first time and its care contexts to the counts of the health information request.
+        Counts are incremented in the database, and receipts are unique per page, so `pages_received` is the
+        count of distinct pages and exactly one page completes the request even when pages are processed
+        concurrently. Returns True if this page completes the request.
+        """
+        errored_count = sum(1 for care_context_status in care_contexts_status
+                            if care_context_status['hiStatus'] == HealthInformationStatus.ERRORED)
+        HealthInformationRequest.objects.filter(pk=self.health_information_request.pk).update(
+            pages_received=F('pages_received') + 1,
+            care_contexts_errored=F('care_contexts_errored') + errored_count,
+            care_contexts_delivered=F('care_contexts_delivered') + len(care_contexts_status) - errored_count,
+        )
+        self.health_information_request.refresh_from_db(
+            fields=['pages_received', 'care_contexts_errored', 'care_contexts_delivered']
         )
+        return self.health_information_request.pages_received == self.request_data['pageCount']
 
     def generate_care_contexts_status(self, care_contexts, error=None):
         hi_status = HealthInformationStatus.ERRORED if error else HealthInformationStatus.OK
@@ -289,24 +404,44 @@ class ReceiveHealthInformationProcessor:
                 'code': HIUError.CODE_HEALTH_DATA_RECEIVER,
                 'message': HIUError.CUSTOM_ERRORS[HIUError.CODE_HEALTH_DATA_RECEIVER]
             }
-        cache_key = f"{self.health_information_request.gateway_request_id}_{self.response_data['page']}"
-        ABDMCache.set(cache_key, self.response_data, HEALTH_DATA_CACHE_TIMEOUT)
+        gateway_request_id = self.health_information_request.gateway_request_id
+        cache_key = f"{gateway_request_id}_{self.response_data['page']}"
+        store = health_data_store()
+        if store is None:
+            publish_callback_response(cache_key, self.response_data, HEALTH_DATA_CACHE_TIMEOUT)
+        else:
+            store.save(gateway_request_id, self.response_data['page'], self.response_data)
+            # Only notifies the waiting request, which reads the data from the store
+            publish_callback_response(cache_key, HEALTH_DATA_STORED_NOTIFICATION, HEALTH_DATA_CACHE_TIMEOUT)
 
     def get_overall_status(self, current_care_context_status):
+        """
+        Returns session status as per the counts of the request, and status of care contexts of all pages in
+        page order, which is only needed for the notification to Gateway. Status of the other pages is read from
+        their receipts in a single query once all pages are received. It is not appended to the request by each
+        page instead, as that rewrites the growing list for every page and needs the request row locked for
+        pages processed concurrently.
+        """
         all_care_context_status = current_care_context_status
-        if self.request_data['pageNumber'] > 1:
-            all_care_context_status_lists = self.health_information_request.health_data_receipts.all().values_list(
-                'care_contexts_status', flat=True
+        if self.request_data['pageCount'] > 1:
+            current_page_number = self.request_data['pageNumber']
+            pages_care_context_status = dict(
+                self.health_information_request.health_data_receipts.exclude(
+                    page_number=current_page_number
+                ).values_list('page_number', 'care_contexts_status')
             )
-            all_care_context_status = list(itertools.chain.from_iterable(all_care_context_status_lists))
-        transfer_status = not any(status['hiStatus'] == HealthInformationStatus.ERRORED
-                                  for status in all_care_context_status)
+            pages_care_context_status[current_page_number] = current_care_context_status
+            all_care_context_status = list(itertools.chain.from_iterable(
+                pages_care_context_status[page_number] for page_number in sorted(pages_care_context_status)
+            ))
+        transfer_status = not self.health_information_request.care_contexts_errored
         session_status = HealthInformationStatus.TRANSFERRED if transfer_status else HealthInformationStatus.FAILED
         return session_status, all_care_context_status
 
     def update_health_information_request_status(self, session_status):
         self.health_information_request.status = session_status
-        self.health_information_request.save()
+        # Avoids overwriting counts updated by pages processed concurrently
+        self.health_information_request.save(update_fields=['status', 'last_modified'])
 
     def gateway_health_information_on_transfer(self, session_status, care_contexts_status):
         artefact = self.health_information_request.consent_artefact
@@ -335,3 +470,46 @@ class ReceiveHealthInformationProcessor:
     def get_hiu_id_from_consent(self):
         consent_request = self.health_information_request.consent_artefact.consent_request
         return consent_request.details['hiu']['id']
+
+
+def parse_fhir_entries_for_ui(fhir_entries):
+    """
+    Parses FHIR bundles of entries in `HIU_PARSE_FHIR_BUNDLE_PROCESSES` processes if set. Entries that fail to
+    parse are logged and left out. Bundles already parsed are reused from the cache using content hash of entries.
+    """
+    parsed_entries = []
+    content_hashes = [entry.get('content_hash') for entry in fhir_entries]
+    results = parse_fhir_bundles(
+        [entry['content'] for entry in fhir_entries],
+        processes=app_settings.HIU_PARSE_FHIR_BUNDLE_PROCESSES,
+        content_hashes=content_hashes if all(content_hashes) else None,
+        processes_min_bytes=app_settings.HIU_PARSE_FHIR_BUNDLE_PROCESSES_MIN_BYTES,
+    )
+    for entry, (parsed_entry, err) in zip(fhir_entries, results):
+        if err is not None:
+            logger.error(
+                'ABDM HIU: Parsing error occurred for Care Context %s: %s',
+                entry['care_context_reference'],
+                err,
+                exc_info=err
+            )
+            continue
+        parsed_entries.append({**parsed_entry, 'care_context_reference': entry['care_context_reference']})
+    return parsed_entries
+
+
+def decrypt_health_data_entry(hiu_crypto, entry, encrypted_data, peer_transfer_material):
+    return _health_data_entry(entry, hiu_crypto.decrypt(encrypted_data, peer_transfer_material))
+
+
+def _health_data_entry(entry, decrypted_data_str):
+    if not ABDMCrypto.generate_checksum(decrypted_data_str) == entry['checksum']:
+        raise HealthDataReceiverException('Error occurred while decryption process: Checksum failed')
+    data = {'care_context_reference': entry['careContextReference'],
+            'content_hash': bundle_content_hash(decrypted_data_str)}
+    data['content'] = json.loads(decrypted_data_str)
+    return data
+
+
+def _decrypt_entry_in_process(session, entry):
+    return _health_data_entry(entry, session.decrypt(entry['content']))
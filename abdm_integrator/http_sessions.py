@@ -0,0 +1,82 @@
+"""
+Process wide pool of keep-alive HTTP sessions used for all outbound traffic to ABDM gateway, ABHA and HIU.
+A `requests.Session` is held per base URL (scheme and host) so that TCP and TLS connections are reused across
+requests. Sessions are discarded in a forked child process (e.g. celery prefork workers) as connections can not
+be shared with the parent process.
+"""
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from abdm_integrator.settings import app_settings
+
+
+class HTTPSessionPool:
+    _sessions = {}
+    _lock = threading.Lock()
+    _pid = os.getpid()
+
+    @classmethod
+    def get_session(cls, url):
+        base_url = cls.base_url(url)
+        cls._reset_if_forked()
+        session = cls._sessions.get(base_url)
+        if session is None:
+            with cls._lock:
+                session = cls._sessions.get(base_url)
+                if session is None:
+                    session = cls._sessions[base_url] = cls._create_session()
+        return session
+
+    @staticmethod
+    def base_url(url):
+        parts = urlsplit(url)
+        return f'{parts.scheme}://{parts.netloc}'.lower()
+
+    @staticmethod
+    def _create_session():
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=app_settings.HTTP_POOL_CONNECTIONS,
+            pool_maxsize=app_settings.HTTP_POOL_MAXSIZE,
+            pool_block=app_settings.HTTP_POOL_BLOCK,
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if not app_settings.HTTP_KEEP_ALIVE:
+            session.headers['Connection'] = 'close'
+        return session
+
+    @classmethod
+    def _reset_if_forked(cls):
+        if cls._pid != os.getpid():
+            cls.reset()
+
+    @classmethod
+    def reset(cls):
+        """Drops all sessions without closing them, as the connections may still be in use by parent process."""
+        cls._lock = threading.Lock()
+        cls._sessions = {}
+        cls._pid = os.getpid()
+
+    @classmethod
+    def close(cls):
+        with cls._lock:
+            for session in cls._sessions.values():
+                session.close()
+            cls._sessions = {}
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=HTTPSessionPool.reset)
+
+
+def get(url, **kwargs):
+    return HTTPSessionPool.get_session(url).get(url, **kwargs)
+
+
+def post(url, **kwargs):
+    return HTTPSessionPool.get_session(url).post(url, **kwargs)
@@ -0,0 +1,275 @@
+"""
+Instrumentation of outbound requests to ABDM gateway, ABHA and HIU data push URL.
+An `OutboundRequestEvent` is emitted for every request sent, to the collectors listed in
+`OUTBOUND_REQUEST_COLLECTORS` setting and to the receivers of `outbound_request_sent` signal.
+Other events are emitted to the same collectors using `emit_event`:
+    - DuplicateCallbackEvent: gateway callback dropped as a duplicate.
+    - CircuitBreakerEvent: circuit of outbound requests opened, closed, rejected a request or allowed a probe.
+    - HealthInformationTimingsEvent: seconds spent in each stage of a health information request by HIP.
+Available collectors:
+    - LoggingCollector: logs each event.
+    - PrometheusCollector: request count, latency histogram and bytes per API group, and counts of other events.
+      Requires `prometheus_client`.
+A collector is any class with `collect(event)` method, which is to ignore events of types it does not handle.
+Errors raised by collectors and receivers are logged and never fail the request.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlsplit
+
+from django.core.exceptions import ImproperlyConfigured
+from django.dispatch import Signal
+
+from abdm_integrator.http_sessions import HTTPSessionPool
+from abdm_integrator.settings import app_settings
+
+logger = logging.getLogger('abdm_integrator')
+
+# Sent with `event` argument as `OutboundRequestEvent`
+outbound_request_sent = Signal()
+
+
+@dataclass
+class OutboundRequestEvent:
+    path_group: str
+    method: Optional[str]
+    # Base URL (scheme and host) and path of the request
+    base_url: str
+    path: str
+    # HTTP status of the response, or None if no response was received
+    status: Optional[int]
+    # Class name of the exception raised while sending the request, if any
+    error: Optional[str]
+    bytes_sent: int
+    # None if there was no response or the response is streamed without Content-Length header
+    bytes_received: Optional[int]
+    # Seconds from sending the request till the response headers were parsed
+    elapsed: Optional[float]
+    # Total seconds taken to send the request and receive the response
+    duration: float
+    # Number of the attempt, for e.g. 1 when the request is sent again with a refreshed access token
+    retry: int
+    request_id: Optional[str]
+
+    @property
+    def outcome(self):
+        return str(self.status) if self.status is not None else self.error
+
+
+@dataclass
+class DuplicateCallbackEvent:
+    callback_name: str
+    callback_id: str
+
+
+@dataclass
+class CircuitBreakerEvent:
+    # Name of the circuit, made of base URL and API group
+    circuit: str
+    # One of 'opened', 'closed', 'rejected' and 'probe'
+    event: str
+
+
+@dataclass
+class HealthInformationTimingsEvent:
+    transaction_id: str
+    # None for timings of the whole request, which include the timings of all its pages
+    page_number: Optional[int]
+    # Stage (see `HIPStage`) to seconds
+    timings: dict
+
+
+class LoggingCollector:
+    """Logs each event on 'abdm_integrator' logger."""
+
+    def __init__(self, level=logging.INFO):
+        self.level = level
+
+    def collect(self, event):
+        if not isinstance(event, OutboundRequestEvent):
+            logger.log(self.level, 'ABDM event: %s', event)
+            return
+        logger.log(
+            self.level,
+            'ABDM outbound request: group=%s, method=%s, url=%s%s, outcome=%s, sent=%s, received=%s, '
+            'elapsed=%s, duration=%.3f, retry=%s, request_id=%s',
+            event.path_group, event.method, event.base_url, event.path, event.outcome, event.bytes_sent,
+            event.bytes_received, event.elapsed, event.duration, event.retry, event.request_id
+        )
+
+
+_prometheus_metrics = None
+_prometheus_metrics_lock = threading.Lock()
+
+
+class PrometheusCollector:
+    """
+    Collects Prometheus metrics of outbound requests, labelled by API group and method:
+        - abdm_outbound_requests_total: count by outcome (HTTP status or exception class name)
+        - abdm_outbound_request_duration_seconds: histogram of total duration
+        - abdm_outbound_request_sent_bytes_total and abdm_outbound_request_received_bytes_total
+    and of other events:
+        - abdm_duplicate_callbacks_total: count of duplicate gateway callbacks dropped, by callback name
+        - abdm_circuit_breaker_events_total: count of events of circuit breakers, by circuit and event
+        - abdm_hip_health_information_stage_seconds_total: seconds spent by HIP in each stage of health
+          information requests, by stage
+    Metrics are registered with the default registry unless `registry` is given.
+    Requires `prometheus_client` package to be installed.
+    """
+
+    def __init__(self, registry=None):
+        global _prometheus_metrics
+        if registry is not None:
+            self.metrics = self._create_metrics(registry)
+            return
+        # Metrics can be registered only once with the default registry
+        with _prometheus_metrics_lock:
+            if _prometheus_metrics is None:
+                _prometheus_metrics = self._create_metrics()
+            self.metrics = _prometheus_metrics
+
+    @staticmethod
+    def _create_metrics(registry=None):
+        try:
+            import prometheus_client
+        except ImportError:
+            raise ImproperlyConfigured('PrometheusCollector requires "prometheus_client" package to be installed.')
+        kwargs = {'registry': registry} if registry is not None else {}
+        labels = ['path_group', 'method']
+        return {
+            'requests': prometheus_client.Counter(
+                'abdm_outbound_requests', 'Outbound requests to ABDM', labels + ['outcome'], **kwargs
+            ),
+            'duration': prometheus_client.Histogram(
+                'abdm_outbound_request_duration_seconds', 'Duration of outbound requests to ABDM', labels,
+                **kwargs
+            ),
+            'sent_bytes': prometheus_client.Counter(
+                'abdm_outbound_request_sent_bytes', 'Bytes sent in outbound requests to ABDM', labels, **kwargs
+            ),
+            'received_bytes': prometheus_client.Counter(
+                'abdm_outbound_request_received_bytes', 'Bytes received in responses of outbound requests to ABDM',
+                labels, **kwargs
+            ),
+            'duplicate_callbacks': prometheus_client.Counter(
+                'abdm_duplicate_callbacks', 'Duplicate gateway callbacks dropped', ['callback_name'], **kwargs
+            ),
+            'circuit_breaker_events': prometheus_client.Counter(
+                'abdm_circuit_breaker_events', 'Events of circuit breakers of outbound requests to ABDM',
+                ['circuit', 'event'], **kwargs
+            ),
+            'health_information_stage_seconds': prometheus_client.Counter(
+                'abdm_hip_health_information_stage_seconds',
+                'Seconds spent by HIP in each stage of health information requests', ['stage'], **kwargs
+            ),
+        }
+
+    def collect(self, event):
+        if isinstance(event, OutboundRequestEvent):
+            self._collect_outbound_request(event)
+        elif isinstance(event, DuplicateCallbackEvent):
+            self.metrics['duplicate_callbacks'].labels(event.callback_name).inc()
+        elif isinstance(event, CircuitBreakerEvent):
+            self.metrics['circuit_breaker_events'].labels(event.circuit, event.event).inc()
+        elif isinstance(event, HealthInformationTimingsEvent) and event.page_number is None:
+            # Timings of pages are already included in the timings of the request
+            for stage, seconds in event.timings.items():
+                self.metrics['health_information_stage_seconds'].labels(stage).inc(seconds)
+
+    def _collect_outbound_request(self, event):
+        labels = (event.path_group, event.method or '')
+        self.metrics['requests'].labels(*labels, event.outcome).inc()
+        self.metrics['duration'].labels(*labels).observe(event.duration)
+        self.metrics['sent_bytes'].labels(*labels).inc(event.bytes_sent)
+        if event.bytes_received:
+            self.metrics['received_bytes'].labels(*labels).inc(event.bytes_received)
+
+
+_collectors = None
+_collector_classes = None
+_collectors_lock = threading.Lock()
+
+
+def outbound_request_collectors():
+    global _collectors, _collector_classes
+    collector_classes = tuple(app_settings.OUTBOUND_REQUEST_COLLECTORS or ())
+    with _collectors_lock:
+        if _collectors is None or _collector_classes != collector_classes:
+            _collectors = [collector_class() for collector_class in collector_classes]
+            _collector_classes = collector_classes
+        return _collectors
+
+
+def send_instrumented(send, path_group, retry=0, request_id=None, **kwargs):
+    """
+    Sends request using `send` (`http_sessions.get` or `http_sessions.post`) with `kwargs`, and emits
+    `OutboundRequestEvent` for it.
+    """
+    collectors = outbound_request_collectors()
+    if not collectors and not outbound_request_sent.has_listeners():
+        return send(**kwargs)
+    resp = error = None
+    start = time.perf_counter()
+    try:
+        resp = send(**kwargs)
+        return resp
+    except Exception as err:
+        error = err
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        try:
+            event = _outbound_request_event(send, path_group, retry, request_id, kwargs, resp, error, duration)
+        except Exception:
+            logger.exception('ABDM: Error in creating outbound request event')
+        else:
+            _emit(event, collectors)
+
+
+def _outbound_request_event(send, path_group, retry, request_id, kwargs, resp, error, duration):
+    url = kwargs['url']
+    data = kwargs.get('data') or b''
+    bytes_received = None
+    if resp is not None:
+        if kwargs.get('stream'):
+            content_length = resp.headers.get('Content-Length')
+            bytes_received = int(content_length) if content_length else None
+        else:
+            bytes_received = len(resp.content or b'')
+    return OutboundRequestEvent(
+        path_group=path_group,
+        method=getattr(send, '__name__', '').upper() or None,
+        base_url=HTTPSessionPool.base_url(url),
+        path=urlsplit(url).path,
+        status=resp.status_code if resp is not None else None,
+        error=error.__class__.__name__ if error is not None else None,
+        bytes_sent=len(data.encode() if isinstance(data, str) else data),
+        bytes_received=bytes_received,
+        elapsed=resp.elapsed.total_seconds() if resp is not None and resp.elapsed is not None else None,
+        duration=duration,
+        retry=retry,
+        request_id=request_id,
+    )
+
+
+def emit_event(event):
+    """Emits `event` other than `OutboundRequestEvent` to the collectors."""
+    _collect(event, outbound_request_collectors())
+
+
+def _emit(event, collectors):
+    _collect(event, collectors)
+    for receiver, response in outbound_request_sent.send_robust(sender=None, event=event):
+        if isinstance(response, Exception):
+            logger.error('ABDM: Error in outbound request signal receiver %s', receiver, exc_info=response)
+
+
+def _collect(event, collectors):
+    for collector in collectors:
+        try:
+            collector.collect(event)
+        except Exception:
+            logger.exception('ABDM: Error in collector %s', collector.__class__.__name__)
@@ -43,6 +43,28 @@ class HRPIntegration:
         msg = f'{self.__class__.__name__}.fetch_health_data() must be implemented.'
         raise NotImplementedError(msg)
 
+    def fetch_health_data_bulk(self, care_context_references, health_info_types, details_by_reference, **kwargs):
+        """
+        Method to return health data in FHIR format from HRP for multiple care context references in one call.
+        OPTIONAL to Implement. If not implemented, `fetch_health_data` is called for each care context reference.
+
+        :param care_context_references: Care Context References of health data
+        :type care_context_references: list
+        :param health_info_types: Valid health info types for which fhir data is required, by care context
+        reference
+        :type health_info_types: dict
+        :param details_by_reference: Additional Information stored while care context linking, by care context
+        reference
+        :type details_by_reference: dict
+        :returns: Dict of care context reference to list of FHIR records one for each health info type, same as
+        returned by `fetch_health_data`. Value can be an exception instance if fetching health data for that care
+        context reference failed. A missing reference is treated as no health record available.
+        :rtype: dict
+
+        """
+        msg = f'{self.__class__.__name__}.fetch_health_data_bulk() must be implemented.'
+        raise NotImplementedError(msg)
+
     def discover_patient_and_care_contexts(self, patient_details, hip_id, **kwargs):
         """
         Method to discover patient and their care contexts on HRP using the details shared by the patient.
@@ -0,0 +1,80 @@
+"""
+Process wide pools of worker processes for CPU bound work such as decrypting or parsing health data.
+A pool is created on first use and kept for the life of the process, so that requests and tasks do not pay
+for starting processes every time. Pools are discarded in a forked child process as they belong to the parent.
+Child processes can not be created by daemonic processes (e.g. celery prefork pool workers), in which case
+no pool is returned and callers are expected to do the work inline.
+"""
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger('abdm_integrator')
+
+
+class ProcessPools:
+    # Name to tuple of (pool, max workers)
+    _pools = {}
+    _lock = threading.Lock()
+    _pid = os.getpid()
+
+    @classmethod
+    def get_pool(cls, name, max_workers):
+        """
+        Returns pool `name` with `max_workers` processes, or None if `max_workers` is not set or processes
+        can not be created by the current process.
+        """
+        if not max_workers or multiprocessing.current_process().daemon:
+            return None
+        cls._reset_if_forked()
+        with cls._lock:
+            pool, pool_max_workers = cls._pools.get(name, (None, None))
+            if pool is None or pool_max_workers != max_workers:
+                if pool is not None:
+                    pool.shutdown(wait=False)
+                pool = ProcessPoolExecutor(max_workers=max_workers)
+                cls._pools[name] = (pool, max_workers)
+            return pool
+
+    @classmethod
+    def discard(cls, name, pool):
+        """Discards `pool` if it is still pool `name`, for e.g. when it is broken by a process that died."""
+        with cls._lock:
+            if cls._pools.get(name, (None, None))[0] is pool:
+                del cls._pools[name]
+        _shutdown_pool(pool)
+        logger.warning('ABDM: Discarded process pool %s', name)
+
+    @classmethod
+    def _reset_if_forked(cls):
+        if cls._pid != os.getpid():
+            cls.reset()
+
+    @classmethod
+    def reset(cls):
+        """Drops all pools without shutting them down, as they belong to the parent process."""
+        cls._lock = threading.Lock()
+        cls._pools = {}
+        cls._pid = os.getpid()
+
+    @classmethod
+    def shutdown(cls):
+        with cls._lock:
+            for pool, _ in cls._pools.values():
+                _shutdown_pool(pool)
+            cls._pools = {}
+
+
+def _shutdown_pool(pool):
+    # Pending work can only be cancelled on Python 3.9+, before which it is left to finish
+    if sys.version_info >= (3, 9):
+        pool.shutdown(wait=False, cancel_futures=True)
+    else:
+        pool.shutdown(wait=False)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=ProcessPools.reset)
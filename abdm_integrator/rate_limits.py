@@ -0,0 +1,128 @@
+"""
+Client side rate limiting of outbound requests to ABDM, so that the traffic stays within the quota of ABDM instead
+of being throttled with 429/503 errors. Budgets are configured per group of APIs (see `APIPathGroup`) using
+`RATE_LIMITS` setting. Rate limiter is selected using `RATE_LIMITER` setting.
+A request waits for up to `RATE_LIMIT_MAX_WAIT` seconds for its turn and fails with `ABDMServiceUnavailable`
+if the budget would not be available by then.
+"""
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from abdm_integrator.deadlines import within_deadline
+from abdm_integrator.exceptions import ABDMServiceUnavailable
+from abdm_integrator.settings import app_settings
+from abdm_integrator.utils import ABDMCache
+
+logger = logging.getLogger('abdm_integrator')
+
+
+class RateLimiter:
+    """Base interface for rate limiters"""
+
+    def acquire(self, group, requests, period):
+        """
+        Takes a turn for a request of `group`, which is allowed `requests` requests every `period` seconds.
+        Returns 0 if the turn is taken, else the number of seconds after which a turn may be available.
+        """
+        raise NotImplementedError(f'{self.__class__.__name__}.acquire() must be implemented.')
+
+
+class CacheRateLimiter(RateLimiter):
+    """
+    Token bucket per group shared by all processes through the Django cache, which holds up to `requests` tokens
+    and is refilled continuously at `requests` tokens every `period` seconds. Unlike counting requests in fixed
+    windows, requests are spread over the period and bursts never exceed `requests` requests.
+    Tokens and time of last refill are read and updated under a lock taken using atomic `add` of the cache.
+    """
+    # Seconds after which the lock expires, in case the process holding it dies
+    lock_timeout = 1
+    # Seconds to wait before trying again to take the lock held by another request
+    lock_retry_interval = 0.005
+
+    def acquire(self, group, requests, period):
+        refill_rate = requests / period
+        key = f'rate_limit_{group}'
+        with self._lock(group):
+            now = time.time()
+            tokens, refilled_at = ABDMCache.get(key) or (requests, now)
+            # Clocks of hosts may differ slightly
+            tokens = min(requests, tokens + max(0, now - refilled_at) * refill_rate)
+            if tokens >= 1:
+                ABDMCache.set(key, (tokens - 1, now), period * 2)
+                return 0
+            ABDMCache.set(key, (tokens, now), period * 2)
+            return (1 - tokens) / refill_rate
+
+    @contextmanager
+    def _lock(self, group):
+        key = f'rate_limit_{group}_lock'
+        token = uuid.uuid4().hex
+        while not ABDMCache.add(key, token, self.lock_timeout):
+            time.sleep(self.lock_retry_interval)
+        try:
+            yield
+        finally:
+            # Lock may have expired and been taken by another request
+            if ABDMCache.get(key) == token:
+                ABDMCache.delete(key)
+
+
+class InProcessRateLimiter(RateLimiter):
+    """
+    Token bucket per group that holds up to `requests` tokens and is refilled continuously at `requests` tokens
+    every `period` seconds. Budget is not shared with other processes, so meant for single process deployments
+    and tests.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Group to tuple of (tokens, time of last refill)
+        self._buckets = {}
+
+    def acquire(self, group, requests, period):
+        refill_rate = requests / period
+        with self._lock:
+            now = time.monotonic()
+            tokens, refilled_at = self._buckets.get(group, (requests, now))
+            tokens = min(requests, tokens + (now - refilled_at) * refill_rate)
+            if tokens >= 1:
+                self._buckets[group] = (tokens - 1, now)
+                return 0
+            self._buckets[group] = (tokens, now)
+            return (1 - tokens) / refill_rate
+
+
+_rate_limiter = None
+_rate_limiter_class = None
+_rate_limiter_lock = threading.Lock()
+
+
+def rate_limiter():
+    global _rate_limiter, _rate_limiter_class
+    with _rate_limiter_lock:
+        if _rate_limiter is None or _rate_limiter_class != app_settings.RATE_LIMITER:
+            _rate_limiter = app_settings.RATE_LIMITER()
+            _rate_limiter_class = app_settings.RATE_LIMITER
+        return _rate_limiter
+
+
+def acquire_rate_limit(group):
+    """
+    Waits till a request of `group` is allowed as per `RATE_LIMITS` setting. Raises `ABDMServiceUnavailable`
+    if it would not be allowed within `RATE_LIMIT_MAX_WAIT` seconds or before the current deadline.
+    """
+    limit = (app_settings.RATE_LIMITS or {}).get(group)
+    if not limit:
+        return
+    deadline = time.monotonic() + within_deadline(app_settings.RATE_LIMIT_MAX_WAIT or 0)
+    while True:
+        wait = rate_limiter().acquire(group, limit['requests'], limit.get('period', 1))
+        if wait <= 0:
+            return
+        if time.monotonic() + wait > deadline:
+            logger.error('ABDM Rate limit exceeded for %s', group)
+            raise ABDMServiceUnavailable()
+        time.sleep(wait)
@@ -15,12 +15,55 @@ DEFAULTS = {
     'CELERY_APP': None,
     'CELERY_QUEUE': None,
     'HIU_PARSE_FHIR_BUNDLE': False,
+    'HIU_PARSE_FHIR_BUNDLE_PROCESSES': 0,
+    'HIU_PARSE_FHIR_BUNDLE_PROCESSES_MIN_BYTES': 256 * 1024,
+    'HIU_PARSE_FHIR_BUNDLE_IN_RECEIVER': False,
+    'HIU_PARSED_FHIR_BUNDLE_CACHE_SIZE': 0,
+    'HIU_PARSED_FHIR_BUNDLE_CACHE_TIMEOUT': 60 * 60,
+    'HTTP_POOL_CONNECTIONS': 10,
+    'HTTP_POOL_MAXSIZE': 10,
+    'HTTP_POOL_BLOCK': False,
+    'HTTP_KEEP_ALIVE': True,
+    'HTTP_CONNECT_TIMEOUT': 10,
+    'HTTP_READ_TIMEOUT': 60,
+    'HTTP_TIMEOUTS': None,
+    'REQUEST_DEADLINE': None,
+    'TASK_DEADLINE': None,
+    'CALLBACK_BACKEND': 'abdm_integrator.callbacks.CacheCallbackBackend',
+    'CALLBACK_BACKEND_OPTIONS': None,
+    'CALLBACK_DEDUPE_TIMEOUT': 60 * 10,
+    'RATE_LIMITS': None,
+    'RATE_LIMITER': 'abdm_integrator.rate_limits.CacheRateLimiter',
+    'RATE_LIMIT_MAX_WAIT': 10,
+    'CIRCUIT_BREAKER_ENABLED': False,
+    'CIRCUIT_BREAKER_FAILURE_RATE': 0.5,
+    'CIRCUIT_BREAKER_MIN_REQUESTS': 20,
+    'CIRCUIT_BREAKER_WINDOW': 60,
+    'CIRCUIT_BREAKER_OPEN_DURATION': 30,
+    'OUTBOUND_REQUEST_COLLECTORS': [],
+    'ASYNC_VIEWS': [],
+    'HIP_HEALTH_DATA_FETCH_WORKERS': 1,
+    'HIP_HEALTH_DATA_ENCRYPTION_PROCESSES': 0,
+    'HIP_PAGE_DELIVERY_QUEUE_SIZE': 0,
+    'HIP_PAGE_DELIVERY_WORKERS': 1,
+    'HIP_PAGE_MAX_BYTES': None,
+    'HIP_PAGE_MAX_ENTRIES': 100,
+    'HIU_DECRYPTION_PROCESSES': 0,
+    'HIU_HEALTH_DATA_STORE': None,
+    'HIU_HEALTH_DATA_STORE_OPTIONS': None,
+    'HIU_HEALTH_DATA_RETENTION': 60 * 60 * 24,
+    'CRYPTO_BACKEND': 'abdm_integrator.crypto.FideliusBackend',
 }
 
 IMPORT_STRINGS = (
     'AUTHENTICATION_CLASS',
     'HRP_INTEGRATION_CLASS',
-    'CELERY_APP'
+    'CELERY_APP',
+    'CALLBACK_BACKEND',
+    'RATE_LIMITER',
+    'OUTBOUND_REQUEST_COLLECTORS',
+    'HIU_HEALTH_DATA_STORE',
+    'CRYPTO_BACKEND',
 )
 
 
@@ -0,0 +1,18 @@
+from django.test import SimpleTestCase, override_settings
+
+from abdm_integrator.async_views import sync_or_async_view
+from abdm_integrator.user_auth.views import AsyncAuthInit, AuthInit
+
+
+class TestSyncOrAsyncView(SimpleTestCase):
+
+    def test_sync_view_by_default(self):
+        view = sync_or_async_view('auth_init', AuthInit, AsyncAuthInit)
+        self.assertIs(view.cls, AuthInit)
+
+    @override_settings(ABDM_INTEGRATOR={'ASYNC_VIEWS': ['auth_init']})
+    def test_async_view_enabled(self):
+        view = sync_or_async_view('auth_init', AuthInit, AsyncAuthInit)
+        self.assertIs(view.cls, AsyncAuthInit)
+        self.assertTrue(view.csrf_exempt)
+        self.assertTrue(AsyncAuthInit.view_is_async)
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+from unittest.mock import AsyncMock, Mock
+
+from django.test import SimpleTestCase, override_settings
+
+from abdm_integrator.callbacks import (
+    CacheCallbackBackend,
+    InProcessCallbackBackend,
+    RedisCallbackBackend,
+    accept_callback_once,
+    callback_backend,
+    delay_callback_once,
+    publish_callback_response,
+    release_callback,
+)
+from abdm_integrator.instrumentation import DuplicateCallbackEvent
+from abdm_integrator.tests.test_instrumentation import EventsCollector
+from abdm_integrator.utils import async_poll_and_pop_data_from_cache, poll_and_pop_data_from_cache
+
+
+class TestCacheCallbackBackend(SimpleTestCase):
+
+    def test_wait_returns_published_data(self):
+        backend = CacheCallbackBackend()
+        backend.publish('test_cache_1', {'status': 'OK'}, 10)
+        start = time.monotonic()
+        self.assertEqual(backend.wait('test_cache_1', 2), {'status': 'OK'})
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertIsNone(backend.wait('test_cache_1', 0.1, 0.05))
+
+    def test_wait_timeout(self):
+        self.assertIsNone(CacheCallbackBackend().wait('test_cache_2', 0.2, 0.05))
+
+    def test_async_wait(self):
+        backend = CacheCallbackBackend()
+        backend.publish('test_cache_3', {'status': 'OK'}, 10)
+        self.assertEqual(asyncio.run(backend.async_wait('test_cache_3', 2)), {'status': 'OK'})
+        self.assertIsNone(asyncio.run(backend.async_wait('test_cache_3', 0.1, 0.05)))
+
+
+class TestInProcessCallbackBackend(SimpleTestCase):
+
+    def test_waiter_woken_on_publish(self):
+        backend = InProcessCallbackBackend()
+        timer = threading.Timer(0.1, backend.publish, args=('test_1', {'status': 'OK'}, 10))
+        timer.start()
+        start = time.monotonic()
+        self.assertEqual(backend.wait('test_1', 5), {'status': 'OK'})
+        self.assertLess(time.monotonic() - start, 1)
+        timer.join()
+
+    def test_wait_timeout(self):
+        self.assertIsNone(InProcessCallbackBackend().wait('test_2', 0.1))
+
+    def test_expired_data_not_returned(self):
+        backend = InProcessCallbackBackend()
+        backend.publish('test_3', {'status': 'OK'}, 0)
+        self.assertIsNone(backend.wait('test_3', 0.1))
+
+    def test_async_waiter_woken_on_publish(self):
+        backend = InProcessCallbackBackend()
+        timer = threading.Timer(0.1, backend.publish, args=('test_5', {'status': 'OK'}, 10))
+        timer.start()
+        start = time.monotonic()
+        self.assertEqual(asyncio.run(backend.async_wait('test_5', 5)), {'status': 'OK'})
+        self.assertLess(time.monotonic() - start, 1)
+        timer.join()
+
+    def test_async_wait_timeout(self):
+        self.assertIsNone(asyncio.run(InProcessCallbackBackend().async_wait('test_6', 0.1)))
+
+    @override_settings(ABDM_INTEGRATOR={'CALLBACK_BACKEND': 'abdm_integrator.callbacks.InProcessCallbackBackend'})
+    def test_poll_and_pop_data_from_cache_uses_configured_backend(self):
+        self.assertIsInstance(callback_backend(), InProcessCallbackBackend)
+        publish_callback_response('test_4', {'status': 'OK'}, 10)
+        self.assertEqual(poll_and_pop_data_from_cache('test_4', 2, 0.1), {'status': 'OK'})
+        publish_callback_response('test_4', {'status': 'OK'}, 10)
+        self.assertEqual(asyncio.run(async_poll_and_pop_data_from_cache('test_4', 2, 0.1)), {'status': 'OK'})
+
+
+class TestRedisCallbackBackend(SimpleTestCase):
+
+    def test_publish(self):
+        client = Mock()
+        RedisCallbackBackend(client=client).publish('test_1', {'status': 'OK'}, 10)
+        client.pipeline.return_value.rpush.assert_called_once_with('abdm_callback_test_1', '{"status": "OK"}')
+        client.pipeline.return_value.expire.assert_called_once_with('abdm_callback_test_1', 10)
+
+    def test_wait(self):
+        client = Mock()
+        client.blpop.return_value = (b'abdm_callback_test_1', json.dumps({'status': 'OK'}).encode())
+        self.assertEqual(RedisCallbackBackend(client=client).wait('test_1', 60), {'status': 'OK'})
+        client.blpop.assert_called_once_with(['abdm_callback_test_1'], timeout=60)
+
+    def test_wait_timeout(self):
+        client = Mock()
+        client.blpop.return_value = None
+        self.assertIsNone(RedisCallbackBackend(client=client).wait('test_1', 0.2))
+        client.blpop.assert_called_once_with(['abdm_callback_test_1'], timeout=1)
+
+    def test_async_wait(self):
+        async_client = AsyncMock()
+        async_client.blpop.return_value = (b'abdm_callback_test_1', json.dumps({'status': 'OK'}).encode())
+        backend = RedisCallbackBackend(client=Mock(), async_client=async_client)
+        self.assertEqual(asyncio.run(backend.async_wait('test_1', 60)), {'status': 'OK'})
+        async_client.blpop.assert_awaited_once_with(['abdm_callback_test_1'], timeout=60)
+
+
+class TestAcceptCallbackOnce(SimpleTestCase):
+
+    @override_settings(ABDM_INTEGRATOR={
+        'OUTBOUND_REQUEST_COLLECTORS': ['abdm_integrator.tests.test_instrumentation.EventsCollector'],
+    })
+    def test_duplicate_dropped(self):
+        EventsCollector.events = []
+        callback_id = str(uuid.uuid4())
+        self.assertTrue(accept_callback_once('test', callback_id))
+        self.assertFalse(accept_callback_once('test', callback_id))
+        self.assertFalse(accept_callback_once('test', callback_id))
+        self.assertTrue(accept_callback_once('test', str(uuid.uuid4())))
+        self.assertTrue(accept_callback_once('other_test', callback_id))
+        duplicate_event = DuplicateCallbackEvent(callback_name='test', callback_id=callback_id)
+        self.assertEqual(EventsCollector.events, [duplicate_event, duplicate_event])
+
+    def test_release_callback(self):
+        callback_id = str(uuid.uuid4())
+        self.assertTrue(accept_callback_once('test', callback_id))
+        release_callback('test', callback_id)
+        self.assertTrue(accept_callback_once('test', callback_id))
+
+    def test_delay_callback_once(self):
+        task = Mock()
+        callback_ids = [str(uuid.uuid4()), str(uuid.uuid4())]
+        self.assertTrue(delay_callback_once('test', callback_ids, task, 'data'))
+        self.assertFalse(delay_callback_once('test', callback_ids, task, 'data'))
+        # Duplicate of the second id only
+        self.assertFalse(delay_callback_once('test', [str(uuid.uuid4()), callback_ids[1]], task, 'data'))
+        task.delay.assert_called_once_with('data')
+
+    def test_delay_callback_once_releases_duplicate_other_ids(self):
+        task = Mock()
+        callback_id = str(uuid.uuid4())
+        self.assertTrue(accept_callback_once('test', callback_id))
+        other_callback_id = str(uuid.uuid4())
+        self.assertFalse(delay_callback_once('test', [other_callback_id, callback_id], task))
+        self.assertTrue(delay_callback_once('test', [other_callback_id], task))
+
+    def test_delay_callback_once_releases_on_queue_error(self):
+        task = Mock()
+        task.delay.side_effect = [ConnectionError, None]
+        callback_ids = [str(uuid.uuid4()), str(uuid.uuid4())]
+        with self.assertRaises(ConnectionError):
+            delay_callback_once('test', callback_ids, task)
+        self.assertTrue(delay_callback_once('test', callback_ids, task))
+        self.assertEqual(task.delay.call_count, 2)
+
+    @override_settings(ABDM_INTEGRATOR={'CALLBACK_DEDUPE_TIMEOUT': 0})
+    def test_dedupe_disabled(self):
+        callback_id = str(uuid.uuid4())
+        self.assertTrue(accept_callback_once('test', callback_id))
+        self.assertTrue(accept_callback_once('test', callback_id))
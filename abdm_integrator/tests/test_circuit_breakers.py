@@ -0,0 +1,126 @@
+import uuid
+from unittest.mock import Mock, patch
+
+import requests
+from django.test import SimpleTestCase, override_settings
+
+from abdm_integrator.circuit_breakers import CircuitBreaker, CircuitState, circuit_breaker
+from abdm_integrator.deadlines import deadline
+from abdm_integrator.exceptions import ABDMServiceUnavailable
+from abdm_integrator.instrumentation import CircuitBreakerEvent
+from abdm_integrator.tests.test_instrumentation import EventsCollector
+from abdm_integrator.utils import ABDMRequestHelper
+
+
+@override_settings(ABDM_INTEGRATOR={
+    'CIRCUIT_BREAKER_ENABLED': True,
+    'CIRCUIT_BREAKER_FAILURE_RATE': 0.5,
+    'CIRCUIT_BREAKER_MIN_REQUESTS': 4,
+    'CIRCUIT_BREAKER_WINDOW': 10,
+    'CIRCUIT_BREAKER_OPEN_DURATION': 30,
+    'OUTBOUND_REQUEST_COLLECTORS': ['abdm_integrator.tests.test_instrumentation.EventsCollector'],
+})
+class TestCircuitBreaker(SimpleTestCase):
+
+    def setUp(self):
+        EventsCollector.events = []
+        self.breaker = CircuitBreaker(str(uuid.uuid4()))
+        time_patch = patch('abdm_integrator.circuit_breakers.time.time', return_value=1000)
+        self.mocked_time = time_patch.start()
+        self.addCleanup(time_patch.stop)
+
+    def _send(self, failed):
+        probe = self.breaker.before_request()
+        self.breaker.record(failed=failed, probe=probe)
+
+    def test_opens_on_failure_rate(self):
+        self._send(failed=True)
+        self._send(failed=True)
+        self._send(failed=False)
+        self.assertEqual(self.breaker.state(), CircuitState.CLOSED)
+        self._send(failed=True)
+        self.assertEqual(self.breaker.state(), CircuitState.OPEN)
+        with self.assertRaises(ABDMServiceUnavailable):
+            self.breaker.before_request()
+        self.assertEqual(EventsCollector.events, [
+            CircuitBreakerEvent(circuit=self.breaker.name, event='opened'),
+            CircuitBreakerEvent(circuit=self.breaker.name, event='rejected'),
+        ])
+
+    def test_failures_outside_window_not_counted(self):
+        self._send(failed=True)
+        self._send(failed=True)
+        self._send(failed=True)
+        self.mocked_time.return_value = 1010
+        self._send(failed=True)
+        self.assertEqual(self.breaker.state(), CircuitState.CLOSED)
+
+    def test_half_open_probe(self):
+        for _ in range(4):
+            self._send(failed=True)
+        self.mocked_time.return_value = 1030
+        self.assertEqual(self.breaker.state(), CircuitState.HALF_OPEN)
+        self.assertTrue(self.breaker.before_request())
+        # Only one probe is allowed at a time
+        with self.assertRaises(ABDMServiceUnavailable):
+            self.breaker.before_request()
+
+        self.breaker.record(failed=True, probe=True)
+        self.assertEqual(self.breaker.state(), CircuitState.OPEN)
+
+        self.mocked_time.return_value = 1060
+        self.breaker.record(failed=False, probe=self.breaker.before_request())
+        self.assertEqual(self.breaker.state(), CircuitState.CLOSED)
+        # Failures before the circuit was closed are not counted
+        self._send(failed=True)
+        self.assertEqual(self.breaker.state(), CircuitState.CLOSED)
+
+    @patch('abdm_integrator.utils.ABDMRequestHelper.get_access_token')
+    @patch('abdm_integrator.utils.http_sessions.post')
+    def test_gateway_post(self, mocked_post, *args):
+        mocked_post.side_effect = requests.Timeout
+        api_path = f'/v0.5/consents/{uuid.uuid4()}'
+        for _ in range(4):
+            with self.assertRaises(ABDMServiceUnavailable):
+                ABDMRequestHelper().gateway_post(api_path, {})
+        self.assertEqual(mocked_post.call_count, 4)
+        with self.assertRaises(ABDMServiceUnavailable):
+            ABDMRequestHelper().gateway_post(api_path, {})
+        self.assertEqual(mocked_post.call_count, 4)
+
+    @patch('abdm_integrator.utils.ABDMRequestHelper.get_access_token')
+    @patch('abdm_integrator.utils.http_sessions.post')
+    def test_timeouts_shortened_by_deadline_not_failures(self, mocked_post, *args):
+        # Path of its own circuit, as circuits of the gateway are shared by the tests
+        api_path = f'/v0.5/links/link/{uuid.uuid4()}'
+        breaker = circuit_breaker(ABDMRequestHelper.gateway_base_url + api_path, 'links')
+        for error in (requests.ReadTimeout, requests.ConnectTimeout) * 2:
+            mocked_post.side_effect = error
+            with deadline(5), self.assertRaises(ABDMServiceUnavailable):
+                ABDMRequestHelper().gateway_post(api_path, {})
+        self.assertEqual(mocked_post.call_count, 4)
+        self.assertEqual(breaker.state(), CircuitState.CLOSED)
+
+        # Timeouts not shortened by the deadline are failures
+        mocked_post.side_effect = requests.ReadTimeout
+        for _ in range(4):
+            with deadline(300), self.assertRaises(ABDMServiceUnavailable):
+                ABDMRequestHelper().gateway_post(api_path, {})
+        self.assertEqual(breaker.state(), CircuitState.OPEN)
+
+    @patch('abdm_integrator.utils.ABDMRequestHelper.get_access_token')
+    @patch('abdm_integrator.utils.http_sessions.get')
+    def test_client_errors_not_failures(self, mocked_get, *args):
+        response = requests.Response()
+        response.status_code = 400
+        response.json = Mock(return_value={})
+        mocked_get.return_value = response
+        for _ in range(5):
+            with self.assertRaises(Exception):
+                ABDMRequestHelper().abha_get(f'/v1/{uuid.uuid4()}')
+        self.assertEqual(circuit_breaker(ABDMRequestHelper.abha_base_url + '/v1', 'abha').state(),
+                         CircuitState.CLOSED)
+
+    @override_settings(ABDM_INTEGRATOR={'CIRCUIT_BREAKER_ENABLED': False})
+    def test_disabled(self):
+        self.assertIsNone(circuit_breaker('https://dev.abdm.gov.in/gateway', 'consents'))
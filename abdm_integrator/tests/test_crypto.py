@@ -0,0 +1,359 @@
+import importlib.util
+import itertools
+import json
+import os
+import pickle
+import secrets
+import time
+from base64 import b64decode, b64encode
+from unittest import skipUnless
+from unittest.mock import patch
+
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+from django.test import SimpleTestCase, override_settings
+
+from abdm_integrator.crypto import (
+    CURVE25519_A,
+    CURVE25519_P,
+    CURVE25519_WEIERSTRASS_SHIFT,
+    CURVE25519_X509_PREFIX,
+    ABDMCrypto,
+    CryptographyBackend,
+    CryptoSession,
+    FideliusBackend,
+    FideliusSession,
+    curve25519_clamp,
+    curve25519_scalar_mult,
+    curve25519_shared_secret,
+    curve25519_v,
+)
+from abdm_integrator.utils import json_from_file
+
+FIDELIUS_INSTALLED = importlib.util.find_spec('fidelius') is not None
+
+# Known-answer vectors generated by fidelius, so that compatibility of CryptographyBackend with fidelius is tested
+# without fidelius installed. Each vector is a dict of key material of sender and requester, plaintext and the
+# ciphertexts encrypted by fidelius for the public key of requester as EC point and as X.509. Generate using
+# `generate_fidelius_vectors` management command, with fidelius installed, and save the output to this file.
+FIDELIUS_VECTORS_FILE = os.path.join(os.path.dirname(__file__), 'data', 'fidelius_vectors.json')
+FIDELIUS_VECTORS = json_from_file(FIDELIUS_VECTORS_FILE) if os.path.exists(FIDELIUS_VECTORS_FILE) else []
+
+
+def _key_pair():
+    """Returns tuple of private key, public key as EC point and public key as X.509 SubjectPublicKeyInfo"""
+    scalar = secrets.randbits(252)
+    x = (curve25519_scalar_mult(scalar, 9) + CURVE25519_WEIERSTRASS_SHIFT) % CURVE25519_P
+    # Only x coordinate is used for key agreement, so y is left out
+    point = b'\x04' + x.to_bytes(32, 'big') + bytes(32)
+    return (b64encode(scalar.to_bytes(33, 'big', signed=True)).decode(), b64encode(point).decode(),
+            b64encode(CURVE25519_X509_PREFIX + point).decode())
+
+
+def _decode_little_endian(hex_value):
+    return int.from_bytes(bytes.fromhex(hex_value), 'little')
+
+
+def _decode_u(hex_value):
+    # Most significant bit of u is ignored as per RFC 7748
+    return _decode_little_endian(hex_value) & (2 ** 255 - 1)
+
+
+def _transfer_material(public_key, nonce):
+    return {'dhPublicKey': {'keyValue': public_key}, 'nonce': nonce}
+
+
+class TestCurve25519(SimpleTestCase):
+
+    def test_scalar_mult_same_as_x25519(self):
+        for _ in range(5):
+            private_bytes = bytearray(os.urandom(32))
+            private_bytes[0] &= 248
+            private_bytes[31] = (private_bytes[31] & 127) | 64
+            public_key = X25519PrivateKey.from_private_bytes(bytes(private_bytes)).public_key()
+            public_bytes = public_key.public_bytes_raw()
+            self.assertEqual(curve25519_scalar_mult(int.from_bytes(private_bytes, 'little'), 9),
+                             int.from_bytes(public_bytes, 'little'))
+
+    def test_scalar_mult_rfc7748_vectors(self):
+        # Test vectors of section 5.2 of RFC 7748, as little endian bytes of scalar, input u and output u
+        vectors = [
+            ('a546e36bf0527c9d3b16154b82465edd62144c0ac1fc5a18506a2244ba449ac4',
+             'e6db6867583030db3594c1a424b15f7c726624ec26b3353b10a903a6d0ab1c4c',
+             'c3da55379de9c6908e94ea4df28d084f32eccf03491c71f754b4075577a28552'),
+            ('4b66e9d4d1b4673c5ad22691957d6af5c11b6421e0ea01d42ca4169e7918ba0d',
+             'e5210f12786811d3f4b7959d0538ae2c31dbe7106fc03c3efc4cd549c715a493',
+             '95cbde9476e8907d7aade45cb4b873f88b595a68799fa152e6f8f7647aac7957'),
+        ]
+        for scalar, u, expected_u in vectors:
+            self.assertEqual(
+                curve25519_scalar_mult(curve25519_clamp(_decode_little_endian(scalar)), _decode_u(u)),
+                _decode_little_endian(expected_u)
+            )
+
+    def test_diffie_hellman_rfc7748_vectors(self):
+        # Test vectors of section 6.1 of RFC 7748
+        alice_scalar = curve25519_clamp(_decode_little_endian(
+            '77076d0a7318a57d3c16c17251b26645df4c2f87ebc0992ab177fba51db92c2a'
+        ))
+        alice_u = _decode_little_endian('8520f0098930a754748b7ddcb43ef75a0dbf3a0d26381af4eba4a98eaa9b4e6a')
+        bob_scalar = curve25519_clamp(_decode_little_endian(
+            '5dab087e624a8a4b79e17f8b83800ee66f3bb1292618b6fd1c2f8b27ff88e0eb'
+        ))
+        bob_u = _decode_little_endian('de9edb7d7b7dc1b4d35b61c2ece435373f8343c85b78674dadfc7e146f882b4f')
+        shared_u = _decode_little_endian('4a5d9d5ba4ce2de1728e3bf480350f25e07e21c947d19e3376f09b3c1e161742')
+        self.assertEqual(curve25519_scalar_mult(alice_scalar, 9), alice_u)
+        self.assertEqual(curve25519_scalar_mult(bob_scalar, 9), bob_u)
+        self.assertEqual(curve25519_scalar_mult(alice_scalar, bob_u), shared_u)
+        self.assertEqual(curve25519_scalar_mult(bob_scalar, alice_u), shared_u)
+
+    def test_scalar_mult_small_scalars(self):
+        p, u = CURVE25519_P, 9
+        self.assertIsNone(curve25519_scalar_mult(0, u))
+        self.assertEqual(curve25519_scalar_mult(1, u), u)
+        # Doubling formula of Montgomery curve
+        doubled_u = (u * u - 1) ** 2 * pow(4 * u * (u * u + CURVE25519_A * u + 1), p - 2, p) % p
+        self.assertEqual(curve25519_scalar_mult(2, u), doubled_u)
+
+    def test_scalar_mult_invalid_scalar(self):
+        for scalar in (-1, 2 ** 256):
+            with self.assertRaises(ValueError):
+                curve25519_scalar_mult(scalar, 9)
+
+    def test_weierstrass_form(self):
+        # Parameters and generator of Curve25519 in Bouncy Castle
+        p = CURVE25519_P
+        a = 0x2aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa984914a144
+        b = 0x7b425ed097b425ed097b425ed097b425ed097b425ed097b4260b5e9c7710c864
+        generator_x = 0x2aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaad245a
+        generator_y = 0x20ae19a1b8a086b4e01edd2c7748d14c923d4d7e6d7c61b229e9c5a27eced3d9
+        self.assertEqual((9 + CURVE25519_WEIERSTRASS_SHIFT) % p, generator_x)
+        self.assertEqual(curve25519_v(9), generator_y)
+        self.assertEqual(generator_y ** 2 % p, (generator_x ** 3 + a * generator_x + b) % p)
+
+    def test_scalar_reduced_by_group_order(self):
+        # Bouncy Castle reduces private keys modulo the order of the generator, which clamped private keys
+        # generated by CryptographyBackend exceed, as they are at least 2 ** 254
+        order = 2 ** 252 + 27742317777372353535851937790883648493
+        _, peer_public_key, _ = _key_pair()
+        for _ in range(5):
+            private_key = CryptographyBackend().generate_key_material().private_key
+            scalar = int.from_bytes(b64decode(private_key), 'big')
+            self.assertGreaterEqual(scalar, 2 ** 254)
+            reduced_private_key = b64encode((scalar % order).to_bytes(33, 'big')).decode()
+            self.assertEqual(curve25519_scalar_mult(scalar, 9), curve25519_scalar_mult(scalar % order, 9))
+            self.assertEqual(curve25519_shared_secret(private_key, peer_public_key),
+                             curve25519_shared_secret(reduced_private_key, peer_public_key))
+
+    def test_shared_secret(self):
+        private_key_1, public_key_1, x509_public_key_1 = _key_pair()
+        private_key_2, public_key_2, _ = _key_pair()
+        shared_secret = curve25519_shared_secret(private_key_1, public_key_2)
+        self.assertEqual(len(shared_secret), 32)
+        self.assertEqual(curve25519_shared_secret(private_key_2, public_key_1), shared_secret)
+        self.assertEqual(curve25519_shared_secret(private_key_2, x509_public_key_1), shared_secret)
+
+    def test_shared_secret_invalid_public_key(self):
+        private_key, _, _ = _key_pair()
+        with self.assertRaises(ValueError):
+            curve25519_shared_secret(private_key, b64encode(b'\x05' + bytes(64)).decode())
+
+
+class TestCryptoSession(SimpleTestCase):
+
+    def setUp(self):
+        self.hip_keys = _key_pair()
+        self.hiu_keys = _key_pair()
+        self.hip_nonce = b64encode(os.urandom(32)).decode()
+        self.hiu_nonce = b64encode(os.urandom(32)).decode()
+
+    def test_encrypt_decrypt(self):
+        data = json.dumps({'resourceType': 'Bundle', 'entry': []})
+        hip_session = CryptoSession(self.hip_keys[0], self.hip_nonce, self.hiu_keys[1], self.hiu_nonce)
+        hiu_session = CryptoSession(self.hiu_keys[0], self.hiu_nonce, self.hip_keys[2], self.hip_nonce)
+        encrypted_data = hip_session.encrypt(data)
+        self.assertNotEqual(encrypted_data, data)
+        self.assertEqual(hiu_session.decrypt(encrypted_data), data)
+
+    def test_pickled_session_keeps_derived_key(self):
+        hip_session = CryptoSession(self.hip_keys[0], self.hip_nonce, self.hiu_keys[1], self.hiu_nonce)
+        hiu_session = CryptoSession(self.hiu_keys[0], self.hiu_nonce, self.hip_keys[2], self.hip_nonce)
+        encrypted_data = hip_session.encrypt('data')
+        pickled_session = pickle.dumps(hiu_session)
+        with patch('abdm_integrator.crypto.curve25519_shared_secret') as mocked:
+            self.assertEqual(pickle.loads(pickled_session).decrypt(encrypted_data), 'data')
+        mocked.assert_not_called()
+
+    def test_abdm_crypto_reuses_session(self):
+        crypto = ABDMCrypto(key_material_dict={
+            'private_key': self.hip_keys[0],
+            'public_key': self.hip_keys[1],
+            'x509_public_key': self.hip_keys[2],
+            'nonce': self.hip_nonce,
+        }, backend=CryptographyBackend())
+        peer_transfer_material = _transfer_material(self.hiu_keys[1], self.hiu_nonce)
+        with patch('abdm_integrator.crypto.curve25519_shared_secret', wraps=curve25519_shared_secret) as mocked:
+            encrypted_data = [crypto.encrypt(data, peer_transfer_material) for data in ('first', 'second')]
+        self.assertEqual(mocked.call_count, 1)
+        self.assertIs(crypto.session(peer_transfer_material), crypto.session(dict(peer_transfer_material)))
+        hiu_session = CryptoSession(self.hiu_keys[0], self.hiu_nonce, self.hip_keys[2], self.hip_nonce)
+        self.assertEqual([hiu_session.decrypt(data) for data in encrypted_data], ['first', 'second'])
+
+
+class TestFideliusSession(SimpleTestCase):
+
+    def setUp(self):
+        self.hip_keys = _key_pair()
+        self.hiu_keys = _key_pair()
+        self.hip_nonce = b64encode(os.urandom(32)).decode()
+        self.hiu_nonce = b64encode(os.urandom(32)).decode()
+        self.hiu_session = CryptoSession(self.hiu_keys[0], self.hiu_nonce, self.hip_keys[2], self.hip_nonce)
+
+    def _hip_session(self):
+        return FideliusSession(self.hip_keys[0], self.hip_nonce, self.hiu_keys[1], self.hiu_nonce)
+
+    def test_derived_key_used_once_checked(self):
+        fidelius_probe = self.hiu_session.encrypt(FideliusSession.probe)
+        session = self._hip_session()
+        with patch.object(FideliusSession, '_fidelius_encrypt', return_value=fidelius_probe) as fidelius_encrypt, \
+                patch('abdm_integrator.crypto.curve25519_shared_secret', wraps=curve25519_shared_secret) as derive:
+            encrypted_data = [session.encrypt(data) for data in ('first', 'second')]
+            self.assertEqual(pickle.loads(pickle.dumps(session)).decrypt(encrypted_data[0]), 'first')
+        fidelius_encrypt.assert_called_once_with(FideliusSession.probe)
+        self.assertEqual(derive.call_count, 1)
+        self.assertEqual([self.hiu_session.decrypt(data) for data in encrypted_data], ['first', 'second'])
+
+    def test_fidelius_used_if_derived_key_differs(self):
+        session = self._hip_session()
+        with patch.object(FideliusSession, '_fidelius_encrypt', return_value='other') as fidelius_encrypt, \
+                patch.object(FideliusSession, '_fidelius_decrypt', return_value='data') as fidelius_decrypt, \
+                self.assertLogs('abdm_integrator', level='WARNING'):
+            self.assertEqual(session.encrypt('data'), 'other')
+            self.assertEqual(pickle.loads(pickle.dumps(session)).decrypt('other'), 'data')
+        self.assertEqual(fidelius_encrypt.call_count, 2)
+        fidelius_decrypt.assert_called_once_with('other')
+
+    def test_fidelius_used_if_key_not_supported(self):
+        session = FideliusSession(self.hip_keys[0], self.hip_nonce, b64encode(b'invalid').decode(), self.hiu_nonce)
+        with patch.object(FideliusSession, '_fidelius_encrypt', return_value='encrypted') as fidelius_encrypt, \
+                self.assertLogs('abdm_integrator', level='WARNING'):
+            self.assertEqual(session.encrypt('data'), 'encrypted')
+        fidelius_encrypt.assert_called_with('data')
+
+
+class TestCryptographyBackend(SimpleTestCase):
+
+    def test_generate_key_material(self):
+        key_material = CryptographyBackend().generate_key_material()
+        point = b64decode(key_material.public_key)
+        self.assertEqual(len(point), 65)
+        self.assertEqual(b64decode(key_material.x509_public_key), CURVE25519_X509_PREFIX + point)
+        x, y = int.from_bytes(point[1:33], 'big'), int.from_bytes(point[33:], 'big')
+        u = (x - CURVE25519_WEIERSTRASS_SHIFT) % CURVE25519_P
+        self.assertEqual(y * y % CURVE25519_P, (u ** 3 + CURVE25519_A * u * u + u) % CURVE25519_P)
+        scalar = int.from_bytes(b64decode(key_material.private_key), 'big', signed=True)
+        self.assertEqual(curve25519_scalar_mult(scalar, 9), u)
+        self.assertEqual(len(b64decode(key_material.nonce)), 32)
+
+    def test_shared_secret_x25519_same_as_ladder(self):
+        key_material = CryptographyBackend().generate_key_material()
+        _, peer_public_key, _ = _key_pair()
+        scalar = int.from_bytes(b64decode(key_material.private_key), 'big', signed=True)
+        peer_x = int.from_bytes(b64decode(peer_public_key)[1:33], 'big')
+        u = curve25519_scalar_mult(scalar, (peer_x - CURVE25519_WEIERSTRASS_SHIFT) % CURVE25519_P)
+        self.assertEqual(curve25519_shared_secret(key_material.private_key, peer_public_key),
+                         ((u + CURVE25519_WEIERSTRASS_SHIFT) % CURVE25519_P).to_bytes(32, 'big'))
+
+    def test_encrypt_decrypt(self):
+        hip_crypto = ABDMCrypto(use_x509_for_transfer=True, backend=CryptographyBackend())
+        hiu_crypto = ABDMCrypto(backend=CryptographyBackend())
+        encrypted_data = hip_crypto.encrypt('data', hiu_crypto.transfer_material)
+        self.assertEqual(hiu_crypto.decrypt(encrypted_data, hip_crypto.transfer_material), 'data')
+
+    @override_settings(ABDM_INTEGRATOR={'CRYPTO_BACKEND': 'abdm_integrator.crypto.CryptographyBackend'})
+    def test_setting(self):
+        self.assertIsInstance(ABDMCrypto().backend, CryptographyBackend)
+
+
+@skipUnless(FIDELIUS_VECTORS, 'Requires vectors generated by fidelius')
+class TestFideliusVectors(SimpleTestCase):
+    """CryptographyBackend gives the same results as fidelius for the vectors generated by fidelius"""
+
+    def test_public_key(self):
+        for index, vector in enumerate(FIDELIUS_VECTORS):
+            for party in ('sender', 'requester'):
+                with self.subTest(vector=index, party=party):
+                    scalar = int.from_bytes(b64decode(vector[f'{party}_private_key']), 'big', signed=True)
+                    x = (curve25519_scalar_mult(scalar, 9) + CURVE25519_WEIERSTRASS_SHIFT) % CURVE25519_P
+                    point = b64decode(vector[f'{party}_public_key'])
+                    self.assertEqual(point[1:33], x.to_bytes(32, 'big'))
+                    self.assertEqual(b64decode(vector[f'{party}_x509_public_key']), CURVE25519_X509_PREFIX + point)
+
+    def test_encrypt(self):
+        for index, vector in enumerate(FIDELIUS_VECTORS):
+            for public_key, ciphertext in (('requester_public_key', 'ciphertext'),
+                                           ('requester_x509_public_key', 'x509_ciphertext')):
+                with self.subTest(vector=index, public_key=public_key):
+                    session = CryptographyBackend().session(vector['sender_private_key'], vector['sender_nonce'],
+                                                            vector[public_key], vector['requester_nonce'])
+                    self.assertEqual(session.encrypt(vector['plaintext']), vector[ciphertext])
+
+    def test_decrypt(self):
+        for index, vector in enumerate(FIDELIUS_VECTORS):
+            for public_key, ciphertext in itertools.product(('sender_public_key', 'sender_x509_public_key'),
+                                                            ('ciphertext', 'x509_ciphertext')):
+                with self.subTest(vector=index, public_key=public_key, ciphertext=ciphertext):
+                    session = CryptographyBackend().session(vector['requester_private_key'],
+                                                            vector['requester_nonce'], vector[public_key],
+                                                            vector['sender_nonce'])
+                    self.assertEqual(session.decrypt(vector[ciphertext]), vector['plaintext'])
+
+
+def _backends():
+    return [CryptographyBackend(), FideliusBackend()]
+
+
+@skipUnless(FIDELIUS_INSTALLED, 'Requires fidelius')
+class TestCrossBackendCompatibility(SimpleTestCase):
+    """Data encrypted by HIP with each backend can be decrypted by HIU with each backend"""
+
+    def test_encrypt_decrypt(self):
+        data = json.dumps({'resourceType': 'Bundle', 'entry': [{'resource': {'id': '1'}}]})
+        for hip_backend, hiu_backend in itertools.product(_backends(), repeat=2):
+            for use_x509_for_transfer in (True, False):
+                with self.subTest(hip=hip_backend.__class__.__name__, hiu=hiu_backend.__class__.__name__,
+                                  use_x509_for_transfer=use_x509_for_transfer):
+                    hip_crypto = ABDMCrypto(use_x509_for_transfer=use_x509_for_transfer, backend=hip_backend)
+                    hiu_crypto = ABDMCrypto(backend=hiu_backend)
+                    encrypted_data = hip_crypto.encrypt(data, hiu_crypto.transfer_material)
+                    self.assertEqual(hiu_crypto.decrypt(encrypted_data, hip_crypto.transfer_material), data)
+
+    @override_settings(ABDM_INTEGRATOR={'CRYPTO_BACKEND': 'abdm_integrator.crypto.FideliusBackend'})
+    def test_setting(self):
+        self.assertIsInstance(ABDMCrypto().backend, FideliusBackend)
+
+
+@skipUnless(os.environ.get('ABDM_CRYPTO_THROUGHPUT'), 'Set ABDM_CRYPTO_THROUGHPUT environment variable to run')
+class TestCryptoBackendThroughput(SimpleTestCase):
+    """Entries of health data encrypted and decrypted per second by each backend, for a transfer"""
+
+    entries = 200
+    entry_size = 10 * 1024
+
+    def test_throughput(self):
+        backends = _backends() if FIDELIUS_INSTALLED else [CryptographyBackend()]
+        data = [secrets.token_hex(self.entry_size // 2) for _ in range(self.entries)]
+        for backend in backends:
+            with self.subTest(backend=backend.__class__.__name__):
+                hip_crypto = ABDMCrypto(use_x509_for_transfer=True, backend=backend)
+                hiu_crypto = ABDMCrypto(backend=backend)
+                start = time.perf_counter()
+                encrypted_data = [hip_crypto.encrypt(entry, hiu_crypto.transfer_material) for entry in data]
+                encryption_seconds = time.perf_counter() - start
+                start = time.perf_counter()
+                decrypted_data = [hiu_crypto.decrypt(entry, hip_crypto.transfer_material)
+                                  for entry in encrypted_data]
+                decryption_seconds = time.perf_counter() - start
+                self.assertEqual(decrypted_data, data)
+                print(f'\n{backend.__class__.__name__}: {self.entries / encryption_seconds:.0f} entries/s '
+                      f'encrypted, {self.entries / decryption_seconds:.0f} entries/s decrypted '
+                      f'({self.entry_size} bytes each)')
@@ -0,0 +1,87 @@
+from unittest.mock import Mock, patch
+
+import requests
+from django.test import SimpleTestCase, override_settings
+
+from abdm_integrator.const import APIPathGroup
+from abdm_integrator.deadlines import (
+    configured_request_timeout,
+    deadline,
+    remaining_time,
+    request_timeout,
+    within_deadline,
+)
+from abdm_integrator.exceptions import ABDMServiceUnavailable
+from abdm_integrator.utils import ABDMRequestHelper, poll_and_pop_data_from_cache
+
+
+@patch('abdm_integrator.deadlines.time.monotonic', return_value=1000)
+class TestDeadline(SimpleTestCase):
+
+    def test_no_deadline(self, *args):
+        self.assertIsNone(remaining_time())
+        self.assertEqual(within_deadline(60), 60)
+        with deadline(None):
+            self.assertIsNone(remaining_time())
+
+    def test_deadline(self, mocked_monotonic):
+        with deadline(10):
+            self.assertEqual(remaining_time(), 10)
+            self.assertEqual(within_deadline(60), 10)
+            self.assertEqual(within_deadline(5), 5)
+            mocked_monotonic.return_value = 1011
+            self.assertEqual(remaining_time(), 0)
+        self.assertIsNone(remaining_time())
+
+    def test_nested_deadline(self, *args):
+        with deadline(10):
+            with deadline(30):
+                self.assertEqual(remaining_time(), 10)
+            with deadline(5):
+                self.assertEqual(remaining_time(), 5)
+            self.assertEqual(remaining_time(), 10)
+
+
+@override_settings(ABDM_INTEGRATOR={
+    'HTTP_CONNECT_TIMEOUT': 10,
+    'HTTP_READ_TIMEOUT': 60,
+    'HTTP_TIMEOUTS': {APIPathGroup.ABHA: {'read': 30}},
+})
+@patch('abdm_integrator.deadlines.time.monotonic', return_value=1000)
+class TestRequestTimeout(SimpleTestCase):
+
+    def test_request_timeout(self, *args):
+        self.assertEqual(request_timeout(APIPathGroup.CONSENTS), (10, 60))
+        self.assertEqual(request_timeout(APIPathGroup.ABHA), (10, 30))
+        self.assertEqual(request_timeout(APIPathGroup.ABHA, 20), (10, 20))
+
+    def test_request_timeout_within_deadline(self, mocked_monotonic):
+        with deadline(15):
+            self.assertEqual(request_timeout(APIPathGroup.CONSENTS), (10, 15))
+            mocked_monotonic.return_value = 1008
+            self.assertEqual(request_timeout(APIPathGroup.CONSENTS), (7, 7))
+            self.assertEqual(configured_request_timeout(APIPathGroup.CONSENTS), (10, 60))
+            mocked_monotonic.return_value = 1015
+            with self.assertRaises(requests.Timeout):
+                request_timeout(APIPathGroup.CONSENTS)
+
+    @patch('abdm_integrator.utils.ABDMRequestHelper.get_access_token')
+    @patch('abdm_integrator.utils.http_sessions.post')
+    def test_gateway_post(self, mocked_post, mocked_get_access_token, mocked_monotonic):
+        response = requests.Response()
+        response.status_code = 200
+        response.json = Mock(return_value={})
+        mocked_post.return_value = response
+        with deadline(15):
+            ABDMRequestHelper().gateway_post('/v0.5/consents/fetch', {})
+            self.assertEqual(mocked_post.call_args.kwargs['timeout'], (10, 15))
+            mocked_monotonic.return_value = 1015
+            with self.assertRaises(ABDMServiceUnavailable):
+                ABDMRequestHelper().gateway_post('/v0.5/consents/fetch', {})
+        self.assertEqual(mocked_post.call_count, 1)
+
+    @patch('abdm_integrator.callbacks.wait_for_callback_response')
+    def test_poll_within_deadline(self, mocked_wait, *args):
+        with deadline(15):
+            poll_and_pop_data_from_cache('key')
+        mocked_wait.assert_called_once_with('key', 15, 2)
@@ -0,0 +1,39 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+
+from abdm_integrator.http_sessions import HTTPSessionPool
+
+
+class TestHTTPSessionPool(SimpleTestCase):
+
+    def setUp(self):
+        HTTPSessionPool.close()
+
+    def tearDown(self):
+        HTTPSessionPool.close()
+
+    def test_session_reused_for_same_base_url(self):
+        session = HTTPSessionPool.get_session('https://dev.abdm.gov.in/gateway/v0.5/sessions')
+        self.assertIs(HTTPSessionPool.get_session('https://DEV.abdm.gov.in/gateway/v0.5/certs'), session)
+
+    def test_separate_session_for_different_base_url(self):
+        session = HTTPSessionPool.get_session('https://dev.abdm.gov.in/gateway/v0.5/sessions')
+        self.assertIsNot(HTTPSessionPool.get_session('https://healthidsbx.abdm.gov.in/api/v1/search'), session)
+
+    def test_sessions_discarded_after_fork(self):
+        session = HTTPSessionPool.get_session('https://dev.abdm.gov.in/gateway')
+        with patch('abdm_integrator.http_sessions.os.getpid', return_value=HTTPSessionPool._pid + 1):
+            self.assertIsNot(HTTPSessionPool.get_session('https://dev.abdm.gov.in/gateway'), session)
+
+    @override_settings(ABDM_INTEGRATOR={
+        'HTTP_POOL_MAXSIZE': 25,
+        'HTTP_POOL_BLOCK': True,
+        'HTTP_KEEP_ALIVE': False,
+    })
+    def test_session_configured_from_settings(self):
+        session = HTTPSessionPool.get_session('https://dev.abdm.gov.in/gateway')
+        adapter = session.get_adapter('https://dev.abdm.gov.in/gateway')
+        self.assertEqual(adapter._pool_maxsize, 25)
+        self.assertTrue(adapter._pool_block)
+        self.assertEqual(session.headers['Connection'], 'close')
@@ -0,0 +1,181 @@
+import json
+import logging
+from unittest import skipUnless
+from unittest.mock import Mock, patch
+
+import requests
+from django.test import SimpleTestCase, override_settings
+
+from abdm_integrator.const import APIPathGroup
+from abdm_integrator.exceptions import ABDMServiceUnavailable
+from abdm_integrator.instrumentation import (
+    CircuitBreakerEvent,
+    DuplicateCallbackEvent,
+    HealthInformationTimingsEvent,
+    OutboundRequestEvent,
+    PrometheusCollector,
+    emit_event,
+    outbound_request_sent,
+    send_instrumented,
+)
+from abdm_integrator.utils import ABDMRequestHelper
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+
+class EventsCollector:
+    events = []
+
+    def collect(self, event):
+        self.events.append(event)
+
+
+class FailingCollector:
+
+    def collect(self, event):
+        raise ValueError('Collector error')
+
+
+def _mock_response(status_code=200, json_response=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(json_response or {}).encode()
+    response.headers = {'content-type': 'application/json'}
+    return response
+
+
+@override_settings(ABDM_INTEGRATOR={
+    'OUTBOUND_REQUEST_COLLECTORS': ['abdm_integrator.tests.test_instrumentation.EventsCollector'],
+})
+class TestSendInstrumented(SimpleTestCase):
+
+    def setUp(self):
+        EventsCollector.events = []
+
+    @patch('abdm_integrator.utils.ABDMRequestHelper.get_access_token', side_effect=['token_1', 'token_2'])
+    @patch('abdm_integrator.utils.http_sessions.post')
+    def test_gateway_post(self, mocked_post, *args):
+        mocked_post.__name__ = 'post'
+        mocked_post.side_effect = [_mock_response(status_code=401), _mock_response(json_response={'a': 1})]
+        payload = {'requestId': 'request_1'}
+        ABDMRequestHelper().gateway_post('/v0.5/consents/fetch', payload)
+        self.assertEqual(len(EventsCollector.events), 2)
+        first_event, second_event = EventsCollector.events
+        self.assertEqual(first_event.status, 401)
+        self.assertEqual(first_event.retry, 0)
+        self.assertEqual(second_event.path_group, APIPathGroup.CONSENTS)
+        self.assertEqual(second_event.method, 'POST')
+        self.assertEqual(second_event.path, '/v0.5/consents/fetch')
+        self.assertEqual(second_event.status, 200)
+        self.assertIsNone(second_event.error)
+        self.assertEqual(second_event.bytes_sent, len(json.dumps(payload)))
+        self.assertEqual(second_event.bytes_received, len(b'{"a": 1}'))
+        self.assertEqual(second_event.retry, 1)
+        self.assertEqual(second_event.request_id, 'request_1')
+
+    @patch('abdm_integrator.utils.ABDMRequestHelper.get_access_token')
+    @patch('abdm_integrator.utils.http_sessions.post', side_effect=requests.Timeout)
+    def test_gateway_post_timeout(self, *args):
+        with self.assertRaises(ABDMServiceUnavailable):
+            ABDMRequestHelper().gateway_post('/v0.5/links/link/add-contexts', {})
+        event = EventsCollector.events[0]
+        self.assertEqual(event.path_group, APIPathGroup.LINKS)
+        self.assertIsNone(event.status)
+        self.assertEqual(event.error, 'Timeout')
+        self.assertEqual(event.outcome, 'Timeout')
+        self.assertIsNone(event.bytes_received)
+
+    @override_settings(ABDM_INTEGRATOR={
+        'OUTBOUND_REQUEST_COLLECTORS': ['abdm_integrator.tests.test_instrumentation.FailingCollector'],
+    })
+    def test_collector_error_not_raised(self):
+        send = Mock(return_value=_mock_response())
+        with self.assertLogs('abdm_integrator', level=logging.ERROR):
+            resp = send_instrumented(send, APIPathGroup.DEFAULT, url='https://example.com/api')
+        self.assertEqual(resp.status_code, 200)
+
+    @override_settings(ABDM_INTEGRATOR={'OUTBOUND_REQUEST_COLLECTORS': []})
+    def test_signal(self):
+        events = []
+
+        def receiver(sender, event, **kwargs):
+            events.append(event)
+
+        outbound_request_sent.connect(receiver)
+        self.addCleanup(outbound_request_sent.disconnect, receiver)
+        send_instrumented(Mock(return_value=_mock_response()), APIPathGroup.DEFAULT, url='https://example.com/api')
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0].base_url, 'https://example.com')
+        self.assertEqual(events[0].path, '/api')
+
+    @override_settings(ABDM_INTEGRATOR={
+        'OUTBOUND_REQUEST_COLLECTORS': ['abdm_integrator.instrumentation.LoggingCollector'],
+    })
+    def test_logging_collector(self):
+        with self.assertLogs('abdm_integrator', level=logging.INFO) as logs:
+            send_instrumented(Mock(return_value=_mock_response()), APIPathGroup.DEFAULT,
+                              url='https://example.com/api')
+        self.assertIn('group=default', logs.output[0])
+        self.assertIn('outcome=200', logs.output[0])
+
+    def test_emit_event(self):
+        event = DuplicateCallbackEvent(callback_name='test', callback_id='callback_1')
+        emit_event(event)
+        self.assertEqual(EventsCollector.events, [event])
+
+    @override_settings(ABDM_INTEGRATOR={
+        'OUTBOUND_REQUEST_COLLECTORS': ['abdm_integrator.tests.test_instrumentation.FailingCollector'],
+    })
+    def test_emit_event_collector_error(self):
+        with self.assertLogs('abdm_integrator', level=logging.ERROR):
+            emit_event(DuplicateCallbackEvent(callback_name='test', callback_id='callback_1'))
+
+
+@skipUnless(prometheus_client, 'Requires prometheus_client')
+class TestPrometheusCollector(SimpleTestCase):
+
+    def test_collect(self):
+        registry = prometheus_client.CollectorRegistry()
+        collector = PrometheusCollector(registry=registry)
+        event = OutboundRequestEvent(
+            path_group=APIPathGroup.CONSENTS, method='POST', base_url='https://dev.abdm.gov.in',
+            path='/gateway/v0.5/consents/fetch', status=202, error=None, bytes_sent=100, bytes_received=0,
+            elapsed=0.2, duration=0.25, retry=0, request_id='request_1'
+        )
+        collector.collect(event)
+        collector.collect(event)
+        labels = {'path_group': APIPathGroup.CONSENTS, 'method': 'POST'}
+        self.assertEqual(
+            registry.get_sample_value('abdm_outbound_requests_total', {**labels, 'outcome': '202'}), 2
+        )
+        self.assertEqual(registry.get_sample_value('abdm_outbound_request_duration_seconds_count', labels), 2)
+        self.assertEqual(registry.get_sample_value('abdm_outbound_request_sent_bytes_total', labels), 200)
+
+    def test_collect_duplicate_callback(self):
+        registry = prometheus_client.CollectorRegistry()
+        collector = PrometheusCollector(registry=registry)
+        collector.collect(DuplicateCallbackEvent(callback_name='hip_consent_notify', callback_id='callback_1'))
+        self.assertEqual(
+            registry.get_sample_value('abdm_duplicate_callbacks_total', {'callback_name': 'hip_consent_notify'}), 1
+        )
+
+    def test_collect_circuit_breaker_event(self):
+        registry = prometheus_client.CollectorRegistry()
+        collector = PrometheusCollector(registry=registry)
+        collector.collect(CircuitBreakerEvent(circuit='https://dev.abdm.gov.in_consents', event='opened'))
+        self.assertEqual(registry.get_sample_value(
+            'abdm_circuit_breaker_events_total', {'circuit': 'https://dev.abdm.gov.in_consents', 'event': 'opened'}
+        ), 1)
+
+    def test_collect_health_information_timings(self):
+        registry = prometheus_client.CollectorRegistry()
+        collector = PrometheusCollector(registry=registry)
+        collector.collect(HealthInformationTimingsEvent(transaction_id='1', page_number=1, timings={'push': 1.5}))
+        collector.collect(HealthInformationTimingsEvent(transaction_id='1', page_number=None,
+                                                        timings={'push': 1.5, 'notify': 0.5}))
+        sample_name = 'abdm_hip_health_information_stage_seconds_total'
+        self.assertEqual(registry.get_sample_value(sample_name, {'stage': 'push'}), 1.5)
+        self.assertEqual(registry.get_sample_value(sample_name, {'stage': 'notify'}), 0.5)
@@ -0,0 +1,124 @@
+import uuid
+from unittest.mock import Mock, patch
+
+import requests
+from django.test import SimpleTestCase, override_settings
+
+from abdm_integrator.const import APIPathGroup
+from abdm_integrator.exceptions import ABDMServiceUnavailable
+from abdm_integrator.rate_limits import CacheRateLimiter, InProcessRateLimiter, acquire_rate_limit
+from abdm_integrator.utils import ABDMCache, ABDMRequestHelper, gateway_path_group
+
+
+class TestCacheRateLimiter(SimpleTestCase):
+
+    @patch('abdm_integrator.rate_limits.time.time')
+    def test_acquire(self, mocked_time):
+        group = str(uuid.uuid4())
+        rate_limiter = CacheRateLimiter()
+        mocked_time.return_value = 1000.25
+        self.assertEqual(rate_limiter.acquire(group, 2, 1), 0)
+        self.assertEqual(rate_limiter.acquire(group, 2, 1), 0)
+        self.assertEqual(rate_limiter.acquire(group, 2, 1), 0.5)
+        self.assertEqual(rate_limiter.acquire(str(uuid.uuid4()), 2, 1), 0)
+        # Budget is refilled continuously
+        mocked_time.return_value = 1000.75
+        self.assertEqual(rate_limiter.acquire(group, 2, 1), 0)
+        self.assertEqual(rate_limiter.acquire(group, 2, 1), 0.5)
+
+    @patch('abdm_integrator.rate_limits.time.time')
+    def test_no_burst_across_period_boundary(self, mocked_time):
+        group = str(uuid.uuid4())
+        rate_limiter = CacheRateLimiter()
+        mocked_time.return_value = 1000.9
+        self.assertEqual([rate_limiter.acquire(group, 10, 1) for _ in range(10)], [0] * 10)
+        # Only the tokens refilled since are available at the start of the next period
+        mocked_time.return_value = 1001.1
+        results = [rate_limiter.acquire(group, 10, 1) for _ in range(10)]
+        self.assertEqual(results.count(0), 2)
+        # Blocked requests wait for the next token instead of the end of the period
+        self.assertAlmostEqual(results[2], 0.1)
+
+    @patch('abdm_integrator.rate_limits.time.sleep')
+    def test_acquire_waits_for_lock(self, mocked_sleep):
+        group = str(uuid.uuid4())
+        lock_key = f'rate_limit_{group}_lock'
+        ABDMCache.set(lock_key, 'other', 10)
+        mocked_sleep.side_effect = lambda seconds: ABDMCache.delete(lock_key)
+        self.assertEqual(CacheRateLimiter().acquire(group, 2, 1), 0)
+        mocked_sleep.assert_called_once_with(CacheRateLimiter.lock_retry_interval)
+        self.assertIsNone(ABDMCache.get(lock_key))
+
+
+class TestInProcessRateLimiter(SimpleTestCase):
+
+    @patch('abdm_integrator.rate_limits.time.monotonic')
+    def test_acquire(self, mocked_monotonic):
+        rate_limiter = InProcessRateLimiter()
+        mocked_monotonic.return_value = 1000
+        self.assertEqual(rate_limiter.acquire('consents', 2, 1), 0)
+        self.assertEqual(rate_limiter.acquire('consents', 2, 1), 0)
+        self.assertEqual(rate_limiter.acquire('consents', 2, 1), 0.5)
+        self.assertEqual(rate_limiter.acquire('links', 2, 1), 0)
+        mocked_monotonic.return_value = 1000.5
+        self.assertEqual(rate_limiter.acquire('consents', 2, 1), 0)
+        self.assertEqual(rate_limiter.acquire('consents', 2, 1), 0.5)
+
+
+@override_settings(ABDM_INTEGRATOR={
+    'RATE_LIMITS': {APIPathGroup.CONSENTS: {'requests': 1, 'period': 1}},
+    'RATE_LIMITER': 'abdm_integrator.rate_limits.InProcessRateLimiter',
+    'RATE_LIMIT_MAX_WAIT': 0,
+})
+class TestAcquireRateLimit(SimpleTestCase):
+
+    def setUp(self):
+        # Uses a new in-process rate limiter for each test
+        rate_limiter_patch = patch('abdm_integrator.rate_limits._rate_limiter', None)
+        rate_limiter_patch.start()
+        self.addCleanup(rate_limiter_patch.stop)
+
+    def test_fail_fast(self):
+        acquire_rate_limit(APIPathGroup.CONSENTS)
+        with self.assertRaises(ABDMServiceUnavailable):
+            acquire_rate_limit(APIPathGroup.CONSENTS)
+
+    def test_group_not_limited(self):
+        for _ in range(5):
+            acquire_rate_limit(APIPathGroup.LINKS)
+
+    @override_settings(ABDM_INTEGRATOR={
+        'RATE_LIMITS': {APIPathGroup.CONSENTS: {'requests': 1, 'period': 1}},
+        'RATE_LIMITER': 'abdm_integrator.rate_limits.InProcessRateLimiter',
+        'RATE_LIMIT_MAX_WAIT': 5,
+    })
+    @patch('abdm_integrator.rate_limits.time.sleep')
+    def test_wait(self, mocked_sleep):
+        acquire_rate_limit(APIPathGroup.CONSENTS)
+        with patch('abdm_integrator.rate_limits.InProcessRateLimiter.acquire', side_effect=[0.4, 0]):
+            acquire_rate_limit(APIPathGroup.CONSENTS)
+        mocked_sleep.assert_called_once_with(0.4)
+
+    @patch('abdm_integrator.utils.ABDMRequestHelper.get_access_token')
+    @patch('abdm_integrator.utils.http_sessions.post')
+    def test_gateway_post_rate_limited(self, mocked_post, *args):
+        response = requests.Response()
+        response.status_code = 200
+        response.json = Mock(return_value={})
+        mocked_post.return_value = response
+        ABDMRequestHelper().gateway_post('/v0.5/consents/fetch', {})
+        with self.assertRaises(ABDMServiceUnavailable):
+            ABDMRequestHelper().gateway_post('/v0.5/consent-requests/init', {})
+        ABDMRequestHelper().gateway_post('/v0.5/links/link/add-contexts', {})
+        self.assertEqual(mocked_post.call_count, 2)
+
+
+class TestGatewayPathGroup(SimpleTestCase):
+
+    def test_gateway_path_group(self):
+        self.assertEqual(gateway_path_group('/v0.5/sessions'), APIPathGroup.SESSIONS)
+        self.assertEqual(gateway_path_group('/v0.5/consents/hip/on-notify'), APIPathGroup.CONSENTS)
+        self.assertEqual(gateway_path_group('/v0.5/consent-requests/init'), APIPathGroup.CONSENTS)
+        self.assertEqual(gateway_path_group('/v0.5/health-information/notify'), APIPathGroup.HEALTH_INFORMATION)
+        self.assertEqual(gateway_path_group('/v0.5/care-contexts/on-discover'), APIPathGroup.LINKS)
+        self.assertEqual(gateway_path_group('/v0.5/users/auth/init'), APIPathGroup.DEFAULT)
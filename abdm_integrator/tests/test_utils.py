@@ -1,17 +1,23 @@
+import time
 from datetime import datetime
 from unittest.mock import Mock, patch
 
+import jwt
 import requests
+from cryptography.hazmat.primitives.asymmetric import rsa
 from django.test import SimpleTestCase
 
 from abdm_integrator.exceptions import ABDMGatewayError
 from abdm_integrator.utils import (
+    ABDMAccessTokenManager,
     ABDMCache,
     ABDMRequestHelper,
+    GatewayJWKSVerifier,
     abdm_iso_to_datetime,
     datetime_to_abdm_iso,
     poll_and_pop_data_from_cache,
     removes_prefix_for_abdm_mobile,
+    validate_jwt_access_token,
 )
 
 
@@ -21,6 +27,12 @@ class TestABDMRequestHelper(SimpleTestCase):
     def setUpClass(cls):
         cls.sample_success_json = {'test': '1001'}
 
+    def setUp(self):
+        ABDMAccessTokenManager.clear()
+
+    def tearDown(self):
+        ABDMAccessTokenManager.clear()
+
     @staticmethod
     def _mock_response(status_code=200, json_response=None):
         mock_response = requests.Response()
@@ -28,48 +40,110 @@ class TestABDMRequestHelper(SimpleTestCase):
         mock_response.json = Mock(return_value=json_response)
         return mock_response
 
-    @patch('abdm_integrator.utils.requests.post')
+    @staticmethod
+    def _access_token(expires_in=1200):
+        return jwt.encode({'exp': int(time.time()) + expires_in, 'jti': time.monotonic_ns()}, 'secret')
+
+    @patch('abdm_integrator.utils.http_sessions.post')
     def test_get_access_token_success(self, mocked_post):
         mocked_post.return_value = self._mock_response(json_response={'accessToken': 'test'})
         token = ABDMRequestHelper().get_access_token()
         self.assertEqual(token, 'test')
 
-    @patch('abdm_integrator.utils.requests.post')
+    @patch('abdm_integrator.utils.http_sessions.post')
     def test_get_access_token_failure(self, mocked_post):
         mocked_post.return_value = self._mock_response(status_code=400)
         with self.assertRaises(ABDMGatewayError):
             ABDMRequestHelper().get_access_token()
 
+    @patch('abdm_integrator.utils.http_sessions.post')
+    def test_get_access_token_cached(self, mocked_post):
+        access_token = self._access_token()
+        mocked_post.return_value = self._mock_response(json_response={'accessToken': access_token})
+        self.assertEqual(ABDMRequestHelper().get_access_token(), access_token)
+        self.assertEqual(ABDMRequestHelper().get_access_token(), access_token)
+        self.assertEqual(mocked_post.call_count, 1)
+
+    @patch('abdm_integrator.utils.http_sessions.post')
+    def test_get_access_token_cached_using_expires_in(self, mocked_post):
+        mocked_post.return_value = self._mock_response(json_response={'accessToken': 'test', 'expiresIn': 1200})
+        ABDMRequestHelper().get_access_token()
+        ABDMRequestHelper().get_access_token()
+        self.assertEqual(mocked_post.call_count, 1)
+
+    @patch('abdm_integrator.utils.http_sessions.post')
+    def test_get_access_token_refreshed_near_expiry(self, mocked_post):
+        mocked_post.side_effect = [
+            self._mock_response(json_response={'accessToken': self._access_token(expires_in=30)}),
+            self._mock_response(json_response={'accessToken': self._access_token()}),
+        ]
+        first_token = ABDMRequestHelper().get_access_token()
+        second_token = ABDMRequestHelper().get_access_token()
+        self.assertNotEqual(first_token, second_token)
+        self.assertEqual(mocked_post.call_count, 2)
+
+    @patch('abdm_integrator.utils.http_sessions.post')
+    def test_get_access_token_invalid_token_refreshed(self, mocked_post):
+        mocked_post.side_effect = [
+            self._mock_response(json_response={'accessToken': self._access_token()}),
+            self._mock_response(json_response={'accessToken': self._access_token()}),
+        ]
+        first_token = ABDMRequestHelper().get_access_token()
+        second_token = ABDMRequestHelper().get_access_token(invalid_token=first_token)
+        self.assertNotEqual(first_token, second_token)
+        self.assertEqual(ABDMRequestHelper().get_access_token(), second_token)
+        self.assertEqual(mocked_post.call_count, 2)
+
+    @patch('abdm_integrator.utils.ABDMRequestHelper.get_access_token', side_effect=['token_1', 'token_2'])
+    @patch('abdm_integrator.utils.http_sessions.post')
+    def test_gateway_post_retries_on_unauthorized(self, mocked_post, mocked_get_access_token):
+        success_response = self._mock_response(json_response=self.sample_success_json)
+        success_response.headers = {'content-type': 'application/json'}
+        mocked_post.side_effect = [self._mock_response(status_code=401), success_response]
+        actual_json_resp = ABDMRequestHelper().gateway_post(api_path='', payload={})
+        self.assertEqual(actual_json_resp, self.sample_success_json)
+        mocked_get_access_token.assert_called_with(invalid_token='token_1')
+        self.assertEqual(mocked_post.call_args.kwargs['headers']['Authorization'], 'Bearer token_2')
+
+    @patch('abdm_integrator.utils.ABDMRequestHelper.get_access_token', side_effect=['token_1', 'token_2'])
+    @patch('abdm_integrator.utils.http_sessions.get')
+    def test_abha_get_with_user_token_not_retried_on_unauthorized(self, mocked_get, mocked_get_access_token):
+        mocked_get.return_value = self._mock_response(status_code=401, json_response={})
+        with self.assertRaises(ABDMGatewayError):
+            ABDMRequestHelper().abha_get(api_path='', additional_headers={'X-Token': 'Bearer user_token'})
+        self.assertEqual(mocked_get.call_count, 1)
+        mocked_get_access_token.assert_called_once_with()
+
     @patch('abdm_integrator.utils.ABDMRequestHelper.get_access_token')
-    @patch('abdm_integrator.utils.requests.get')
+    @patch('abdm_integrator.utils.http_sessions.get')
     def test_abha_get_success(self, mocked_get, *args):
         mocked_get.return_value = self._mock_response(json_response=self.sample_success_json)
         actual_json_resp = ABDMRequestHelper().abha_get(api_path='')
         self.assertEqual(actual_json_resp, self.sample_success_json)
 
     @patch('abdm_integrator.utils.ABDMRequestHelper.get_access_token')
-    @patch('abdm_integrator.utils.requests.get')
+    @patch('abdm_integrator.utils.http_sessions.get')
     def test_abha_get_failure(self, mocked_get,  *args):
         mocked_get.return_value = self._mock_response(status_code=400)
         with self.assertRaises(ABDMGatewayError):
             ABDMRequestHelper().abha_get(api_path='')
 
     @patch('abdm_integrator.utils.ABDMRequestHelper.get_access_token')
-    @patch('abdm_integrator.utils.requests.post')
+    @patch('abdm_integrator.utils.http_sessions.post')
     def test_abha_post_success(self, mocked_post, *args):
         mocked_post.return_value = self._mock_response(json_response=self.sample_success_json)
         actual_json_resp = ABDMRequestHelper().abha_post(api_path='', payload={})
         self.assertEqual(actual_json_resp, self.sample_success_json)
 
     @patch('abdm_integrator.utils.ABDMRequestHelper.get_access_token')
-    @patch('abdm_integrator.utils.requests.post')
+    @patch('abdm_integrator.utils.http_sessions.post')
     def test_abha_post_failure(self, mocked_post, *args):
         mocked_post.return_value = self._mock_response(status_code=400)
         with self.assertRaises(ABDMGatewayError):
             ABDMRequestHelper().abha_post(api_path='', payload={})
 
     @patch('abdm_integrator.utils.ABDMRequestHelper.get_access_token')
-    @patch('abdm_integrator.utils.requests.post')
+    @patch('abdm_integrator.utils.http_sessions.post')
     def test_gateway_post_success(self, mocked_post, *args):
         mock_response = self._mock_response(json_response=self.sample_success_json)
         mock_response.headers = {'content-type': 'application/json'}
@@ -78,13 +152,104 @@ class TestABDMRequestHelper(SimpleTestCase):
         self.assertEqual(actual_json_resp, self.sample_success_json)
 
     @patch('abdm_integrator.utils.ABDMRequestHelper.get_access_token')
-    @patch('abdm_integrator.utils.requests.post')
+    @patch('abdm_integrator.utils.http_sessions.post')
+    def test_gateway_post_timeout_from_settings(self, mocked_post, *args):
+        mocked_post.return_value = self._mock_response()
+        ABDMRequestHelper().gateway_post(api_path='', payload={})
+        self.assertEqual(mocked_post.call_args.kwargs['timeout'], (10, 60))
+
+    @patch('abdm_integrator.utils.ABDMRequestHelper.get_access_token')
+    @patch('abdm_integrator.utils.http_sessions.post')
+    def test_gateway_post_deprecated_default_timeout(self, mocked_post, *args):
+        mocked_post.return_value = self._mock_response()
+
+        class RequestHelper(ABDMRequestHelper):
+            default_timeout = 30
+
+        RequestHelper().gateway_post(api_path='', payload={})
+        self.assertEqual(mocked_post.call_args.kwargs['timeout'], (10, 30))
+        RequestHelper().gateway_post(api_path='', payload={}, timeout=20)
+        self.assertEqual(mocked_post.call_args.kwargs['timeout'], (10, 20))
+
+    @patch('abdm_integrator.utils.ABDMRequestHelper.get_access_token')
+    @patch('abdm_integrator.utils.http_sessions.post')
     def test_gateway_post_failure(self, mocked_post, *args):
         mocked_post.return_value = self._mock_response(status_code=400)
         with self.assertRaises(ABDMGatewayError):
             ABDMRequestHelper().gateway_post(api_path='', payload={})
 
 
+class TestGatewayJWKSVerifier(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        jwk = jwt.algorithms.RSAAlgorithm.to_jwk(cls.private_key.public_key(), as_dict=True)
+        jwk.update({'kid': 'test_kid', 'alg': 'RS256'})
+        cls.jwks_cert = {'keys': [jwk]}
+
+    def setUp(self):
+        GatewayJWKSVerifier.clear()
+        ABDMCache.delete('JWKS_CERT')
+
+    def tearDown(self):
+        GatewayJWKSVerifier.clear()
+        ABDMCache.delete('JWKS_CERT')
+
+    def _token(self, kid='test_kid', **claims):
+        claims.setdefault('exp', int(time.time()) + 600)
+        return jwt.encode(claims, self.private_key, algorithm='RS256', headers={'kid': kid})
+
+    @patch('abdm_integrator.utils.fetch_gateway_jwks_cert')
+    def test_keys_fetched_once(self, mocked_fetch):
+        mocked_fetch.return_value = self.jwks_cert
+        self.assertEqual(validate_jwt_access_token(self._token(sub='1'))['sub'], '1')
+        self.assertEqual(validate_jwt_access_token(self._token(sub='2'))['sub'], '2')
+        self.assertEqual(mocked_fetch.call_count, 1)
+
+    @patch('abdm_integrator.utils.jwt.decode', wraps=jwt.decode)
+    @patch('abdm_integrator.utils.fetch_gateway_jwks_cert')
+    def test_verified_token_cached(self, mocked_fetch, mocked_decode):
+        mocked_fetch.return_value = self.jwks_cert
+        token = self._token()
+        validate_jwt_access_token(token)
+        validate_jwt_access_token(token)
+        self.assertEqual(mocked_decode.call_count, 1)
+
+    @patch('abdm_integrator.utils.fetch_gateway_jwks_cert')
+    def test_invalid_signature(self, mocked_fetch):
+        mocked_fetch.return_value = self.jwks_cert
+        other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        token = jwt.encode({'sub': '1'}, other_key, algorithm='RS256', headers={'kid': 'test_kid'})
+        with self.assertRaises(jwt.exceptions.InvalidSignatureError):
+            validate_jwt_access_token(token)
+
+    @patch('abdm_integrator.utils.fetch_gateway_jwks_cert')
+    def test_expired_token(self, mocked_fetch):
+        mocked_fetch.return_value = self.jwks_cert
+        with self.assertRaises(jwt.exceptions.ExpiredSignatureError):
+            validate_jwt_access_token(self._token(exp=int(time.time()) - 600))
+
+    @patch('abdm_integrator.utils.fetch_gateway_jwks_cert')
+    def test_unknown_kid_refetched_once(self, mocked_fetch):
+        mocked_fetch.return_value = self.jwks_cert
+        validate_jwt_access_token(self._token())
+        for _ in range(3):
+            with self.assertRaises(jwt.exceptions.InvalidTokenError):
+                validate_jwt_access_token(self._token(kid='unknown_kid'))
+        self.assertEqual(mocked_fetch.call_count, 2)
+
+    @patch('abdm_integrator.utils.fetch_gateway_jwks_cert')
+    def test_rotated_key_loaded_on_unknown_kid(self, mocked_fetch):
+        mocked_fetch.return_value = self.jwks_cert
+        validate_jwt_access_token(self._token())
+        rotated_key = dict(self.jwks_cert['keys'][0], kid='rotated_kid')
+        mocked_fetch.return_value = {'keys': [rotated_key]}
+        self.assertEqual(validate_jwt_access_token(self._token(kid='rotated_kid', sub='1'))['sub'], '1')
+        self.assertEqual(mocked_fetch.call_count, 2)
+
+
 class TestUtils(SimpleTestCase):
 
     def test_poll_data_present_in_cache(self):
@@ -4,11 +4,12 @@ from datetime import datetime
 from unittest.mock import patch
 
 import requests
+from asgiref.sync import async_to_sync
 from django.contrib.auth.models import User
 from rest_framework.authtoken.models import Token
 from rest_framework.reverse import reverse
 from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
-from rest_framework.test import APIClient, APITestCase
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase, force_authenticate
 
 from abdm_integrator.exceptions import (
     ERROR_CODE_INVALID_CHOICE,
@@ -19,6 +20,7 @@ from abdm_integrator.exceptions import (
 )
 from abdm_integrator.tests.utils import APITestHelperMixin
 from abdm_integrator.user_auth.exceptions import UserAuthError
+from abdm_integrator.user_auth.views import AsyncAuthInit
 from abdm_integrator.utils import ABDMCache
 
 
@@ -129,12 +131,12 @@ class TestUserAuthAPI(APITestCase, APITestHelperMixin):
                                   ERROR_CODE_INVALID_CHOICE_MESSAGE.format(request_data['purpose']),
                                   'purpose')
 
-    @patch('abdm_integrator.utils.requests.post')
+    @patch('abdm_integrator.utils.http_sessions.post')
     def test_fetch_auth_modes_gateway_error(self, mocked_post, *args):
         self.gateway_error_test(mocked_post, self.fetch_auth_modes_url,
                                 self._fetch_auth_modes_sample_request_data())
 
-    @patch('abdm_integrator.utils.requests.post', side_effect=requests.Timeout)
+    @patch('abdm_integrator.utils.http_sessions.post', side_effect=requests.Timeout)
     def test_fetch_auth_modes_service_unavailable_error(self, *args):
         client = APIClient(raise_request_exception=False)
         client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
@@ -166,6 +168,21 @@ class TestUserAuthAPI(APITestCase, APITestHelperMixin):
         self.assertEqual(res.status_code, HTTP_200_OK)
         self.assertEqual(res.json(), callback_response['auth'])
 
+    @patch('abdm_integrator.user_auth.views.ABDMRequestHelper.gateway_post', return_value={})
+    @patch('abdm_integrator.user_auth.views.ABDMRequestHelper.common_request_data')
+    def test_async_auth_init_success(self, mocked_common_request_data, *args):
+        mocked_common_request_data.return_value = {'requestId': str(uuid.uuid4()),
+                                                   'timestamp': datetime.utcnow().isoformat()}
+        callback_response = {'auth': {'transactionId': str(uuid.uuid4()), 'mode': 'MOBILE_OTP', 'meta': None}}
+        self._mock_callback_response_with_cache(mocked_common_request_data.return_value['requestId'],
+                                                callback_response)
+        request = APIRequestFactory().post(self.auth_init_url, data=self._auth_init_sample_request_data(),
+                                           format='json')
+        force_authenticate(request, user=self.user)
+        res = async_to_sync(AsyncAuthInit.as_view())(request)
+        self.assertEqual(res.status_code, HTTP_200_OK)
+        self.assertEqual(res.data, callback_response['auth'])
+
     def test_auth_init_authentication_error(self, *args):
         client = APIClient()
         request_data = self._auth_init_sample_request_data()
@@ -186,11 +203,11 @@ class TestUserAuthAPI(APITestCase, APITestHelperMixin):
         self.assert_error_details(json_res['error']['details'][0], ERROR_CODE_REQUIRED,
                                   ERROR_CODE_REQUIRED_MESSAGE, 'requester.type')
 
-    @patch('abdm_integrator.utils.requests.post')
+    @patch('abdm_integrator.utils.http_sessions.post')
     def test_auth_init_gateway_error(self, mocked_post, *args):
         self.gateway_error_test(mocked_post, self.auth_init_url, self._auth_init_sample_request_data())
 
-    @patch('abdm_integrator.utils.requests.post', side_effect=requests.Timeout)
+    @patch('abdm_integrator.utils.http_sessions.post', side_effect=requests.Timeout)
     def test_auth_init_service_unavailable_error(self, *args):
         client = APIClient(raise_request_exception=False)
         client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
@@ -238,11 +255,11 @@ class TestUserAuthAPI(APITestCase, APITestHelperMixin):
         self.assert_error_details(json_res['error']['details'][0], ERROR_CODE_REQUIRED,
                                   ERROR_CODE_REQUIRED_MESSAGE, 'transactionId')
 
-    @patch('abdm_integrator.utils.requests.post')
+    @patch('abdm_integrator.utils.http_sessions.post')
     def test_auth_confirm_gateway_error(self, mocked_post, *args):
         self.gateway_error_test(mocked_post, self.auth_confirm_url, self._auth_confirm_sample_request_data())
 
-    @patch('abdm_integrator.utils.requests.post', side_effect=requests.Timeout)
+    @patch('abdm_integrator.utils.http_sessions.post', side_effect=requests.Timeout)
     def test_auth_confirm_service_unavailable_error(self, *args):
         client = APIClient(raise_request_exception=False)
         client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
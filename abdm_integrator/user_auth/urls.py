@@ -1,7 +1,11 @@
 from django.urls import path
 
+from abdm_integrator.async_views import sync_or_async_view
 from abdm_integrator.const import GATEWAY_CALLBACK_URL_PREFIX
 from abdm_integrator.user_auth.views import (
+    AsyncAuthConfirm,
+    AsyncAuthFetchModes,
+    AsyncAuthInit,
     AuthConfirm,
     AuthFetchModes,
     AuthInit,
@@ -11,9 +15,11 @@ from abdm_integrator.user_auth.views import (
 )
 
 user_auth_urls = [
-    path('api/user_auth/fetch_auth_modes', AuthFetchModes.as_view(), name='fetch_auth_modes'),
-    path('api/user_auth/auth_init', AuthInit.as_view(), name='auth_init'),
-    path('api/user_auth/auth_confirm', AuthConfirm.as_view(), name='auth_confirm'),
+    path('api/user_auth/fetch_auth_modes',
+         sync_or_async_view('fetch_auth_modes', AuthFetchModes, AsyncAuthFetchModes), name='fetch_auth_modes'),
+    path('api/user_auth/auth_init', sync_or_async_view('auth_init', AuthInit, AsyncAuthInit), name='auth_init'),
+    path('api/user_auth/auth_confirm', sync_or_async_view('auth_confirm', AuthConfirm, AsyncAuthConfirm),
+         name='auth_confirm'),
 
     # APIS that will be triggered by ABDM Gateway
     path(f'{GATEWAY_CALLBACK_URL_PREFIX}/users/auth/on-fetch-modes', GatewayAuthOnFetchModes.as_view(),
@@ -3,7 +3,10 @@ from rest_framework.response import Response
 from rest_framework.status import HTTP_200_OK, HTTP_202_ACCEPTED
 from rest_framework.views import APIView
 
+from abdm_integrator.async_views import AsyncAPIViewMixin, run_in_thread
+from abdm_integrator.callbacks import publish_callback_response
 from abdm_integrator.const import CALLBACK_RESPONSE_CACHE_TIMEOUT, AuthenticationMode
+from abdm_integrator.deadlines import RequestDeadlineMixin
 from abdm_integrator.exceptions import ABDMGatewayCallbackTimeout, ABDMGatewayError
 from abdm_integrator.settings import app_settings
 from abdm_integrator.user_auth.const import UserAuthGatewayAPIPath
@@ -20,14 +23,14 @@ from abdm_integrator.user_auth.serializers import (
     GatewayAuthOnInitSerializer,
 )
 from abdm_integrator.utils import (
-    ABDMCache,
     ABDMGatewayAuthentication,
     ABDMRequestHelper,
+    async_poll_and_pop_data_from_cache,
     poll_and_pop_data_from_cache,
 )
 
 
-class UserAuthBaseView(APIView):
+class UserAuthBaseView(RequestDeadlineMixin, APIView):
     authentication_classes = [app_settings.AUTHENTICATION_CLASS]
     permission_classes = [IsAuthenticated]
 
@@ -55,7 +58,9 @@ class UserAuthGatewayBaseView(APIView):
     def post(self, request, format=None):
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
-        ABDMCache.set(serializer.data['resp']['requestId'], serializer.data, CALLBACK_RESPONSE_CACHE_TIMEOUT)
+        publish_callback_response(
+            serializer.data['resp']['requestId'], serializer.data, CALLBACK_RESPONSE_CACHE_TIMEOUT
+        )
         return Response(status=HTTP_202_ACCEPTED)
 
 
@@ -87,6 +92,17 @@ class AuthFetchModes(UserAuthBaseView):
         return response_data
 
 
+class AsyncAuthFetchModes(AsyncAPIViewMixin, AuthFetchModes):
+
+    async def post(self, request, format=None):
+        serializer = AuthFetchModesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        gateway_request_id = await run_in_thread(self.gateway_auth_fetch_modes, serializer.data)
+        response_data = await async_poll_and_pop_data_from_cache(gateway_request_id)
+        response_data = self.remove_direct_and_password_mode(response_data)
+        return self.generate_response_from_callback(response_data)
+
+
 class GatewayAuthOnFetchModes(UserAuthGatewayBaseView):
     serializer_class = GatewayAuthOnFetchModesSerializer
 
@@ -107,6 +123,16 @@ class AuthInit(UserAuthBaseView):
         return payload['requestId']
 
 
+class AsyncAuthInit(AsyncAPIViewMixin, AuthInit):
+
+    async def post(self, request, format=None):
+        serializer = AuthInitSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        gateway_request_id = await run_in_thread(self.gateway_auth_init, serializer.data)
+        response_data = await async_poll_and_pop_data_from_cache(gateway_request_id)
+        return self.generate_response_from_callback(response_data)
+
+
 class GatewayAuthOnInit(UserAuthGatewayBaseView):
     serializer_class = GatewayAuthOnInitSerializer
 
@@ -128,5 +154,15 @@ class AuthConfirm(UserAuthBaseView):
         return payload['requestId']
 
 
+class AsyncAuthConfirm(AsyncAPIViewMixin, AuthConfirm):
+
+    async def post(self, request, format=None):
+        serializer = AuthConfirmSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        gateway_request_id = await run_in_thread(self.gateway_auth_confirm, serializer.data)
+        response_data = await async_poll_and_pop_data_from_cache(gateway_request_id)
+        return self.generate_response_from_callback(response_data)
+
+
 class GatewayAuthOnConfirm(UserAuthGatewayBaseView):
     serializer_class = GatewayAuthOnConfirmSerializer
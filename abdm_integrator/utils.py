@@ -1,7 +1,9 @@
 import json
 import logging
+import threading
 import time
 import uuid
+from collections import OrderedDict
 from datetime import datetime
 
 import jwt
@@ -13,14 +15,23 @@ from rest_framework import serializers
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.pagination import PageNumberPagination
-
-from abdm_integrator.const import GatewayAPIPath
+from rest_framework.status import HTTP_401_UNAUTHORIZED, HTTP_429_TOO_MANY_REQUESTS
+
+from abdm_integrator import http_sessions
+from abdm_integrator.const import APIPathGroup, GatewayAPIPath
+from abdm_integrator.deadlines import (
+    DeadlineExceeded,
+    configured_request_timeout,
+    request_timeout,
+    within_deadline,
+)
 from abdm_integrator.exceptions import (
     ERROR_FUTURE_DATE_MESSAGE,
     ERROR_PAST_DATE_MESSAGE,
     ABDMGatewayError,
     ABDMServiceUnavailable,
 )
+from abdm_integrator.instrumentation import send_instrumented
 from abdm_integrator.settings import app_settings
 
 logger = logging.getLogger('abdm_integrator')
@@ -30,17 +41,26 @@ class ABDMRequestHelper:
     gateway_base_url = app_settings.GATEWAY_URL
     abha_base_url = app_settings.ABHA_URL
     token_payload = {"clientId": app_settings.CLIENT_ID, "clientSecret": app_settings.CLIENT_SECRET}
-    default_timeout = 60
+    # Deprecated, use HTTP_READ_TIMEOUT and HTTP_TIMEOUTS settings instead. If set, for e.g. by a subclass, it is
+    # used as read timeout of the requests made without a timeout, in place of the settings.
+    default_timeout = None
 
     def __init__(self):
         self.headers = {'Content-Type': "application/json", 'X-CM-ID': app_settings.X_CM_ID}
 
-    def get_access_token(self):
+    def get_access_token(self, invalid_token=None):
+        """
+        Returns the shared gateway access token, fetching a new one only when the cached token is missing,
+        about to expire or same as `invalid_token` (token rejected by ABDM with 401).
+        """
+        return ABDMAccessTokenManager.get_token(self.fetch_access_token, invalid_token)
+
+    def fetch_access_token(self):
         headers = {"Content-Type": "application/json; charset=UTF-8"}
         try:
-            resp = requests.post(url=self.gateway_base_url + GatewayAPIPath.SESSIONS_PATH,
-                                 data=json.dumps(self.token_payload),
-                                 headers=headers, timeout=self.default_timeout)
+            resp = self._send(http_sessions.post, APIPathGroup.SESSIONS,
+                              url=self.gateway_base_url + GatewayAPIPath.SESSIONS_PATH,
+                              data=json.dumps(self.token_payload), headers=headers, timeout=self.default_timeout)
             resp.raise_for_status()
         except requests.Timeout:
             logger.error('Access token Error: request timeout')
@@ -49,15 +69,16 @@ class ABDMRequestHelper:
             error = self.gateway_json_from_response(err.response).get('error', {})
             logger.error('Access token Error: status=%s, error=%s', err.response.status_code, error)
             raise ABDMGatewayError(error.get('code'), error.get('message'))
-        return resp.json().get("accessToken")
+        resp_json = resp.json()
+        return resp_json.get("accessToken"), _access_token_expiry(resp_json)
 
     def abha_get(self, api_path, additional_headers=None, params=None, timeout=None):
-        self.headers.update({"Authorization": f"Bearer {self.get_access_token()}"})
         if additional_headers:
             self.headers.update(additional_headers)
         try:
-            resp = requests.get(url=self.abha_base_url + api_path, headers=self.headers, params=params,
-                                timeout=timeout or self.default_timeout)
+            resp = self._send_with_token_refresh(http_sessions.get, APIPathGroup.ABHA,
+                                                 url=self.abha_base_url + api_path, params=params,
+                                                 timeout=timeout or self.default_timeout)
             resp.raise_for_status()
             # ABHA APIS may not return 'application/json' content type in headers as per swagger doc
             return _get_json_from_resp(resp)
@@ -67,16 +88,68 @@ class ABDMRequestHelper:
         except requests.HTTPError as err:
             self._handle_abha_http_error(api_path, err)
 
-    def _post(self, url, payload, timeout=None):
-        self.headers.update({"Authorization": f"Bearer {self.get_access_token()}"})
-        resp = requests.post(url=url, headers=self.headers, data=json.dumps(payload),
-                             timeout=timeout or self.default_timeout)
+    def _post(self, url, payload, timeout=None, path_group=APIPathGroup.DEFAULT):
+        resp = self._send_with_token_refresh(http_sessions.post, path_group, url=url, data=json.dumps(payload),
+                                             timeout=timeout or self.default_timeout,
+                                             request_id=payload.get('requestId'))
         resp.raise_for_status()
         return resp
 
+    def _send_with_token_refresh(self, send, path_group, **kwargs):
+        """
+        Sends request using the shared access token. If ABDM rejects the token with 401, retries once
+        with a freshly fetched token.
+        """
+        token = self.get_access_token()
+        self.headers.update({"Authorization": f"Bearer {token}"})
+        resp = self._send(send, path_group, headers=self.headers, **kwargs)
+        if is_gateway_token_rejection(resp, self.headers):
+            token = self.get_access_token(invalid_token=token)
+            self.headers.update({"Authorization": f"Bearer {token}"})
+            resp = self._send(send, path_group, headers=self.headers, retry=1, **kwargs)
+        return resp
+
+    @staticmethod
+    def _send(send, path_group, timeout=None, retry=0, request_id=None, **kwargs):
+        """
+        Sends request after waiting for its turn as per rate limit of `path_group`, unless the circuit of
+        `path_group` is open, in which case raises `ABDMServiceUnavailable`.
+        Connect and read timeouts are as per settings of `path_group`, with `timeout` used as read timeout if
+        given, and are capped to the time left before the current deadline.
+        `retry` and `request_id` are included in the emitted `OutboundRequestEvent`.
+        A timeout is recorded as a failure by the circuit breaker only if it was not shortened by the deadline,
+        as the gateway may have responded within the configured timeout.
+        """
+        from abdm_integrator.circuit_breakers import circuit_breaker
+        from abdm_integrator.rate_limits import acquire_rate_limit
+        breaker = circuit_breaker(kwargs['url'], path_group)
+        probe = breaker.before_request() if breaker else False
+        try:
+            acquire_rate_limit(path_group)
+            kwargs['timeout'] = request_timeout(path_group, timeout)
+            full_timeout = configured_request_timeout(path_group, timeout)
+        except (ABDMServiceUnavailable, DeadlineExceeded):
+            if probe:
+                breaker.release_probe()
+            raise
+        try:
+            resp = send_instrumented(send, path_group, retry, request_id, **kwargs)
+        except (requests.Timeout, requests.ConnectionError) as err:
+            if breaker:
+                if isinstance(err, requests.Timeout) and _timeout_shortened(err, kwargs['timeout'], full_timeout):
+                    if probe:
+                        breaker.release_probe()
+                else:
+                    breaker.record(failed=True, probe=probe)
+            raise
+        if breaker:
+            breaker.record(failed=resp.status_code == HTTP_429_TOO_MANY_REQUESTS or resp.status_code >= 500,
+                           probe=probe)
+        return resp
+
     def abha_post(self, api_path, payload, timeout=None):
         try:
-            resp = self._post(self.abha_base_url + api_path, payload, timeout)
+            resp = self._post(self.abha_base_url + api_path, payload, timeout, APIPathGroup.ABHA)
             # ABHA APIS may not return 'application/json' content type in headers as per swagger doc
             return _get_json_from_resp(resp)
         except requests.Timeout:
@@ -87,7 +160,7 @@ class ABDMRequestHelper:
 
     def gateway_post(self, api_path, payload, timeout=None):
         try:
-            resp = self._post(self.gateway_base_url + api_path, payload, timeout)
+            resp = self._post(self.gateway_base_url + api_path, payload, timeout, gateway_path_group(api_path))
         except requests.Timeout:
             logger.error('Gateway POST Error: request timeout, path=%s', api_path)
             raise ABDMServiceUnavailable()
@@ -123,6 +196,40 @@ class ABDMRequestHelper:
         raise ABDMGatewayError(error.get('code'), detail_message)
 
 
+def is_gateway_token_rejection(resp, headers):
+    """
+    Returns True if `resp` is a 401 rejecting the shared gateway access token sent in `headers`.
+    A 401 for a request with 'X-Token' header is not, as it mostly means that the user token has expired,
+    and refreshing the shared token for it would invalidate the token in use by all workers.
+    """
+    return resp.status_code == HTTP_401_UNAUTHORIZED and 'X-Token' not in headers
+
+
+def gateway_path_group(api_path):
+    for path_group, prefixes in APIPathGroup.GATEWAY_PATH_PREFIXES:
+        if api_path.startswith(prefixes):
+            return path_group
+    return APIPathGroup.DEFAULT
+
+
+def _access_token_expiry(resp_json):
+    """
+    Returns expiry of access token as unix timestamp, using the JWT 'exp' claim and falling back to
+    'expiresIn' of the sessions response. Returns None if expiry could not be determined.
+    """
+    try:
+        return jwt.decode(resp_json['accessToken'], options={'verify_signature': False})['exp']
+    except Exception:
+        expires_in = resp_json.get('expiresIn')
+        return time.time() + expires_in if isinstance(expires_in, (int, float)) else None
+
+
+def _timeout_shortened(timeout_error, timeout, full_timeout):
+    """Returns True if the (connect, read) timeout that ran out is shorter than the configured one"""
+    index = 0 if isinstance(timeout_error, requests.ConnectTimeout) else 1
+    return timeout[index] < full_timeout[index]
+
+
 def _get_json_from_resp(resp):
     try:
         return resp.json() or {}
@@ -174,6 +281,18 @@ class ABDMCache:
         key = cls._key_with_prefix(key)
         return cls._cache.get(key)
 
+    @classmethod
+    def add(cls, key, value, timeout):
+        """Sets value only if key is not already present. Returns True if value was set."""
+        key = cls._key_with_prefix(key)
+        return cls._cache.add(key, value, timeout)
+
+    @classmethod
+    def incr(cls, key, delta=1):
+        """Atomically increments value of the key. Raises ValueError if key is not present."""
+        key = cls._key_with_prefix(key)
+        return cls._cache.incr(key, delta)
+
     @classmethod
     def delete(cls, key):
         key = cls._key_with_prefix(key)
@@ -184,39 +303,225 @@ class ABDMCache:
         return f'{cls.prefix}{key}'
 
 
+class ABDMAccessTokenManager:
+    """
+    Shares the gateway session access token across requests, threads and worker processes.
+    The token is kept in process memory and ABDMCache until `expiry_leeway` seconds before it expires.
+    When a new token is required, only one caller fetches it (single-flight) while the others wait for it
+    to appear in the cache. Tokens whose expiry cannot be determined are not cached.
+    """
+    cache_key = 'GATEWAY_ACCESS_TOKEN'
+    refresh_lock_key = 'GATEWAY_ACCESS_TOKEN_REFRESH_LOCK'
+    refresh_lock_timeout = 30
+    refresh_wait_interval = 0.1
+    expiry_leeway = 60
+
+    _lock = threading.Lock()
+    _token_data = None
+
+    @classmethod
+    def get_token(cls, fetch_token, invalid_token=None):
+        """
+        :param fetch_token: Callable that fetches a new token and returns a tuple of (token, expiry timestamp)
+        :param invalid_token: Token known to be rejected by ABDM. It is never returned from the cache.
+        """
+        token = cls._cached_token(invalid_token)
+        if token:
+            return token
+        with cls._lock:
+            # Another thread may have refreshed the token while waiting for the lock
+            token = cls._cached_token(invalid_token)
+            if token:
+                return token
+            return cls._refresh_token(fetch_token, invalid_token)
+
+    @classmethod
+    def clear(cls):
+        cls._token_data = None
+        ABDMCache.delete(cls.cache_key)
+
+    @classmethod
+    def _cached_token(cls, invalid_token=None):
+        for token_data in (cls._token_data, ABDMCache.get(cls.cache_key)):
+            if (token_data and token_data['token'] != invalid_token
+                    and token_data['expires_at'] - cls.expiry_leeway > time.time()):
+                cls._token_data = token_data
+                return token_data['token']
+        return None
+
+    @classmethod
+    def _refresh_token(cls, fetch_token, invalid_token=None):
+        lock_acquired = ABDMCache.add(cls.refresh_lock_key, True, cls.refresh_lock_timeout)
+        if not lock_acquired:
+            token = cls._wait_for_refreshed_token(invalid_token)
+            if token:
+                return token
+        try:
+            token, expires_at = fetch_token()
+            cls._save_token(token, expires_at)
+            return token
+        finally:
+            if lock_acquired:
+                ABDMCache.delete(cls.refresh_lock_key)
+
+    @classmethod
+    def _wait_for_refreshed_token(cls, invalid_token=None):
+        deadline = time.monotonic() + cls.refresh_lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(cls.refresh_wait_interval)
+            token = cls._cached_token(invalid_token)
+            if token:
+                return token
+            if ABDMCache.get(cls.refresh_lock_key) is None:
+                break
+        return None
+
+    @classmethod
+    def _save_token(cls, token, expires_at):
+        timeout = int(expires_at - time.time() - cls.expiry_leeway) if token and expires_at else 0
+        if timeout <= 0:
+            return
+        cls._token_data = {'token': token, 'expires_at': expires_at}
+        ABDMCache.set(cls.cache_key, cls._token_data, timeout)
+
+
 def poll_and_pop_data_from_cache(cache_key, total_attempts=30, interval=2):
-    attempt = 1
-    while attempt <= total_attempts:
-        time.sleep(interval)
-        data = ABDMCache.get(cache_key)
-        if data:
-            ABDMCache.delete(cache_key)
-            return data
-        attempt += 1
-    return None
+    """
+    Waits up to `total_attempts` * `interval` seconds (capped to the time left before the current deadline) for
+    callback data published for `cache_key` using the configured callback backend. Returns as soon as the data
+    is available.
+    """
+    from abdm_integrator.callbacks import wait_for_callback_response
+    return wait_for_callback_response(cache_key, within_deadline(total_attempts * interval), interval)
+
+
+async def async_poll_and_pop_data_from_cache(cache_key, total_attempts=30, interval=2):
+    """Async version of `poll_and_pop_data_from_cache` to be used by async views."""
+    from abdm_integrator.callbacks import async_wait_for_callback_response
+    return await async_wait_for_callback_response(cache_key, within_deadline(total_attempts * interval), interval)
 
 
 def fetch_gateway_jwks_cert():
-    resp = requests.get(app_settings.GATEWAY_URL + GatewayAPIPath.CERTS_PATH)
+    path_group = gateway_path_group(GatewayAPIPath.CERTS_PATH)
+    resp = send_instrumented(http_sessions.get, path_group,
+                             url=app_settings.GATEWAY_URL + GatewayAPIPath.CERTS_PATH,
+                             timeout=request_timeout(path_group))
     resp.raise_for_status()
     return resp.json()
 
 
+JWKS_CERT_TIMEOUT = 60 * 180
+
+
 def gateway_jwks_cert():
     jwks_cert = ABDMCache.get('JWKS_CERT')
     if not jwks_cert:
         jwks_cert = fetch_gateway_jwks_cert()
-        ABDMCache.set('JWKS_CERT', jwks_cert, timeout=60 * 180)
+        ABDMCache.set('JWKS_CERT', jwks_cert, timeout=JWKS_CERT_TIMEOUT)
     return jwks_cert
 
 
+class GatewayJWKSVerifier:
+    """
+    Verifies gateway access tokens using keys from the gateway JWKS, parsed once per process and kept for as
+    long as `JWKS_CERT` is cached. On a token with an unknown `kid`, JWKS is reloaded by a single thread, first
+    from ABDMCache and then from the gateway, and the `kid` is not looked up again for
+    `unknown_kid_retry_interval` seconds if still missing.
+    Claims of verified tokens are kept for `verified_token_timeout` seconds (never past token expiry), so that
+    repeated callbacks with the same token skip signature verification.
+    """
+    unknown_kid_retry_interval = 60
+    verified_token_timeout = 60
+    verified_token_max_size = 1000
+
+    _lock = threading.Lock()
+    _keys = {}
+    _keys_expiry = 0
+    _unknown_kids = {}
+    _verified_tokens = OrderedDict()
+
+    @classmethod
+    def verify(cls, token):
+        claims = cls._verified_token_claims(token)
+        if claims is not None:
+            return claims
+        kid = jwt.get_unverified_header(token).get('kid')
+        key, algorithm = cls._get_key(kid)
+        claims = jwt.decode(token, key=key.key, algorithms=[algorithm], options={'verify_aud': False})
+        cls._save_verified_token(token, claims)
+        return claims
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._keys = {}
+            cls._keys_expiry = 0
+            cls._unknown_kids = {}
+            cls._verified_tokens = OrderedDict()
+
+    @classmethod
+    def _verified_token_claims(cls, token):
+        claims, expires_at = cls._verified_tokens.get(token, (None, 0))
+        if expires_at > time.time():
+            return claims
+        return None
+
+    @classmethod
+    def _save_verified_token(cls, token, claims):
+        expires_at = time.time() + cls.verified_token_timeout
+        if 'exp' in claims:
+            expires_at = min(expires_at, claims['exp'])
+        with cls._lock:
+            cls._verified_tokens[token] = (claims, expires_at)
+            while len(cls._verified_tokens) > cls.verified_token_max_size:
+                cls._verified_tokens.popitem(last=False)
+
+    @classmethod
+    def _get_key(cls, kid):
+        if cls._keys_expiry <= time.time():
+            with cls._lock:
+                if cls._keys_expiry <= time.time():
+                    cls._load_keys(gateway_jwks_cert())
+        key = cls._keys.get(kid)
+        if key is None:
+            key = cls._get_key_after_reload(kid)
+        if key is None:
+            raise jwt.exceptions.InvalidTokenError(f'Unknown key id: {kid}')
+        return key
+
+    @classmethod
+    def _get_key_after_reload(cls, kid):
+        with cls._lock:
+            # Keys may have been reloaded by another thread while waiting for the lock
+            if kid in cls._keys:
+                return cls._keys[kid]
+            if cls._unknown_kids.get(kid, 0) > time.time():
+                return None
+            cls._load_keys(ABDMCache.get('JWKS_CERT') or {})
+            if kid not in cls._keys:
+                jwks_cert = fetch_gateway_jwks_cert()
+                ABDMCache.set('JWKS_CERT', jwks_cert, timeout=JWKS_CERT_TIMEOUT)
+                cls._load_keys(jwks_cert)
+            if kid not in cls._keys:
+                cls._unknown_kids[kid] = time.time() + cls.unknown_kid_retry_interval
+                return None
+            cls._unknown_kids.pop(kid, None)
+            return cls._keys[kid]
+
+    @classmethod
+    def _load_keys(cls, jwks_cert):
+        if not jwks_cert.get('keys'):
+            return
+        algorithms = {key.get('kid'): key.get('alg') for key in jwks_cert['keys']}
+        cls._keys = {
+            key.key_id: (key, algorithms[key.key_id])
+            for key in jwt.api_jwk.PyJWKSet(jwks_cert['keys']).keys
+        }
+        cls._keys_expiry = time.time() + JWKS_CERT_TIMEOUT
+
+
 def validate_jwt_access_token(authorisation_token):
-    jwks_cert = gateway_jwks_cert()
-    jwks_keys = jwt.api_jwk.PyJWKSet(jwks_cert['keys'])
-    kid = jwt.get_unverified_header(authorisation_token)['kid']
-    algorithms = [key['alg'] for key in jwks_cert['keys'] if key['kid'] == kid]
-    return jwt.decode(authorisation_token, key=jwks_keys[kid].key, algorithms=algorithms,
-                      options={'verify_aud': False})
+    return GatewayJWKSVerifier.verify(authorisation_token)
 
 
 class ABDMGatewayUser(AnonymousUser):